@@ -2,5 +2,6 @@ from .base_bnn_prior import BaseBNNPrior
 from .diagonal_bnn_prior import DiagonalBNNPrior
 from .cov_bnn_prior import CovBNNPrior
 from .empirical_bnn_prior import EmpiricalBNNPrior
+from .cosmology_cache import CosmologyCache
 from .base_cosmo_bnn_prior import BaseCosmoBNNPrior
 from .diagonal_cosmo_bnn_prior import DiagonalCosmoBNNPrior
\ No newline at end of file
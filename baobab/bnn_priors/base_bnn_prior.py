@@ -1,4 +1,7 @@
 from abc import ABC, abstractmethod
+import numpy as np
+from addict import Dict
+import lenstronomy.Util.param_util as param_util
 import baobab.distributions
 
 class BaseBNNPrior(ABC):
@@ -11,6 +14,8 @@ class BaseBNNPrior(ABC):
             setattr(self, comp, bnn_omega[comp])
         self._set_required_parameters()
         self._define_kwargs_model()
+        # Whether `sample_batch` leaves the derived observables to `add_observables`, e.g. to compute them only for the samples kept
+        self.defer_observables = False
 
     def set_params_list(self, params_to_exclude):
         """Set the list of tuples, each tuple specifying the component and parameter name, to be realized independently as well as the list of tuples to be converted from the q, phi convention to the e1, e2 convention
@@ -69,13 +74,22 @@ class BaseBNNPrior(ABC):
         """
         raise ValueError("{:s} must be specified in the config inside {:s} for {:s}".format(missing_key, parent_config_key, bnn_prior_class))
 
-    def sample_param(self, hyperparams):
+    def sample_param(self, hyperparams, size=None, rng=None):
         """Assigns a sampling distribution
 
+        Parameters
+        ----------
+        hyperparams : dict
+            the config entry of the parameter, including the `dist` key
+        size : int or None
+            number of samples to draw. If None, a single float is returned. Default: None
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
+
         """
         hyperparams = hyperparams.copy()
         dist = hyperparams.pop('dist')
-        return getattr(baobab.distributions, 'sample_{:s}'.format(dist))(**hyperparams)
+        return getattr(baobab.distributions, 'sample_{:s}'.format(dist))(size=size, rng=rng, **hyperparams)
 
     def eval_param_pdf(self, eval_at, hyperparams):
         """Assigns and evaluates the PDF 
@@ -85,11 +99,138 @@ class BaseBNNPrior(ABC):
         dist = hyperparams.pop('dist')
         return getattr(baobab.distributions, 'eval_{:s}_pdf'.format(dist))(eval_at, **hyperparams)
 
+    def postprocess_sample(self, kwargs):
+        """Convert the sampled parameters into the conventions required by lenstronomy, in place
+
+        Any q, phi are converted into e1, e2, the source position is defined wrt the lens position,
+        and the external shear and lens light share the lens center. The parameter values may
+        be floats or arrays of a batch.
+
+        Parameters
+        ----------
+        kwargs : dict
+            the sampled parameters of each component
+
+        """
+        # Convert any q, phi into e1, e2 as required by lenstronomy
+        for comp in self.comps_qphi_to_e1e2: # e.g. 'lens_mass'
+            q = kwargs[comp].pop('q')
+            phi = kwargs[comp].pop('phi')
+            e1, e2 = param_util.phi_q2_ellipticity(phi, q)
+            kwargs[comp]['e1'] = e1
+            kwargs[comp]['e2'] = e2
+
+        # Source pos is defined wrt the lens pos
+        kwargs['src_light']['center_x'] += kwargs['lens_mass']['center_x']
+        kwargs['src_light']['center_y'] += kwargs['lens_mass']['center_y']
+
+        # Ext shear is defined wrt the lens center
+        kwargs['external_shear']['ra_0'] = kwargs['lens_mass']['center_x']
+        kwargs['external_shear']['dec_0'] = kwargs['lens_mass']['center_y']
+
+        if 'lens_light' in self.components:
+            # Lens light shares center with lens mass
+            kwargs['lens_light']['center_x'] = kwargs['lens_mass']['center_x']
+            kwargs['lens_light']['center_y'] = kwargs['lens_mass']['center_y']
+        return kwargs
+
     @abstractmethod
-    def sample(self):
+    def sample(self, rng=None):
         """Gets kwargs of sampled parameters to be passed to lenstronomy
 
         Overridden by subclasses.
 
+        Parameters
+        ----------
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
+
+        """
+        return NotImplemented
+
+    def sample_batch(self, n, rng=None):
+        """Gets a batch of sampled parameters, as one array per (component, parameter)
+
+        Overridden by subclasses that can sample each distribution in a single vectorized call.
+        This default implementation stacks `n` calls to `sample`.
+
+        Parameters
+        ----------
+        n : int
+            number of systems to sample
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
+
+        Returns
+        -------
+        dict
+            dictionary of components, each a dictionary of the arrays of length `n`
+            of each sampled parameter
+
+        """
+        return self.stack_samples([self.sample(rng=rng) for _ in range(n)])
+
+    def add_observables(self, sample):
+        """Compute the observables derived from a single sample of a batch drawn with `defer_observables` set, in place
+
+        Overridden by subclasses with expensive derived observables, e.g. the cosmography observables. This default implementation does nothing.
+
+        Parameters
+        ----------
+        sample : dict
+            the sample in the format returned by `sample`
+
+        Returns
+        -------
+        dict
+            the sample
+
+        """
+        return sample
+
+    @staticmethod
+    def stack_samples(samples):
+        """Stack a list of single samples into a batch
+
+        Parameters
+        ----------
+        samples : list of dict
+            samples returned by `sample`
+
+        Returns
+        -------
+        dict
+            the batch in the format returned by `sample_batch`
+
+        """
+        batch = Dict()
+        for comp, comp_sample in samples[0].items():
+            for param_name in comp_sample:
+                values = [s[comp][param_name] for s in samples]
+                if np.ndim(values[0]) == 0:
+                    values = np.array(values)
+                batch[comp][param_name] = values
+        return batch
+
+    @staticmethod
+    def get_single_sample(batch, i):
+        """Get a single sample from a batch
+
+        Parameters
+        ----------
+        batch : dict
+            a batch returned by `sample_batch`
+        i : int
+            index of the sample within the batch
+
+        Returns
+        -------
+        dict
+            the sample in the format returned by `sample`
+
         """
-        return NotImplemented
\ No newline at end of file
+        sample = Dict()
+        for comp, comp_batch in batch.items():
+            for param_name, values in comp_batch.items():
+                sample[comp][param_name] = values[i]
+        return sample
\ No newline at end of file
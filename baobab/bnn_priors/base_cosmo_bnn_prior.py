@@ -1,6 +1,9 @@
 import numpy as np
 from astropy.cosmology import FlatLambdaCDM
 from abc import ABC, abstractmethod
+import baobab.distributions
+from baobab.distributions import get_rng, CDFTable
+from .cosmology_cache import CosmologyCache
 
 class BaseCosmoBNNPrior(ABC):
     """Abstract base class for a cosmology-aware BNN prior
@@ -31,7 +34,8 @@ class BaseCosmoBNNPrior(ABC):
                 self._raise_cfg_error(possible_missing_key, 'bnn_omega', cls.__name__)
 
     def _define_cosmology(self, cosmology_cfg):
-        """Set the cosmology, with which to generate all the training samples, based on the config
+        """Set the cosmology, with which to generate all the training samples, based on the config,
+        along with the cache of its distances interpolated on a dense redshift grid
 
         Parameters
         ----------
@@ -40,13 +44,14 @@ class BaseCosmoBNNPrior(ABC):
 
         """
         self.cosmo = FlatLambdaCDM(**cosmology_cfg)
+        self.cosmo_cache = CosmologyCache(self.cosmo)
 
-    def sample_param(self, hyperparams):
+    def sample_param(self, hyperparams, size=None, rng=None):
         """Assigns a sampling distribution
 
         """
         dist = hyperparams.pop('dist')
-        return getattr(baobab.distributions, 'sample_{:s}'.format(dist))(**hyperparams)
+        return getattr(baobab.distributions, 'sample_{:s}'.format(dist))(size=size, rng=rng, **hyperparams)
 
     def eval_param_pdf(self, eval_at, hyperparams):
         """Assigns and evaluates the PDF 
@@ -55,7 +60,7 @@ class BaseCosmoBNNPrior(ABC):
         dist = hyperparams.pop('dist')
         return getattr(baobab.distributions, 'eval_{:s}_pdf'.format(dist))(**hyperparams)
 
-    def sample_redshifts_from_differential_comoving_volume(self, redshifts_cfg):
+    def sample_redshifts_from_differential_comoving_volume(self, redshifts_cfg, size=None, rng=None):
         """Sample redshifts from the differential comoving volume,
         on a grid with the range and resolution specified in the config
 
@@ -63,38 +68,86 @@ class BaseCosmoBNNPrior(ABC):
         ----------
         redshifts_cfg : dict
             Copy of `cfg.bnn_omega.redshift`
+        size : int or None
+            number of lens-source pairs to draw. If None, a single pair of floats is returned. Default: None
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
 
         Returns
         -------
         tuple
-            the tuple of floats that are the realized z_lens, z_src
+            the tuple of floats (or arrays of length `size`) that are the realized z_lens, z_src
 
         """
-        z_grid = np.arange(**redshifts_cfg.grid)
-        dVol_dz = self.cosmo.differential_comoving_volume(z_grid).value
-        dVol_dz_normed = dVol_dz/np.sum(dVol_dz)
-        sampled_z = np.random.choice(z_grid, 2, replace=False, p=dVol_dz_normed)
-        z_lens = np.min(sampled_z)
-        z_src = np.max(sampled_z)
+        z_table = self._get_redshift_table(redshifts_cfg.grid)
+        rng = get_rng(rng)
+        n_pairs = 1 if size is None else size
+        z_1 = z_table.sample(size=n_pairs, rng=rng)
+        z_2 = z_table.sample(size=n_pairs, rng=rng)
+        # Draw the pairs without replacement
+        repeated = (z_2 == z_1)
+        while np.any(repeated):
+            z_2[repeated] = z_table.sample(size=np.sum(repeated), rng=rng)
+            repeated = (z_2 == z_1)
+        z_lens = np.minimum(z_1, z_2)
+        z_src = np.maximum(z_1, z_2)
+        if size is None:
+            return z_lens[0], z_src[0]
         return z_lens, z_src
 
-    def sample_redshifts_from_independent_dist(self, redshifts_cfg):
+    def _get_redshift_table(self, grid_cfg):
+        """Get the CDF table of the differential comoving volume on the config-specified redshift grid, computed on the first call
+
+        Parameters
+        ----------
+        grid_cfg : dict
+            Copy of `cfg.bnn_omega.redshift.grid`
+
+        Returns
+        -------
+        baobab.distributions.CDFTable
+            the table of redshifts
+
+        """
+        if not hasattr(self, '_redshift_tables'):
+            self._redshift_tables = {}
+        key = tuple(sorted(grid_cfg.items()))
+        if key not in self._redshift_tables:
+            z_grid = np.arange(**grid_cfg)
+            dVol_dz = self.cosmo.differential_comoving_volume(z_grid).value
+            self._redshift_tables[key] = CDFTable(z_grid, dVol_dz)
+        return self._redshift_tables[key]
+
+    def sample_redshifts_from_independent_dist(self, redshifts_cfg, size=None, rng=None):
         """Sample lens and source redshifts from independent distributions, while enforcing that the lens redshift is smaller than source redshift
 
         Parameters
         ----------
         redshifts_cfg : dict
             Copy of `cfg.bnn_omega.redshift`
+        size : int or None
+            number of lens-source pairs to draw. If None, a single pair of floats is returned. Default: None
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
 
         Returns
         -------
         tuple
-            the tuple of floats that are the realized z_lens, z_src
+            the tuple of floats (or arrays of length `size`) that are the realized z_lens, z_src
 
         """
-        z_lens = self.sample_param(redshifts_cfg.z_lens.copy())
-        z_src = self.sample_param(redshifts_cfg.z_src.copy())
-        while z_src < z_lens + redshifts_cfg.min_diff:
-            z_lens = self.sample_param(redshifts_cfg.z_lens.copy())
-            z_src = self.sample_param(redshifts_cfg.z_src.copy())
+        z_lens = self.sample_param(redshifts_cfg.z_lens.copy(), size=size, rng=rng)
+        z_src = self.sample_param(redshifts_cfg.z_src.copy(), size=size, rng=rng)
+        if size is None:
+            while z_src < z_lens + redshifts_cfg.min_diff:
+                z_lens = self.sample_param(redshifts_cfg.z_lens.copy(), rng=rng)
+                z_src = self.sample_param(redshifts_cfg.z_src.copy(), rng=rng)
+            return z_lens, z_src
+        # Redraw the rejected pairs until all are accepted
+        rejected = z_src < z_lens + redshifts_cfg.min_diff
+        while np.any(rejected):
+            n_rejected = np.sum(rejected)
+            z_lens[rejected] = self.sample_param(redshifts_cfg.z_lens.copy(), size=n_rejected, rng=rng)
+            z_src[rejected] = self.sample_param(redshifts_cfg.z_src.copy(), size=n_rejected, rng=rng)
+            rejected = z_src < z_lens + redshifts_cfg.min_diff
         return z_lens, z_src
\ No newline at end of file
@@ -0,0 +1,165 @@
+import numpy as np
+from scipy.interpolate import CubicSpline
+
+__all__ = ['CosmologyCache']
+
+ARCSEC_PER_RADIAN = 3600.0*180.0/np.pi
+
+class CosmologyCache:
+    """Distances of a flat cosmology, tabulated once on a dense redshift grid and interpolated at any redshift
+
+    The comoving distance is computed by astropy on the grid and interpolated with a cubic spline. All the other distances follow analytically from it in a flat cosmology, e.g. the angular diameter distance between two redshifts is :math:`D_{ls} = (D_C(z_s) - D_C(z_l))/(1 + z_s)`.
+
+    Note
+    ----
+    The interpolation error is largest halfway between the grid points, where it is measured at construction and stored as `max_rel_error`. For flat Lambda-CDM cosmologies and the default step of 1.e-3, the relative error on the comoving distance is below 1.e-9, so that the distance modulus is accurate to better than 1.e-8 mag. Redshifts beyond the grid are evaluated exactly with astropy.
+
+    """
+    def __init__(self, cosmo, z_max=10.0, z_step=1.e-3):
+        """
+        Parameters
+        ----------
+        cosmo : astropy.cosmology object
+            a flat cosmology
+        z_max : float
+            maximum redshift of the grid. Default: 10
+        z_step : float
+            step of the redshift grid. Default: 1.e-3
+
+        """
+        if cosmo.Ok0 != 0.0:
+            raise ValueError("The cosmology cache only supports flat cosmologies.")
+        self.cosmo = cosmo
+        self.z_grid = np.arange(0.0, z_max + z_step, z_step)
+        self.z_max = self.z_grid[-1]
+        self._D_C_spline = CubicSpline(self.z_grid, cosmo.comoving_distance(self.z_grid).value)
+        # Error bound, measured where it is largest
+        z_mid = 0.5*(self.z_grid[1:] + self.z_grid[:-1])
+        self.max_rel_error = np.max(np.abs(self._D_C_spline(z_mid)/cosmo.comoving_distance(z_mid).value - 1.0))
+
+    def comoving_distance(self, z):
+        """Evaluate the line-of-sight comoving distance
+
+        Parameters
+        ----------
+        z : float or array-like
+            redshift
+
+        Returns
+        -------
+        float or np.array
+            the comoving distance in Mpc
+
+        """
+        z = np.asarray(z, dtype=np.float64)
+        D_C = self._D_C_spline(z)
+        outside = (z < 0.0) | (z > self.z_max)
+        if np.any(outside):
+            D_C[outside] = self.cosmo.comoving_distance(z[outside]).value
+        return D_C[()]
+
+    def angular_diameter_distance(self, z):
+        """Evaluate the angular diameter distance
+
+        Parameters
+        ----------
+        z : float or array-like
+            redshift
+
+        Returns
+        -------
+        float or np.array
+            the angular diameter distance in Mpc
+
+        """
+        return self.comoving_distance(z)/(1.0 + np.asarray(z))
+
+    def angular_diameter_distance_z1z2(self, z1, z2):
+        """Evaluate the angular diameter distance between two redshifts
+
+        Parameters
+        ----------
+        z1 : float or array-like
+            the lower redshift, e.g. of the lens
+        z2 : float or array-like
+            the higher redshift, e.g. of the source
+
+        Returns
+        -------
+        float or np.array
+            the angular diameter distance in Mpc
+
+        """
+        return (self.comoving_distance(z2) - self.comoving_distance(z1))/(1.0 + np.asarray(z2))
+
+    def distmod(self, z):
+        """Evaluate the distance modulus
+
+        Parameters
+        ----------
+        z : float or array-like
+            redshift
+
+        Returns
+        -------
+        float or np.array
+            the distance modulus in mag
+
+        """
+        luminosity_distance = (1.0 + np.asarray(z))*self.comoving_distance(z) # in Mpc
+        return 5.0*np.log10(luminosity_distance) + 25.0
+
+    def arcsec_per_kpc_comoving(self, z):
+        """Evaluate the angular separation corresponding to a comoving kpc
+
+        Parameters
+        ----------
+        z : float or array-like
+            redshift
+
+        Returns
+        -------
+        float or np.array
+            the angular separation in arcsec per comoving kpc
+
+        """
+        return ARCSEC_PER_RADIAN/(1.e3*self.comoving_distance(z))
+
+    def D_ls_over_D_s(self, z_lens, z_src):
+        """Evaluate the ratio of the lens-source and observer-source angular diameter distances
+
+        Parameters
+        ----------
+        z_lens : float or array-like
+            the lens redshift
+        z_src : float or array-like
+            the source redshift
+
+        Returns
+        -------
+        float or np.array
+            the ratio :math:`D_{ls}/D_s`
+
+        """
+        return 1.0 - self.comoving_distance(z_lens)/self.comoving_distance(z_src)
+
+    def time_delay_distance(self, z_lens, z_src):
+        r"""Evaluate the time-delay distance :math:`D_{\Delta t} = (1 + z_l) D_l D_s/D_{ls}`
+
+        Parameters
+        ----------
+        z_lens : float or array-like
+            the lens redshift
+        z_src : float or array-like
+            the source redshift
+
+        Returns
+        -------
+        float or np.array
+            the time-delay distance in Mpc
+
+        """
+        D_C_lens = self.comoving_distance(z_lens)
+        D_C_src = self.comoving_distance(z_src)
+        # The (1 + z) factors of the angular diameter distances cancel out
+        return D_C_lens*D_C_src/(D_C_src - D_C_lens)
@@ -1,6 +1,5 @@
 import numpy as np
 from addict import Dict
-import lenstronomy.Util.param_util as param_util
 from .base_bnn_prior import BaseBNNPrior
 from baobab.distributions import sample_multivar_normal
 
@@ -52,9 +51,14 @@ class CovBNNPrior(BaseBNNPrior):
         if not np.array_equal(np.array(cov_omega['cov_mat']).shape, [n_cov_params, n_cov_params]):
             raise ValueError("cov_mat value in cov_omega should have shape [n_cov_params, n_cov_params]")
 
-    def sample(self):
+    def sample(self, rng=None):
         """Gets kwargs of sampled parameters to be passed to lenstronomy
 
+        Parameters
+        ----------
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
+
         Returns
         -------
         dict
@@ -69,33 +73,46 @@ class CovBNNPrior(BaseBNNPrior):
         # Realize samples
         for comp, param_name in self.params_to_realize:
             hyperparams = getattr(self, comp)[param_name].copy()
-            kwargs[comp][param_name] = self.sample_param(hyperparams)
+            kwargs[comp][param_name] = self.sample_param(hyperparams, rng=rng)
 
         # Fill in sampled values of covariant parameters
-        cov_sample = sample_multivar_normal(**self.cov_info['cov_omega'])
+        cov_sample = sample_multivar_normal(rng=rng, **self.cov_info['cov_omega'])
         for i, (comp, param_name) in enumerate(self.cov_info['cov_params_list']):
             kwargs[comp][param_name] = cov_sample[i]
 
-        # Convert any q, phi into e1, e2 as required by lenstronomy
-        for comp in self.comps_qphi_to_e1e2: # e.g. 'lens_mass'
-            q = kwargs[comp].pop('q')
-            phi = kwargs[comp].pop('phi')
-            e1, e2 = param_util.phi_q2_ellipticity(phi, q)
-            kwargs[comp]['e1'] = e1
-            kwargs[comp]['e2'] = e2
-                
-        # Source pos is defined wrt the lens pos
-        kwargs['src_light']['center_x'] += kwargs['lens_mass']['center_x']
-        kwargs['src_light']['center_y'] += kwargs['lens_mass']['center_y']
-
-        # Ext shear is defined wrt the lens center
-        kwargs['external_shear']['ra_0'] = kwargs['lens_mass']['center_x']
-        kwargs['external_shear']['dec_0'] = kwargs['lens_mass']['center_y']
-
-        if 'lens_light' in self.components:
-            # Lens light shares center with lens mass
-            kwargs['lens_light']['center_x'] = kwargs['lens_mass']['center_x']
-            kwargs['lens_light']['center_y'] = kwargs['lens_mass']['center_y']
-        return kwargs
+        return self.postprocess_sample(kwargs)
+
+    def sample_batch(self, n, rng=None):
+        """Gets a batch of sampled parameters, drawing each parameter (and the covariant
+        parameters jointly) for all `n` systems in a single vectorized call
+
+        Parameters
+        ----------
+        n : int
+            number of systems to sample
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
+
+        Returns
+        -------
+        dict
+            dictionary of config-specified components (e.g. lens mass), itself
+            a dictionary of the arrays of length `n` of sampled parameters
+
+        """
+        # Initialize nested dictionary of kwargs
+        kwargs = Dict()
+
+        # Realize samples
+        for comp, param_name in self.params_to_realize:
+            hyperparams = getattr(self, comp)[param_name].copy()
+            kwargs[comp][param_name] = self.sample_param(hyperparams, size=n, rng=rng)
+
+        # Fill in sampled values of covariant parameters
+        cov_sample = sample_multivar_normal(size=n, rng=rng, **self.cov_info['cov_omega']) # [n, n_cov_params]
+        for i, (comp, param_name) in enumerate(self.cov_info['cov_params_list']):
+            kwargs[comp][param_name] = cov_sample[:, i]
+
+        return self.postprocess_sample(kwargs)
 
 
@@ -1,5 +1,4 @@
 from addict import Dict
-import lenstronomy.Util.param_util as param_util
 from .base_bnn_prior import BaseBNNPrior
 
 class DiagonalBNNPrior(BaseBNNPrior):
@@ -32,9 +31,14 @@ class DiagonalBNNPrior(BaseBNNPrior):
         self.set_params_list(self.params_to_exclude)
         self.set_comps_qphi_to_e1e2()
 
-    def sample(self):
+    def sample(self, rng=None):
         """Gets kwargs of sampled parameters to be passed to lenstronomy
 
+        Parameters
+        ----------
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
+
         Returns
         -------
         dict
@@ -49,28 +53,36 @@ class DiagonalBNNPrior(BaseBNNPrior):
         # Realize samples
         for comp, param_name in self.params_to_realize:
             hyperparams = getattr(self, comp)[param_name].copy()
-            kwargs[comp][param_name] = self.sample_param(hyperparams)
-
-        # Convert any q, phi into e1, e2 as required by lenstronomy
-        for comp in self.comps_qphi_to_e1e2: # e.g. 'lens_mass'
-            q = kwargs[comp].pop('q')
-            phi = kwargs[comp].pop('phi')
-            e1, e2 = param_util.phi_q2_ellipticity(phi, q)
-            kwargs[comp]['e1'] = e1
-            kwargs[comp]['e2'] = e2
-
-        # Source pos is defined wrt the lens pos
-        kwargs['src_light']['center_x'] += kwargs['lens_mass']['center_x']
-        kwargs['src_light']['center_y'] += kwargs['lens_mass']['center_y']
-
-        # Ext shear is defined wrt the lens center
-        kwargs['external_shear']['ra_0'] = kwargs['lens_mass']['center_x']
-        kwargs['external_shear']['dec_0'] = kwargs['lens_mass']['center_y']
-        
-        if 'lens_light' in self.components:
-            # Lens light shares center with lens mass
-            kwargs['lens_light']['center_x'] = kwargs['lens_mass']['center_x']
-            kwargs['lens_light']['center_y'] = kwargs['lens_mass']['center_y']
-        return kwargs
+            kwargs[comp][param_name] = self.sample_param(hyperparams, rng=rng)
+
+        return self.postprocess_sample(kwargs)
+
+    def sample_batch(self, n, rng=None):
+        """Gets a batch of sampled parameters, drawing each parameter for all `n` systems
+        in a single vectorized call
+
+        Parameters
+        ----------
+        n : int
+            number of systems to sample
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
+
+        Returns
+        -------
+        dict
+            dictionary of config-specified components (e.g. lens mass), itself
+            a dictionary of the arrays of length `n` of sampled parameters
+
+        """
+        # Initialize nested dictionary of kwargs
+        kwargs = Dict()
+
+        # Realize samples
+        for comp, param_name in self.params_to_realize:
+            hyperparams = getattr(self, comp)[param_name].copy()
+            kwargs[comp][param_name] = self.sample_param(hyperparams, size=n, rng=rng)
+
+        return self.postprocess_sample(kwargs)
 
 
@@ -1,8 +1,11 @@
 import numpy as np
 from lenstronomy.Analysis.td_cosmography import TDCosmography
+from lenstronomy.LensModel.lens_model import LensModel
+from lenstronomy.PointSource.point_source import PointSource
 from .diagonal_bnn_prior import DiagonalBNNPrior
 from .base_cosmo_bnn_prior import BaseCosmoBNNPrior
 import baobab.sim_utils.kinematics_utils as kinematics_utils
+from baobab.sim_utils.time_delay_utils import BatchTimeDelays
 
 class DiagonalCosmoBNNPrior(DiagonalBNNPrior, BaseCosmoBNNPrior):
     """BNN prior with independent parameters
@@ -37,25 +40,36 @@ class DiagonalCosmoBNNPrior(DiagonalBNNPrior, BaseCosmoBNNPrior):
         else:
             self.get_cosmography_observables = False
         self.get_velocity_dispersion = getattr(kinematics_utils, 'velocity_dispersion_analytic') if self.kinematics.anisotropy_model == 'analytic' else getattr(kinematics_utils, 'velocity_dispersion_numerical')
+        if self.kinematics.calculate_vel_disp and self.kinematics.anisotropy_model == 'analytic':
+            # Lookup table of the analytic velocity dispersion, computed once for the config-specified aperture and seeing
+            self.vel_disp_table = kinematics_utils.VelocityDispersionTable(self.kinematics.kwargs_aperture,
+                                                                          self.kinematics.kwargs_psf,
+                                                                          self.kinematics.kwargs_anisotropy['aniso_param'])
+        # Whether the time delays are left out of the samples, to be evaluated for a batch of images at once after rendering,
+        # at the image positions solved for then, e.g. by `generate.py`. Otherwise they are computed with the samples.
+        self.time_delays_from_images = False
+        if self.time_delays.calculate_time_delays:
+            # Models for the time delays, instantiated once for all samples
+            self.batch_time_delays = BatchTimeDelays(self.kwargs_model['lens_model_list'])
+        # Models solving for the image positions of the samples, instantiated on first use
+        self.td_lens_model = None
+        self.td_point_source = None
 
-    def get_cosmo_observables(self, kwargs, z_lens, z_src, kappa_ext):
-        """Calculate the central estimates of the observables for cosmography, i.e. the velocity dispersion and time delays, with and without noise realization
+    @staticmethod
+    def get_kwargs_lens(kwargs):
+        """Get the lenstronomy kwargs of the lens models from the realized kwargs
 
         Parameters
         ----------
         kwargs : dict
-            the realized kwargs
-        z_lens : float
-        z_src : float
-        kappa_ext : float
+            the realized kwargs of a single sample, or of a batch
 
         Returns
         -------
-        dict
-            the computed central estimates of velocity dispersion and time delays with and without noise realization
+        list of dict
+            the kwargs of the lens mass and external shear
 
         """
-        td_cosmo = TDCosmography(z_lens, z_src, self.kwargs_model, cosmo_fiducial=self.cosmo)
         kwargs_lens_mass = dict(
                                 theta_E=kwargs['lens_mass']['theta_E'],
                                 gamma=kwargs['lens_mass']['gamma'],
@@ -70,17 +84,99 @@ class DiagonalCosmoBNNPrior(DiagonalBNNPrior, BaseCosmoBNNPrior):
                                 ra_0=kwargs['external_shear']['ra_0'],
                                 dec_0=kwargs['external_shear']['dec_0'],
                                 )
-        kwargs_lens = [kwargs_lens_mass, kwargs_ext_shear] # FIXME: hardcoded for SPEMD
+        return [kwargs_lens_mass, kwargs_ext_shear] # FIXME: hardcoded for SPEMD
+
+    def get_time_delays(self, kwargs_lens, kwargs_ps, z_lens, z_src, kappa_ext):
+        """Solve for the image positions and calculate the time delays there, with the time-delay distance of the cached cosmology
+
+        Equivalent to `TDCosmography.time_delays`, without integrating the distances for each sample.
+
+        Parameters
+        ----------
+        kwargs_lens : list
+            the lenstronomy kwargs of the lens models
+        kwargs_ps : list
+            the lenstronomy kwargs of the point source, with the source position
+        z_lens : float
+        z_src : float
+        kappa_ext : float
+
+        Returns
+        -------
+        np.array
+            the time delays at the image positions in days
+
+        """
+        if self.td_point_source is None:
+            self.td_lens_model = LensModel(self.kwargs_model['lens_model_list'])
+            self.td_point_source = PointSource(['SOURCE_POSITION'], self.td_lens_model)
+        ra_pos, dec_pos = self.td_point_source.image_position(kwargs_ps, kwargs_lens)
+        kwargs_lens_batch = [{k: np.atleast_1d(v) for k, v in kw.items()} for kw in kwargs_lens]
+        D_dt = self.cosmo_cache.time_delay_distance(z_lens, z_src)*(1.0 - kappa_ext)
+        true_td = self.batch_time_delays.get_time_delays(ra_pos[0][np.newaxis, :], dec_pos[0][np.newaxis, :], kwargs_lens_batch, np.atleast_1d(D_dt))
+        return true_td[0]
+
+    def get_time_delays_batch(self, batch, x_image, y_image):
+        """Calculate the time delays of a batch of lenses at image positions already solved for, e.g. while rendering the images
+
+        Parameters
+        ----------
+        batch : dict
+            the sampled parameters in the format returned by `sample_batch`
+        x_image : array-like
+            x coordinates of the images in arcsec, of shape `[n, max_n_img]` and padded with NaN
+        y_image : array-like
+            y coordinates of the images in arcsec, of the same shape as `x_image`
+
+        Returns
+        -------
+        np.array
+            the time delays at the image positions in days, of the same shape as `x_image` and NaN where there is no image
+
+        """
+        kwargs_lens = self.get_kwargs_lens(batch)
+        misc = batch['misc']
+        D_dt = self.cosmo_cache.time_delay_distance(np.asarray(misc['z_lens']), np.asarray(misc['z_src']))*(1.0 - np.asarray(misc['kappa_ext']))
+        return self.batch_time_delays.get_time_delays(x_image, y_image, kwargs_lens, D_dt)
+
+    def get_cosmo_observables(self, kwargs, z_lens, z_src, kappa_ext):
+        """Calculate the central estimates of the observables for cosmography, i.e. the velocity dispersion and time delays, with and without noise realization
+
+        Parameters
+        ----------
+        kwargs : dict
+            the realized kwargs
+        z_lens : float
+        z_src : float
+        kappa_ext : float
+
+        Returns
+        -------
+        dict
+            the computed central estimates of velocity dispersion and time delays with and without noise realization
+
+        """
+        kwargs_lens = self.get_kwargs_lens(kwargs)
         kwargs_lens_light = [kwargs['lens_light']]
         kwargs_ps = [dict(ra_source=kwargs['src_light']['center_x'],
                           dec_source=kwargs['src_light']['center_y'])]
-        # Time delays
-        if self.time_delays.calculate_time_delays:
-            true_td = td_cosmo.time_delays(kwargs_lens, kwargs_ps, kappa_ext=kappa_ext)
+        # Time delays, unless they are evaluated after rendering
+        if self.time_delays.calculate_time_delays and self.time_delays_from_images:
+            true_td = None
+        elif self.time_delays.calculate_time_delays:
+            true_td = self.get_time_delays(kwargs_lens, kwargs_ps, z_lens, z_src, kappa_ext)
         else:
             true_td = -1
         # Velocity dispersion
-        if self.kinematics.calculate_vel_disp:
+        if self.kinematics.calculate_vel_disp and self.kinematics.anisotropy_model == 'analytic':
+            D_s_over_D_ds = 1.0/self.cosmo_cache.D_ls_over_D_s(z_lens, z_src)
+            true_vd = self.vel_disp_table.velocity_dispersion(kwargs['lens_mass']['theta_E'],
+                                                              kwargs['lens_mass']['gamma'],
+                                                              kwargs['lens_light']['R_sersic'],
+                                                              D_s_over_D_ds,
+                                                              kappa_ext)
+        elif self.kinematics.calculate_vel_disp:
+            td_cosmo = TDCosmography(z_lens, z_src, self.kwargs_model, cosmo_fiducial=self.cosmo)
             true_vd = self.get_velocity_dispersion(
                                                    td_cosmo, 
                                                    kwargs_lens, 
@@ -95,16 +191,16 @@ class DiagonalCosmoBNNPrior(DiagonalBNNPrior, BaseCosmoBNNPrior):
                                                    )
         else:
             true_vd = -1
-        obs = dict(true_td=true_td.tolist(),
-                   true_vd=true_vd,
-                   )
+        obs = dict(true_vd=true_vd)
+        if true_td is not None:
+            obs['true_td'] = np.asarray(true_td).tolist()
         return obs
 
-    def sample(self):
-        kwargs = DiagonalBNNPrior.sample(self)
+    def sample(self, rng=None):
+        kwargs = DiagonalBNNPrior.sample(self, rng=rng)
         H0 = self.cosmology.H0
-        z_lens, z_src = self.sample_redshifts(self.redshift.copy())
-        kappa_ext = self.sample_param(self.LOS.kappa_ext.copy())
+        z_lens, z_src = self.sample_redshifts(self.redshift.copy(), rng=rng)
+        kappa_ext = self.sample_param(self.LOS.kappa_ext.copy(), rng=rng)
         kwargs['misc'] = dict(
                              z_lens=z_lens,
                              z_src=z_src,
@@ -114,4 +210,61 @@ class DiagonalCosmoBNNPrior(DiagonalBNNPrior, BaseCosmoBNNPrior):
         if self.get_cosmography_observables:
             cosmo_obs = self.get_cosmo_observables(kwargs, z_lens, z_src, kappa_ext)
             kwargs['misc'].update(cosmo_obs)
-        return kwargs
\ No newline at end of file
+        return kwargs
+
+    def sample_batch(self, n, rng=None):
+        """Gets a batch of sampled parameters, drawing each parameter for all `n` systems
+        in a single vectorized call
+
+        Note
+        ----
+        The cosmography observables, if requested, are computed system by system, unless `defer_observables` is set, in which case they are left to `add_observables`.
+
+        Parameters
+        ----------
+        n : int
+            number of systems to sample
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
+
+        Returns
+        -------
+        dict
+            dictionary of config-specified components (e.g. lens mass) and `misc`, itself
+            a dictionary of the arrays of length `n` of sampled parameters
+
+        """
+        kwargs = DiagonalBNNPrior.sample_batch(self, n, rng=rng)
+        H0 = self.cosmology.H0
+        z_lens, z_src = self.sample_redshifts(self.redshift.copy(), size=n, rng=rng)
+        kappa_ext = self.sample_param(self.LOS.kappa_ext.copy(), size=n, rng=rng)
+        kwargs['misc'] = dict(
+                             z_lens=z_lens,
+                             z_src=z_src,
+                             kappa_ext=kappa_ext,
+                             H0=np.full(n, H0),
+                             )
+        if self.get_cosmography_observables and not self.defer_observables:
+            cosmo_obs = [self.get_cosmo_observables(self.get_single_sample(kwargs, i), z_lens[i], z_src[i], kappa_ext[i]) for i in range(n)]
+            for obs_name in cosmo_obs[0]:
+                kwargs['misc'][obs_name] = [obs[obs_name] for obs in cosmo_obs]
+        return kwargs
+
+    def add_observables(self, sample):
+        """Compute the cosmography observables of a single sample of a batch drawn with `defer_observables` set, in place
+
+        Parameters
+        ----------
+        sample : dict
+            the sample in the format returned by `sample`
+
+        Returns
+        -------
+        dict
+            the sample, with the cosmography observables in `misc`
+
+        """
+        if self.get_cosmography_observables and self.defer_observables:
+            misc = sample['misc']
+            misc.update(self.get_cosmo_observables(sample, misc['z_lens'], misc['z_src'], misc['kappa_ext']))
+        return sample
@@ -2,9 +2,9 @@ import numpy as np
 import scipy.stats as stats
 import astropy.units as u
 from addict import Dict
-import lenstronomy.Util.param_util as param_util
 from .base_bnn_prior import BaseBNNPrior
 from .base_cosmo_bnn_prior import BaseCosmoBNNPrior
+from baobab.distributions import get_rng, CDFTable
 from . import kinematics_models, parameter_models
 
 class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
@@ -51,6 +51,8 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
 
         """
         self.vel_disp_function = getattr(kinematics_models, kinematics_cfg.vel_disp.model)
+        vel_disp_grid = np.arange(**kinematics_cfg.vel_disp.grid)
+        self.vel_disp_table = CDFTable(vel_disp_grid, self.vel_disp_function(vel_disp_grid))
 
     def _define_parameter_models(self, lens_mass_cfg, lens_light_cfg, src_light_cfg, agn_light_cfg):
         """Set the empirical models, with which to generate all the training samples,
@@ -79,31 +81,31 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
 
         # src_light
         self.src_luminosity_model = getattr(parameter_models, src_light_cfg.magnitude.model)
+        # The luminosity function is piecewise constant in redshift bins, so is tabulated once per bin
+        self.src_M_table = CDFTable.from_binned_function(self.src_luminosity_model, np.arange(-23.0, -17.8, 0.2), self.src_luminosity_model.z_bins)
         self.src_light_size_model = getattr(parameter_models, src_light_cfg.R_sersic.model)
 
         # agn_light
         self.agn_luminosity_model = getattr(parameter_models, agn_light_cfg.magnitude.model)(**agn_light_cfg.magnitude.model_kwargs).sample_agn_luminosity
 
-    def sample_vel_disp(self, vel_disp_cfg):
+    def sample_vel_disp(self, size=None, rng=None):
         """Sample velocity dispersion from the config-specified model,
         on a grid with the range and resolution specified in the config
 
         Parameters
         ----------
-        vel_disp_cfg : dict
-            Copy of `cfg.bnn_omega.kinematics.vel_disp`
+        size : int or None
+            number of values to draw. If None, a single value is returned. Default: None
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
 
         Returns
         -------
-        float
+        float or np.array
             a realization of velocity dispersion
 
         """
-        vel_disp_grid = np.arange(**vel_disp_cfg.grid)
-        dn = self.vel_disp_function(vel_disp_grid)
-        dn_normed = dn/np.sum(dn)
-        sampled_vel_disp = np.random.choice(vel_disp_grid, None, replace=True, p=dn_normed)
-        return sampled_vel_disp
+        return self.vel_disp_table.sample(size=size, rng=rng)
 
     def get_lens_absolute_magnitude(self, vel_disp):
         """Get the lens absolute magnitude from the Faber-Jackson relation
@@ -111,7 +113,7 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
 
         Parameters
         ----------
-        vel_disp : float
+        vel_disp : float or array-like
             the velocity dispersion in km/s
 
         Returns
@@ -131,9 +133,9 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
 
         Parameters
         ----------
-        M_lens : float
+        M_lens : float or array-like
             the V-band absolute magnitude of lens
-        z_lens : float
+        z_lens : float or array-like
             the lens redshift
 
         Note
@@ -150,24 +152,26 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
         """
         # FIXME: I could grab some template SEDs and K-correct explicitly, accounting for band throughput
         # for IR WF F140W. Should I do this?
-        dist_mod = self.cosmo.distmod(z_lens).value
+        dist_mod = self.cosmo_cache.distmod(z_lens)
         # FIXME: Enter good model for dust?
         A_V = 0.0 # V-band dust attenuation along LOS
         apmag = M_lens + dist_mod - A_V
         return apmag
 
-    def get_lens_size(self, vel_disp, z_lens, m_V):
+    def get_lens_size(self, vel_disp, z_lens, m_V, rng=None):
         """Get the lens V-band efefctive radius from the Fundamental Plane relation
         given the realized velocity dispersion and apparent magnitude, with some scatter
 
         Parameters
         ----------
-        vel_disp : float
+        vel_disp : float or array-like
             the velocity dispersion in km/s
-        z_lens : float
+        z_lens : float or array-like
             redshift
-        m_V : float
+        m_V : float or array-like
             V-band apparent magnitude
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
 
         Returns
         -------
@@ -175,18 +179,20 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
             the effective radius in kpc and arcsec
 
         """
-        R_eff = self.lens_light_size_model(vel_disp, m_V) # in kpc
-        r_eff = R_eff * self.cosmo.arcsec_per_kpc_comoving(z_lens).value # in arcsec
+        R_eff = self.lens_light_size_model(vel_disp, m_V, rng=rng) # in kpc
+        r_eff = R_eff * self.cosmo_cache.arcsec_per_kpc_comoving(z_lens) # in arcsec
         return R_eff, r_eff
 
-    def get_src_absolute_magnitude(self, z_src):
+    def get_src_absolute_magnitude(self, z_src, rng=None):
         """Sample the UV absolute magnitude from the luminosity function for the given redshift
         and convert into apparent magnitude
 
         Parameters
         ----------
-        z_src : float
+        z_src : float or array-like
             the source redshift
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
 
         Returns
         -------
@@ -194,20 +200,16 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
             the absolute magnitude at 1500A
 
         """
-        M_grid = np.arange(-23.0, -17.8, 0.2)
-        nM_dM1500 = self.src_luminosity_model(z_src, M_grid)
-        nM_dM1500_normed = nM_dM1500/np.sum(nM_dM1500)
-        M1500_src = np.random.choice(M_grid, None, replace=True, p=nM_dM1500_normed)
-        return M1500_src
+        return self.src_M_table.sample(z_src, rng=rng)
 
     def get_src_apparent_magnitude(self, M_src, z_src):
         """Convert the souce absolute magnitude into apparent magnitude
 
         Parameters
         ----------
-        M_src : float
+        M_src : float or array-like
             the source absolute magnitude
-        z_src : float
+        z_src : float or array-like
             the source redshift
 
         Note
@@ -223,20 +225,22 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
 
         """
         dust = 0.0
-        dist_mod = self.cosmo.distmod(z_src).value
+        dist_mod = self.cosmo_cache.distmod(z_src)
         m_src = M_src + dist_mod - dust
         return m_src
 
-    def get_src_size(self, z_src, M_V_src):
+    def get_src_size(self, z_src, M_V_src, rng=None):
         """Get the effective radius of the source from its empirical relation with V-band absolute
         magnitude and redshift
 
         Parameters
         ----------
-        M_V_src : float
+        M_V_src : float or array-like
             V-band absolute magnitude of the source
-        z_src : float
+        z_src : float or array-like
             source redshift
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
 
         Returns
         -------
@@ -244,17 +248,19 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
             tuple of the effective radius in kpc and arcsec
 
         """
-        R_eff = self.src_light_size_model(z_src, M_V_src)
-        r_eff = R_eff * self.cosmo.arcsec_per_kpc_comoving(z_src).value # in arcsec
+        R_eff = self.src_light_size_model(z_src, M_V_src, rng=rng)
+        r_eff = R_eff * self.cosmo_cache.arcsec_per_kpc_comoving(z_src) # in arcsec
         return R_eff, r_eff
 
-    def get_agn_absolute_magnitude(self, z_src):
+    def get_agn_absolute_magnitude(self, z_src, rng=None):
         """Get the AGN absolute magnitude at 1450A, sampled from the luminosity function for its redshift bin
 
         Parameters
         ----------
-        z_src : float
+        z_src : float or array-like
             the AGN redshift
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
 
         Returns
         -------
@@ -262,32 +268,38 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
             AGN absolute magnitude at 1450A
 
         """
-        M_agn = self.agn_luminosity_model(z_src)
+        M_agn = self.agn_luminosity_model(z_src, rng=rng)
         return M_agn
 
-    def sample(self):
-        """Gets kwargs of sampled parameters to be passed to lenstronomy
+    def sample_empirical_params(self, size=None, rng=None):
+        """Sample the parameters constrained by the empirical relations
+
+        Parameters
+        ----------
+        size : int or None
+            number of systems to sample, all in a single vectorized call per relation. If None, the parameters of a single system are returned as floats. Default: None
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
 
         Returns
         -------
         dict
-            dictionary of config-specified components (e.g. lens mass), itself
-            a dictionary of sampled parameters corresponding to the config-specified
-            profile of that component
+            dictionary of components (e.g. lens mass) and `misc`, itself a dictionary of
+            the parameters realized from the empirical relations, as floats or arrays of length `size`
 
         """
         kwargs = Dict()
         # Sample redshifts
-        z_lens, z_src = self.sample_redshifts(redshifts_cfg=self.redshift)
+        z_lens, z_src = self.sample_redshifts(redshifts_cfg=self.redshift, size=size, rng=rng)
         # Sample velocity dispersion
-        vel_disp_iso = self.sample_vel_disp(vel_disp_cfg=self.kinematics.vel_disp)
+        vel_disp_iso = self.sample_vel_disp(size=size, rng=rng)
         # Sample lens_mass and lens_light parameters
         abmag_lens = self.get_lens_absolute_magnitude(vel_disp_iso)
         apmag_lens = self.get_lens_apparent_magnitude(abmag_lens, z_lens)
-        theta_E = self.theta_E_model(vel_disp_iso, z_lens, z_src, self.cosmo)
-        R_eff_lens, r_eff_lens = self.get_lens_size(vel_disp_iso, z_lens, apmag_lens)
-        gamma = self.gamma_model(R_eff_lens)
-        lens_light_q = self.lens_axis_ratio_model(vel_disp_iso) 
+        theta_E = self.theta_E_model(vel_disp_iso, z_lens, z_src, self.cosmo_cache)
+        R_eff_lens, r_eff_lens = self.get_lens_size(vel_disp_iso, z_lens, apmag_lens, rng=rng)
+        gamma = self.gamma_model(R_eff_lens, rng=rng)
+        lens_light_q = self.lens_axis_ratio_model(vel_disp_iso, rng=rng)
         kwargs['lens_mass'] = dict(
                                    theta_E=theta_E,
                                    gamma=gamma,
@@ -300,9 +312,9 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
         kwargs['external_shear'] = {}
 
         # Sample src_light parameters
-        abmag_src = self.get_src_absolute_magnitude(z_src)
+        abmag_src = self.get_src_absolute_magnitude(z_src, rng=rng)
         apmag_src = self.get_src_apparent_magnitude(abmag_src, z_src)
-        R_eff_src, r_eff_src = self.get_src_size(z_src, abmag_src)
+        R_eff_src, r_eff_src = self.get_src_size(z_src, abmag_src, rng=rng)
         kwargs['src_light'] = dict(
                                    magnitude=apmag_src,
                                    R_sersic=r_eff_src,
@@ -310,7 +322,7 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
 
         # Sample AGN_light parameters
         if 'agn_light' in self.components:
-            abmag_agn = self.get_agn_absolute_magnitude(z_src)
+            abmag_agn = self.get_agn_absolute_magnitude(z_src, rng=rng)
             apmag_agn = self.get_src_apparent_magnitude(abmag_agn, z_src) 
             kwargs['agn_light'] = dict(
                                        magnitude=apmag_agn,
@@ -326,32 +338,62 @@ class EmpiricalBNNPrior(BaseBNNPrior, BaseCosmoBNNPrior):
                               lens_light_abmag=abmag_lens,
                               src_light_abmag=abmag_src,
                               )
+        return kwargs
+
+    def sample(self, rng=None):
+        """Gets kwargs of sampled parameters to be passed to lenstronomy
+
+        Parameters
+        ----------
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
+
+        Returns
+        -------
+        dict
+            dictionary of config-specified components (e.g. lens mass), itself
+            a dictionary of sampled parameters corresponding to the config-specified
+            profile of that component
+
+        """
+        kwargs = self.sample_empirical_params(rng=rng)
 
         # Sample remaining parameters, not constrained by the above empirical relations,
         # independently from their (marginally) diagonal BNN prior
         for comp, param_name in self.params_to_realize:
             hyperparams = getattr(self, comp)[param_name].copy()
-            kwargs[comp][param_name] = self.sample_param(hyperparams)
+            kwargs[comp][param_name] = self.sample_param(hyperparams, rng=rng)
 
-        # Convert any q, phi into e1, e2 as required by lenstronomy
-        for comp in self.comps_qphi_to_e1e2: # e.g. 'lens_mass'
-            q = kwargs[comp].pop('q')
-            phi = kwargs[comp].pop('phi')
-            e1, e2 = param_util.phi_q2_ellipticity(phi, q)
-            kwargs[comp]['e1'] = e1
-            kwargs[comp]['e2'] = e2
+        return self.postprocess_sample(kwargs)
 
-        # Source pos is defined wrt the lens pos
-        kwargs['src_light']['center_x'] += kwargs['lens_mass']['center_x']
-        kwargs['src_light']['center_y'] += kwargs['lens_mass']['center_y']
+    def sample_batch(self, n, rng=None):
+        """Gets a batch of sampled parameters, as one array per (component, parameter)
 
-        # Ext shear is defined wrt the lens center
-        kwargs['external_shear']['ra_0'] = kwargs['lens_mass']['center_x']
-        kwargs['external_shear']['dec_0'] = kwargs['lens_mass']['center_y']
+        Note
+        ----
+        All the parameters are drawn for the `n` systems in a single vectorized call per
+        distribution or empirical relation.
 
-        if 'lens_light' in self.components:
-            # Lens light shares center with lens mass
-            kwargs['lens_light']['center_x'] = kwargs['lens_mass']['center_x']
-            kwargs['lens_light']['center_y'] = kwargs['lens_mass']['center_y']
+        Parameters
+        ----------
+        n : int
+            number of systems to sample
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
 
-        return kwargs
+        Returns
+        -------
+        dict
+            dictionary of config-specified components (e.g. lens mass) and `misc`, itself
+            a dictionary of the arrays of length `n` of sampled parameters
+
+        """
+        kwargs = self.sample_empirical_params(size=n, rng=rng)
+
+        # Sample remaining parameters, not constrained by the above empirical relations,
+        # independently from their (marginally) diagonal BNN prior
+        for comp, param_name in self.params_to_realize:
+            hyperparams = getattr(self, comp)[param_name].copy()
+            kwargs[comp][param_name] = self.sample_param(hyperparams, size=n, rng=rng)
+
+        return self.postprocess_sample(kwargs)
@@ -2,6 +2,9 @@ import numpy as np
 from scipy.special import gamma
 import astropy.units as u
 from lenstronomy.Cosmo.lens_cosmo import LensCosmo
+import lenstronomy.Util.constants as const
+from baobab.distributions import get_rng, CDFTable
+from .cosmology_cache import CosmologyCache
 
 __all__ = ['approximate_theta_E_for_SIS', 'FaberJackson', 'FundamentalPlane', 'FundamentalMassHyperplane', 'AxisRatioRayleigh', 'redshift_binned_luminosity_function', 'size_from_luminosity_and_redshift_relation', 'AGNLuminosityFunction']
 
@@ -11,31 +14,50 @@ def approximate_theta_E_for_SIS(vel_disp_iso, z_lens, z_src, cosmo):
 
     Parameters
     ----------
-    vel_disp_iso : float 
+    vel_disp_iso : float or array-like
         isotropic velocity dispersion, or an approximation to it, in km/s
-    z_lens : float
+    z_lens : float or array-like
         the lens redshift
-    z_src : float
+    z_src : float or array-like
         the source redshift
-    cosmo : astropy.cosmology object
-    	the cosmology
+    cosmo : astropy.cosmology object or CosmologyCache
+    	the cosmology, or its cached distances
 
     Note
     ----
-    The computation is purely analytic.
+    The computation is purely analytic. With a `CosmologyCache`, the distance ratio is interpolated rather than integrated, and the inputs may be arrays.
 
     .. math::\theta_E = 4 \pi \frac{\sigma_V^2}{c^2} \frac{D_{ls}}{D_s}
 
     Returns
     -------
-    float
+    float or np.array
         the Einstein radius for an SIS in arcsec
 
     """
+    if isinstance(cosmo, CosmologyCache):
+        return 4.0*np.pi*(np.asarray(vel_disp_iso)*1000.0/const.c)**2.0*cosmo.D_ls_over_D_s(z_lens, z_src)/const.arcsec
     lens_cosmo = LensCosmo(z_lens, z_src, cosmo=cosmo)
     theta_E_SIS = lens_cosmo.sis_sigma_v2theta_E(vel_disp_iso)
     return theta_E_SIS
 
+def _get_size(*args):
+	"""Get the size of the random draws to pair with the given inputs, one per broadcast element
+
+	Parameters
+	----------
+	args : float or array-like
+		the inputs of a relation
+
+	Returns
+	-------
+	tuple or None
+		the broadcast shape of the inputs, or None if they are all scalars, so that a single float is drawn
+
+	"""
+	shape = np.broadcast(*args).shape
+	return shape if len(shape) > 0 else None
+
 class FaberJackson:
 	"""Represents the Faber-Jackson (FJ) relation between velocity dispersion and luminosity
 	of elliptical galaxies.
@@ -92,12 +114,12 @@ class FaberJackson:
 
 		Parameters
 		----------
-		vel_disp : float
+		vel_disp : float or array-like
 			the velocity dispersion in km/s
 
 		Returns
 		-------
-		float
+		float or np.array
 			log(L_V/L_solar)
 
 		"""
@@ -166,20 +188,22 @@ class FundamentalPlane:
 		self.delta_a = 0.02
 		self.delta_b = 0.01
 
-	def get_effective_radius(self, vel_disp, m_V):
+	def get_effective_radius(self, vel_disp, m_V, rng=None):
 		"""Evaluate the size expected from the FP relation
 		for a given velocity dispersion and V-band apparent magnitude
 
 		Parameters
 		----------
-		vel_disp : float
+		vel_disp : float or array-like
 			the velocity dispersion in km/s
-		m_V : float
+		m_V : float or array-like
 			the apparent V-band magnitude
+		rng : np.random.Generator or None
+			random number generator. If None, the global `np.random` state is used. Default: None
 
 		Returns
 		-------
-		float
+		float or np.array
 			the effective radius in kpc
 
 		"""
@@ -187,8 +211,8 @@ class FundamentalPlane:
 		log_R_eff = self.a*log_vel_disp + self.b*m_V + self.c
 		R_eff = 10**log_R_eff
 		sig_scatter = (np.abs(log_vel_disp)*self.delta_a**2.0 + np.abs(m_V)*self.delta_b**2.0)**0.5
-		scatter = np.random.randn()*sig_scatter
-		return R_eff + scatter 
+		scatter = get_rng(rng).standard_normal(_get_size(vel_disp, m_V))*sig_scatter
+		return R_eff + scatter
 
 class FundamentalMassHyperplane:
 	"""Represents bivariate relations (projections) within the Fundamental Mass Hyperplane (FMHP) relation 
@@ -251,17 +275,19 @@ class FundamentalMassHyperplane:
 		self.delta_b = 0.10
 		self.intrinsic_scatter = 0.14
 
-	def get_gamma(self, R_eff):
+	def get_gamma(self, R_eff, rng=None):
 		"""Evaluate the power-law slope of the mass profile from its power-law relation with effective radius
 
 		Parameters
 		----------
-		R_eff : float
+		R_eff : float or array-like
 			the effective radius in kpc
+		rng : np.random.Generator or None
+			random number generator. If None, the global `np.random` state is used. Default: None
 
 		Returns
 		-------
-		float
+		float or np.array
 			the power-law slope, gamma
 
 		"""
@@ -269,7 +295,7 @@ class FundamentalMassHyperplane:
 		gamma_minus_2 = log_R_eff*self.a + self.b
 		gamma = gamma_minus_2 + 2.0
 		gamma_sig = (self.intrinsic_scatter**2.0 + np.abs(log_R_eff)*self.delta_a**2.0 + self.delta_b**2.0)**0.5
-		scatter = np.random.randn()*gamma_sig
+		scatter = get_rng(rng).standard_normal(_get_size(R_eff))*gamma_sig
 		return gamma + scatter
 
 class AxisRatioRayleigh:
@@ -327,25 +353,39 @@ class AxisRatioRayleigh:
 		self.b = 0.38
 		self.lower = 0.2
 
-	def get_axis_ratio(self, vel_disp):
+	def get_axis_ratio(self, vel_disp, rng=None):
 		"""Sample (one minus) the axis ratio of the lens galaxy from the Rayleigh distribution with scale
 		that depends on velocity dispersion
 
 		Parameters
 		----------
-		vel_disp : float
+		vel_disp : float or array-like
 			velocity dispersion in km/s
+		rng : np.random.Generator or None
+			random number generator. If None, the global `np.random` state is used. Default: None
+
+		Note
+		----
+		The truncation at `self.lower` is done by rejection, redrawing only the rejected values at each pass.
 
 		Returns
 		-------
-		float
+		float or np.array
 			the axis ratio q
 
 		"""
-		scale = self.a*vel_disp + self.b
-		q = 0.0
-		while q < self.lower:
-			q = 1.0 - np.random.rayleigh(scale, size=None)
+		scale = self.a*np.asarray(vel_disp) + self.b
+		rng = get_rng(rng)
+		if scale.ndim == 0:
+			q = 0.0
+			while q < self.lower:
+				q = 1.0 - rng.rayleigh(scale, size=None)
+			return q
+		q = 1.0 - rng.rayleigh(scale)
+		rejected = (q < self.lower)
+		while np.any(rejected):
+			q[rejected] = 1.0 - rng.rayleigh(scale[rejected])
+			rejected = (q < self.lower)
 		return q
 
 def redshift_binned_luminosity_function(z, M_grid):
@@ -353,7 +393,7 @@ def redshift_binned_luminosity_function(z, M_grid):
 
 	Parameters
 	----------
-	z : float
+	z : float or array-like
 		galaxy redshift
 	M_grid : array-like
 		grid of FUV absolute magnitudes at which to evaluate luminosity function
@@ -372,35 +412,44 @@ def redshift_binned_luminosity_function(z, M_grid):
 
 	.. [3] Kawamata, Ryota, et al. "Size–Luminosity Relations and UV Luminosity Functions at z= 6–9 Simultaneously Derived from the Complete Hubble Frontier Fields Data." The Astrophysical Journal 855.1 (2018): 4.
 
+	The function depends on z only through its bin, so it can be tabulated once per bin. The right edges of the bins are exposed as the attribute `z_bins` of the function.
+
 	Returns
 	-------
 	array-like
-		unnormalized function of the absolute magnitude at 1500A
+		unnormalized function of the absolute magnitude at 1500A, of shape `[len(M_grid)]` for a scalar z
+		or `z.shape + [len(M_grid)]` for an array z
 
 	"""
 	#prefactor = np.log(10)*phi_star # just normalization
-	# Define redshift bins by right edge of bin
-	z_bins = np.array([0.2, 0.4, 0.6, 0.8, 1.2, 2.25, 3.4, 4.5, 5.5, 6.5, 7.5, np.inf])
+	# Redshift bins are defined by the right edge of the bin
+	z_bins = redshift_binned_luminosity_function.z_bins
 	alphas = np.array([-1.21, -1.19, -1.55, -1.60, -1.63, -1.49, -1.47, -1.56, -1.67, -2.02, -2.03, -2.36])
 	M_stars = np.array([-18.05, -18.38, -19.49, -19.84, -20.11, -20.33, -21.08, -20.73, -20.81, -21.13, -21.03, -20.89])
-	alpha = alphas[z < z_bins][0]
-	M_star = M_stars[z < z_bins][0]
+	# Index of the first bin whose right edge is greater than z
+	bin_i = np.searchsorted(z_bins, z, side='right')
+	alpha = alphas[bin_i][..., np.newaxis]
+	M_star = M_stars[bin_i][..., np.newaxis]
 
 	# Note phi_star is ignored as normalization
 	# Schechter kernel
-	exponent = 10.0**(0.4*(M_star - M_grid))
+	exponent = 10.0**(0.4*(M_star - np.asarray(M_grid)))
 	density = np.exp(-exponent) * exponent**(alpha + 1.0)
 	return density
 
-def size_from_luminosity_and_redshift_relation(z, M_V):
+redshift_binned_luminosity_function.z_bins = np.array([0.2, 0.4, 0.6, 0.8, 1.2, 2.25, 3.4, 4.5, 5.5, 6.5, 7.5, np.inf])
+
+def size_from_luminosity_and_redshift_relation(z, M_V, rng=None):
 	"""Sample the effective radius of Lyman break galaxies from the relation with luminosity and redshift
 
 	Parameters
 	----------
-	z : float
+	z : float or array-like
 		galaxy redshift
-	M_V : float
+	M_V : float or array-like
 		V-band absolute magnitude
+	rng : np.random.Generator or None
+		random number generator. If None, the global `np.random` state is used. Default: None
 
 	Note
 	----
@@ -417,12 +466,12 @@ def size_from_luminosity_and_redshift_relation(z, M_V):
 
 	Returns
 	-------
-	float
+	float or np.array
 		a sampled effective radius in kpc
 
 	"""
-	log_R_eff = (M_V/-19.5)**-0.22 * ((1.0 + z)/5.0)**-1.2
-	scatter = np.random.randn()*0.3
+	log_R_eff = (np.asarray(M_V)/-19.5)**-0.22 * ((1.0 + np.asarray(z))/5.0)**-1.2
+	scatter = get_rng(rng).standard_normal(_get_size(z, M_V))*0.3
 	log_R_eff += scatter
 	R_eff = 10.0**log_R_eff
 	return R_eff
@@ -455,7 +504,7 @@ class AGNLuminosityFunction:
 		if not (fit_data is None or alphas is None or betas is None or M_stars is None):
 			raise ValueError("Cannot specify fit parameters when fit_data is specified.")
 
-		self.M_grid = M_grid
+		self.M_grid = np.asarray(M_grid)
 		self.z_bins = z_bins
 		self.alphas = alphas
 		self.betas = betas
@@ -473,6 +522,9 @@ class AGNLuminosityFunction:
 			raise ValueError("z_bins and betas should have the same length.")
 		if len(self.M_stars) != n_bins:
 			raise ValueError("z_bins and M_stars should have the same length.")
+		# The luminosity function of each redshift bin, tabulated as a CDF
+		pmfs = [self.get_double_power_law(alpha, beta, M_star) for alpha, beta, M_star in zip(self.alphas, self.betas, self.M_stars)]
+		self.cdf_table = CDFTable(self.M_grid, pmfs, self.z_bins)
 
 
 	def _define_combined_fit_params(self):
@@ -538,29 +590,22 @@ class AGNLuminosityFunction:
 		dn /= np.sum(dn)
 		return dn
 
-	def sample_agn_luminosity(self, z):
+	def sample_agn_luminosity(self, z, rng=None):
 		"""Sample the AGN luminosity from the redshift-binned luminosity function
 
 		Parameters
 		----------
-		z : float
+		z : float or array-like
 			the AGN redshift
+		rng : np.random.Generator or None
+			random number generator. If None, the global `np.random` state is used. Default: None
 
 		Returns
 		-------
-		float
-			sampled AGN luminosity at 1450A in mag
+		float or np.array
+			sampled AGN luminosity at 1450A in mag, one per redshift
 		
 		"""
-		# Assign redshift bin
-		is_less_than_right_edge = (z < self.z_bins)
-		alpha = self.alphas[is_less_than_right_edge][0]
-		beta = self.betas[is_less_than_right_edge][0]
-		M_star = self.M_stars[is_less_than_right_edge][0]
-
-		# Evaluate function
-		pmf = self.get_double_power_law(alpha, beta, M_star)
-
-		# Sample luminosity
-		sampled_M = np.random.choice(self.M_grid, None, replace=True, p=pmf)
+		# Look up the CDF of the redshift bin
+		sampled_M = self.cdf_table.sample(z, rng=rng)
 		return sampled_M
\ No newline at end of file
@@ -24,6 +24,16 @@ class BaobabConfig:
         self.out_dir = os.path.abspath(self.out_dir)
         if not hasattr(self, 'checkpoint_interval'):
             self.checkpoint_interval = max(100, self.n_data // 100)
+        if not hasattr(self, 'sample_batch_size'):
+            # Number of candidate systems drawn at a time from the random stream of a dataset index. The candidates left over once one is accepted
+            # are discarded rather than carried over to the next index, which has its own stream
+            self.sample_batch_size = 8
+        if not hasattr(self, 'output_precision'):
+            # Storage precision of the images, see `baobab.io_utils.ImageEncoder`
+            self.output_precision = Dict(precision='float64', noise_floor=None)
+        if 'screen' not in self.selection.magnification:
+            # Pre-render screen on an upper bound of the magnification, see `baobab.sim_utils.MagnificationScreen`. Disabled if set to False
+            self.selection.magnification.screen = True
         self.interpret_kinematics_cfg()
         self.log_filename = datetime.now().strftime("log_%m-%d-%Y_%H:%M_baobab.json")
         self.log_path = os.path.join(self.out_dir, self.log_filename)
@@ -67,6 +77,8 @@ class BaobabConfig:
         """
         Return the noise kwargs defined in the babobab config, e.g. for passing to the noise model for online data augmentation
 
+        The observing conditions that vary from image to image, e.g. `exposure_time` in `cfg.observation`, are returned as the distributions configured, to be realized per batch with `noise_torch.sample_noise_kwargs`.
+
         Returns
         -------
             (dict): A dict containing the noise kwargs to be passed to the noise
@@ -1,3 +1,4 @@
 from .noise_lenstronomy import *
+from .noise_numpy import *
 #from .noise_torch import *
 #from .noise_tf import *
\ No newline at end of file
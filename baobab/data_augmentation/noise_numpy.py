@@ -0,0 +1,192 @@
+import numpy as np
+import lenstronomy.Util.data_util as data_util
+from baobab.distributions import get_rng
+__all__ = ['NoiseModelNumpy']
+
+class NoiseModelNumpy:
+    """A combination of sky, readout, and Poisson flux noise to be added to a batch of images in place
+
+    The background variances are computed once at construction, so adding noise to a batch costs a few elementwise operations on the batch. The exposure time, read noise, and sky brightness may be given per image, as arrays of length `N` matching a batch of shape `[N, H, W]`.
+
+    Note
+    ----
+    This is a NumPy counterpart of `NoiseModelTorch`, with the same noise variances.
+
+    """
+    def __init__(self, pixel_scale, exposure_time, magnitude_zero_point, read_noise=None, ccd_gain=None, sky_brightness=None, seeing=None, num_exposures=1, psf_type='GAUSSIAN', kernel_point_source=None, truncation=5, data_count_unit='ADU', background_noise=None):
+        """
+
+        Parameters
+        ----------
+        pixel_scale : float
+            pixel scale in arcsec/pixel
+        exposure_time : float or array-like
+            exposure time per image in seconds, either shared by all the images or one per image
+        magnitude_zero_point : float
+            magnitude at which 1 count per second per arcsecond square is registered
+        read_noise : float or array-like
+            std of noise generated by readout (in units of electrons), either shared by all the images or one per image
+        ccd_gain : float
+            electrons/ADU (analog-to-digital unit). A gain of 8 means that the camera digitizes the CCD signal so that each ADU corresponds to 8 photoelectrons
+        sky_brightness : float or array-like
+             sky brightness (in magnitude per square arcsec), either shared by all the images or one per image
+        seeing : float
+            fwhm of PSF
+        num_exposures : float
+            number of exposures that are combined
+        psf_type : str
+            type of PSF ('GAUSSIAN' and 'PIXEL' supported)
+        kernel_point_source : 2d numpy array
+            model of PSF centered with odd number of pixels per axis(optional when psf_type='PIXEL' is chosen)
+        truncation : float
+            Gaussian truncation (in units of sigma), only required for 'GAUSSIAN' model
+        data_count_unit : str
+            unit of the data (and other properties), 'e-': (electrons assumed to be IID), 'ADU': (analog-to-digital unit)
+        background_noise : float
+            sqrt(variance of background) as a total contribution from read noise, sky brightness, etc. in units of the data_count_units
+            If you set this parameter, it will override readout_noise, sky_brightness. Default: None
+
+        """
+        self.pixel_scale = pixel_scale
+        self.exposure_time = self._as_per_image(exposure_time)
+        self.magnitude_zero_point = magnitude_zero_point
+        self.ccd_gain = ccd_gain
+        self.seeing = seeing
+        self.num_exposures = num_exposures
+        self.psf_type = psf_type
+        self.kernel_point_source = kernel_point_source
+        self.truncation = truncation
+        self.data_count_unit = data_count_unit
+        self.background_noise = background_noise
+
+        if self.background_noise is None:
+            self.readout_noise = self._as_per_image(read_noise)
+            if self.data_count_unit == 'ADU':
+                self.readout_noise = self.readout_noise/self.ccd_gain
+
+            self.sky_brightness = data_util.magnitude2cps(self._as_per_image(sky_brightness), self.magnitude_zero_point)
+            if self.data_count_unit == 'e-':
+                self.sky_brightness = self.sky_brightness*self.ccd_gain
+
+            self.exposure_time_tot = self.num_exposures * self.exposure_time
+            self.readout_noise_tot = self.num_exposures * self.readout_noise**2.0
+            self.sky_per_pixel = self.sky_brightness * pixel_scale**2.0
+            self.background_noise_sigma2 = self.get_sky_noise_sigma2() + self.get_readout_noise_sigma2()
+        else:
+            self.background_noise_sigma2 = self.background_noise**2.0
+
+        self.scaled_exposure_time = self.exposure_time
+        if self.data_count_unit == 'ADU':
+            self.scaled_exposure_time = self.scaled_exposure_time*self.ccd_gain
+
+    @staticmethod
+    def _as_per_image(value):
+        """Shape a per-image array to broadcast against a batch of shape `[N, H, W]`, leaving scalars unchanged
+
+        """
+        value = np.asarray(value, dtype=np.float64)
+        return value.reshape(-1, 1, 1) if value.ndim > 0 else value[()]
+
+    def get_sky_noise_sigma2(self):
+        """Compute the variance in sky noise
+
+        Returns
+        -------
+        float or np.array
+            variance of the sky noise, in cps^2, of shape `[N, 1, 1]` if any property is given per image
+
+        """
+        return self.sky_per_pixel**2.0 / self.exposure_time_tot
+
+    def get_readout_noise_sigma2(self):
+        """Compute the variance in readout noise
+
+        Returns
+        -------
+        float or np.array
+            variance of the readout noise, in cps^2, of shape `[N, 1, 1]` if any property is given per image
+
+        """
+        return self.readout_noise_tot / self.exposure_time_tot**2.0
+
+    def get_poisson_noise_sigma2(self, img):
+        """Get the variance in Poisson flux noise from the images
+
+        Parameters
+        ----------
+        img : np.array
+            the images of flux values in cps on which to evaluate the noise, of shape `[N, H, W]`
+
+        Returns
+        -------
+        np.array
+            variance of the Poisson flux noise, in cps^2
+
+        """
+        return np.maximum(img, 0.0)/self.scaled_exposure_time
+
+    def get_noise_sigma2(self, img):
+        """Get the variance of total noise due to the combined effects of sky, readout, and Poisson flux noise
+
+        Parameters
+        ----------
+        img : np.array
+            the images of flux values in cps on which to evaluate the noise, of shape `[N, H, W]`
+
+        Returns
+        -------
+        np.array
+            variance of total noise, in cps^2
+
+        """
+        return self.background_noise_sigma2 + self.get_poisson_noise_sigma2(img)
+
+    def get_noise_map(self, img, rng=None):
+        """Get the total random noise map due to the combined effects of sky, readout, and Poisson flux noise
+
+        Parameters
+        ----------
+        img : np.array
+            the images of flux values in cps on which to evaluate the noise, of shape `[N, H, W]`
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
+
+        Returns
+        -------
+        np.array
+            the noise map in cps
+
+        """
+        img = np.asarray(img)
+        return get_rng(rng).standard_normal(img.shape)*self.get_noise_sigma2(img)**0.5
+
+    def add_noise(self, img, rng=None):
+        """Add the noise to a batch of images in place
+
+        Parameters
+        ----------
+        img : np.array
+            the images of flux values in cps, of shape `[N, H, W]` and of type float32 or float64, overwritten with the noisy images
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
+
+        Returns
+        -------
+        np.array
+            the noisy images, `img` itself
+
+        """
+        # Standard deviation of the noise, computed in a single buffer
+        sigma = np.maximum(img, 0.0)
+        sigma /= self.scaled_exposure_time
+        sigma += self.background_noise_sigma2
+        np.sqrt(sigma, out=sigma)
+        rng = get_rng(rng)
+        if isinstance(rng, np.random.Generator):
+            noise = rng.standard_normal(img.shape, dtype=img.dtype)
+        else:
+            # The global state only draws in double precision
+            noise = rng.standard_normal(img.shape).astype(img.dtype, copy=False)
+        noise *= sigma
+        img += noise
+        return img
@@ -1,6 +1,7 @@
 import torch
 import lenstronomy.Util.data_util as data_util
-__all__ = ['NoiseModelTorch']
+import baobab.distributions
+__all__ = ['NoiseModelTorch', 'sample_noise_kwargs']
 
 class NoiseModelTorch:
     """A combination of sky, readout, and Poisson flux noise to be added to the image
@@ -8,6 +9,7 @@ class NoiseModelTorch:
     Note
     ----
     This is a torch wrapper around the functionality provided by the `SingleBand` class in lenstronomy.
+    The exposure time, read noise, and sky brightness may be tensors broadcastable against the batch of images, e.g. of shape `[B, 1, 1, 1]` for a batch of shape `[B, 1, H, W]`, to give each image its own observing conditions. They can be reset for each batch with `set_conditions`. See `sample_noise_kwargs`.
 
     """
     def __init__(self, pixel_scale, exposure_time, magnitude_zero_point, read_noise=None, ccd_gain=None, sky_brightness=None, seeing=None, num_exposures=1, psf_type='GAUSSIAN', kernel_point_source=None, truncation=5, data_count_unit='ADU', background_noise=None):
@@ -17,15 +19,15 @@ class NoiseModelTorch:
         ----------
         pixel_scale : float
             pixel scale in arcsec/pixel
-        exposure_time : float
+        exposure_time : float or torch.Tensor
             exposure time per image in seconds
         magnitude_zero_point : float
             magnitude at which 1 count per second per arcsecond square is registered
-        read_noise : float
+        read_noise : float or torch.Tensor
             std of noise generated by readout (in units of electrons)
         ccd_gain : float
             electrons/ADU (analog-to-digital unit). A gain of 8 means that the camera digitizes the CCD signal so that each ADU corresponds to 8 photoelectrons
-        sky_brightness : float
+        sky_brightness : float or torch.Tensor
              sky brightness (in magnitude per square arcsec)
         seeing : float
             fwhm of PSF
@@ -45,10 +47,8 @@ class NoiseModelTorch:
 
         """
         self.pixel_scale = pixel_scale
-        self.exposure_time = exposure_time
         self.magnitude_zero_point = magnitude_zero_point
         self.ccd_gain = ccd_gain
-        self.sky_brightness = sky_brightness
         self.seeing = seeing
         self.num_exposures = num_exposures
         self.psf_type = psf_type
@@ -58,24 +58,54 @@ class NoiseModelTorch:
         self.background_noise = background_noise
 
         #FIXME: seeing, psf_type, kernel_point_source, and truncation do not seem to be used at all.
+        self.get_background_noise_sigma2 = getattr(self, 'get_background_noise_sigma2_composite') if self.background_noise is None else getattr(self, 'get_background_noise_sigma2_simple')
+        self.set_conditions(exposure_time=exposure_time, read_noise=read_noise, sky_brightness=sky_brightness)
+
+    def set_conditions(self, exposure_time=None, read_noise=None, sky_brightness=None):
+        """Set the observing conditions of the next batch of images, e.g. realized per image by `sample_noise_kwargs`, without rebuilding the noise model
+
+        Parameters
+        ----------
+        exposure_time : float or torch.Tensor or None
+            exposure time per image in seconds. Kept unchanged if None. Default: None
+        read_noise : float or torch.Tensor or None
+            std of noise generated by readout (in units of electrons). Kept unchanged if None. Default: None
+        sky_brightness : float or torch.Tensor or None
+            sky brightness (in magnitude per square arcsec). Kept unchanged if None. Default: None
+
+        Returns
+        -------
+        NoiseModelTorch
+            the noise model itself
+
+        """
+        if exposure_time is not None:
+            self.exposure_time = exposure_time
+        if read_noise is not None:
+            self.read_noise = read_noise
+        if sky_brightness is not None:
+            self.sky_brightness_mag = sky_brightness
         if self.background_noise is None:
-            self.readout_noise = read_noise
+            self.readout_noise = self.read_noise
             if self.data_count_unit == 'ADU':
-                self.readout_noise /= self.ccd_gain
+                self.readout_noise = self.readout_noise/self.ccd_gain
 
-            self.sky_brightness = data_util.magnitude2cps(self.sky_brightness, self.magnitude_zero_point)
+            if torch.is_tensor(self.sky_brightness_mag):
+                # Same conversion as `data_util.magnitude2cps`, keeping the type and device of the tensor
+                self.sky_brightness = 10.0**(-(self.sky_brightness_mag - self.magnitude_zero_point)/2.5)
+            else:
+                self.sky_brightness = data_util.magnitude2cps(self.sky_brightness_mag, self.magnitude_zero_point)
             if self.data_count_unit == 'e-':
-                self.sky_brightness *= self.ccd_gain
+                self.sky_brightness = self.sky_brightness*self.ccd_gain
 
             self.exposure_time_tot = self.num_exposures * self.exposure_time
             self.readout_noise_tot = self.num_exposures * self.readout_noise**2.0
-            self.sky_per_pixel = self.sky_brightness * pixel_scale**2.0
+            self.sky_per_pixel = self.sky_brightness * self.pixel_scale**2.0
 
-        self.get_background_noise_sigma2 = getattr(self, 'get_background_noise_sigma2_composite') if self.background_noise is None else getattr(self, 'get_background_noise_sigma2_simple')
-        
         self.scaled_exposure_time = self.exposure_time
         if self.data_count_unit == 'ADU':
-            self.scaled_exposure_time *= self.ccd_gain
+            self.scaled_exposure_time = self.scaled_exposure_time*self.ccd_gain
+        return self
 
     def get_sky_noise_sigma2(self):
         """Compute the variance in sky noise
@@ -167,4 +197,38 @@ class NoiseModelTorch:
             the noise map in cps
 
         """
-        return torch.randn_like(img)*self.get_noise_sigma2(img)**0.5
\ No newline at end of file
+        return torch.randn_like(img)*self.get_noise_sigma2(img)**0.5
+
+def sample_noise_kwargs(noise_kwargs, batch_size, rng=None, dtype=torch.float32, device=None):
+    """Realize the noise kwargs of a batch of images, drawing one value per image for each kwarg configured as a distribution
+
+    A kwarg such as `exposure_time` in `cfg.observation` can be given as a distribution, in the format of the BNN prior parameters, e.g. `dict(dist='uniform', lower=50.0, upper=200.0)`.
+
+    Parameters
+    ----------
+    noise_kwargs : dict
+        the noise kwargs, e.g. from `BaobabConfig.get_noise_kwargs`
+    batch_size : int
+        number of images in the batch
+    rng : np.random.Generator or None
+        random number generator. If None, the global `np.random` state is used. Default: None
+    dtype : torch.dtype
+        type of the sampled tensors. Default: torch.float32
+    device : torch.device or None
+        device of the sampled tensors. Default: None
+
+    Returns
+    -------
+    dict
+        the noise kwargs to pass to `NoiseModelTorch`, with the distributions replaced by tensors of shape `[batch_size, 1, 1, 1]`. The observing conditions among them can also be passed to `NoiseModelTorch.set_conditions` of an existing model.
+
+    """
+    sampled_kwargs = {}
+    for name, value in noise_kwargs.items():
+        if isinstance(value, dict) and 'dist' in value:
+            hyperparams = dict(value)
+            dist = hyperparams.pop('dist')
+            values = getattr(baobab.distributions, 'sample_{:s}'.format(dist))(size=batch_size, rng=rng, **hyperparams)
+            value = torch.as_tensor(values, dtype=dtype, device=device).reshape(batch_size, 1, 1, 1)
+        sampled_kwargs[name] = value
+    return sampled_kwargs
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Generating the training data on the fly, as a torch dataset.
+
+The images are rendered by the same routines as `generate.py`, but streamed to the training loop instead of being written to disk. Each image has the random stream of its dataset index, so that a given index always yields the same image, whatever the number of dataloader workers.
+
+Example
+-------
+To stream batches of 32 noiseless images and their labels with 4 dataloader workers::
+
+    cfg = BaobabConfig.from_file('baobab/configs/tdlmc_diagonal_config.py')
+    dataset = OnlineDatasetTorch(cfg, ['lens_mass_theta_E', 'lens_mass_gamma'], batch_size=32)
+    loader = torch.utils.data.DataLoader(dataset, batch_size=None, num_workers=4)
+
+Noise can then be added online with `baobab.data_augmentation.noise_torch.NoiseModelTorch`.
+
+"""
+
+import queue
+import threading
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+from baobab.generate import instantiate_models, generate_single, add_time_delays, get_metadata
+__all__ = ['OnlineDatasetTorch']
+
+class OnlineDatasetTorch(IterableDataset):
+    """Iterable torch dataset yielding batches of images rendered from the BNN prior, without any disk I/O
+
+    Batch `b` consists of the dataset indices `b*batch_size` to `(b + 1)*batch_size - 1`, rendered with `generate.generate_single`, so that every index draws from its own random stream, independent of the other indices. When iterated by several dataloader workers, worker `w` of `n_workers` renders the batches `w`, `w + n_workers`, etc., and the dataloader interleaves them back into the same sequence of batches as a single process.
+    With a limited number of batches per epoch, epoch `e` renders the batches `first_batch + e*n_batches` onwards, so that every epoch sees new images. The epoch advances with each iteration over the dataset, in the main process or in persistent dataloader workers. With dataloader workers that are not persistent, which iterate over copies of the dataset, call `set_epoch` before each epoch.
+
+    Note
+    ----
+    The models are instantiated in each process on first iteration, and are not pickled along with the dataset. Like `generate.py`, the rendering of each index seeds the global NumPy state, for the third-party code that samples from it, so other code should not rely on the global state in the same process while prefetching.
+
+    """
+    def __init__(self, cfg, label_names, batch_size=32, n_batches=None, first_batch=0, prefetch=0, dtype=torch.float32):
+        """
+        Parameters
+        ----------
+        cfg : BaobabConfig
+            the baobab config
+        label_names : list of str
+            names of the metadata columns to stack into the label vector, e.g. `'lens_mass_theta_E'`
+        batch_size : int
+            number of images per batch. Default: 32
+        n_batches : int or None
+            number of batches per epoch. If None, the dataset is unlimited. Default: None
+        first_batch : int
+            index of the first batch, e.g. to continue the stream of an earlier run. Default: 0
+        prefetch : int
+            number of batches rendered ahead by a background thread of each process. If 0, the batches are rendered on demand. Default: 0
+        dtype : torch.dtype
+            type of the image and label tensors. Default: torch.float32
+
+        """
+        self.cfg = cfg
+        self.label_names = list(label_names)
+        self.batch_size = batch_size
+        self.n_batches = n_batches
+        self.first_batch = first_batch
+        self.prefetch = prefetch
+        self.dtype = dtype
+        self.epoch = 0
+        self.models = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Each worker process instantiates its own models
+        state['models'] = None
+        return state
+
+    def set_epoch(self, epoch):
+        """Set the epoch of the next iteration over the dataset
+
+        Parameters
+        ----------
+        epoch : int
+            the epoch
+
+        """
+        self.epoch = epoch
+
+    def get_batch_indices(self, epoch=0):
+        """Get the indices of the batches rendered by the current process
+
+        Parameters
+        ----------
+        epoch : int
+            the epoch, offsetting the batches by `epoch*n_batches` if `n_batches` is not None. Default: 0
+
+        Returns
+        -------
+        generator
+            the batch indices, unlimited if `n_batches` is None
+
+        """
+        worker_info = get_worker_info()
+        worker_id, n_workers = (0, 1) if worker_info is None else (worker_info.id, worker_info.num_workers)
+        first_batch = self.first_batch if self.n_batches is None else self.first_batch + epoch*self.n_batches
+        batch_i = first_batch + worker_id
+        while self.n_batches is None or batch_i < first_batch + self.n_batches:
+            yield batch_i
+            batch_i += n_workers
+
+    def generate_batch(self, batch_i):
+        """Render a batch of images and collect their labels
+
+        Parameters
+        ----------
+        batch_i : int
+            the batch index
+
+        Returns
+        -------
+        tuple of torch.Tensor
+            the images, of shape `[batch_size, 1, num_pix, num_pix]`, and the labels, of shape `[batch_size, len(label_names)]`
+
+        """
+        if self.models is None:
+            self.models = instantiate_models(self.cfg)
+        start_idx = batch_i*self.batch_size
+        imgs, samples, img_features_list = [], [], []
+        for idx in range(start_idx, start_idx + self.batch_size):
+            img, sample, img_features = generate_single(idx, self.cfg, self.models)
+            imgs.append(img)
+            samples.append(sample)
+            img_features_list.append(img_features)
+        if getattr(self.models.bnn_prior, 'time_delays_from_images', False):
+            add_time_delays(samples, img_features_list, self.models.bnn_prior)
+        labels = np.empty((self.batch_size, len(self.label_names)))
+        for i, (sample, img_features) in enumerate(zip(samples, img_features_list)):
+            meta = get_metadata(sample, img_features, self.cfg)
+            labels[i] = [meta[name] for name in self.label_names]
+        imgs = torch.as_tensor(np.stack(imgs)[:, np.newaxis], dtype=self.dtype)
+        return imgs, torch.as_tensor(labels, dtype=self.dtype)
+
+    def __iter__(self):
+        batch_indices = self.get_batch_indices(self.epoch)
+        self.epoch += 1
+        if self.prefetch > 0:
+            return self._iter_prefetched(batch_indices)
+        return (self.generate_batch(batch_i) for batch_i in batch_indices)
+
+    def _iter_prefetched(self, batch_indices):
+        """Iterate over the batches rendered ahead by a background thread
+
+        """
+        batches = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            # Give up once the consumer has stopped iterating
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def render():
+            try:
+                for batch_i in batch_indices:
+                    if not put(self.generate_batch(batch_i)):
+                        return
+                put(done)
+            except Exception as e:
+                put(e)
+
+        thread = threading.Thread(target=render, daemon=True)
+        thread.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is done:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            stop.set()
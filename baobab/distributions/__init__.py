@@ -1 +1,2 @@
-from .distributions import *
\ No newline at end of file
+from .distributions import *
+from .cdf_table import *
\ No newline at end of file
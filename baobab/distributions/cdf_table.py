@@ -0,0 +1,106 @@
+import numpy as np
+from .distributions import get_rng
+
+__all__ = ['CDFTable']
+
+class CDFTable:
+    """Precomputed cumulative distribution tables of PMFs on a fixed grid, sampled by inverse-CDF lookup
+
+    The PMF may depend on a conditioning variable, e.g. the redshift, through bins of that variable, in which case one table is stored per bin. Sampling a value costs a binary search in the table of its bin, and any number of values can be drawn in a single vectorized call.
+
+    Note
+    ----
+    The lookup is the one performed by `np.random.Generator.choice` with replacement and probabilities, consuming one uniform number per value drawn.
+
+    """
+    def __init__(self, grid, pmfs, bin_edges=None):
+        """
+        Parameters
+        ----------
+        grid : array-like
+            the values to sample, of length `n_grid`
+        pmfs : array-like
+            the unnormalized PMF on the grid, of shape `[n_grid]`, or one PMF per bin, of shape `[n_bins, n_grid]`
+        bin_edges : array-like or None
+            the right edges of the bins, in increasing order, if the PMF depends on a conditioning variable. A value `z` falls into the first bin whose right edge is greater than `z`. Default: None
+
+        """
+        self.grid = np.asarray(grid)
+        pmfs = np.atleast_2d(np.asarray(pmfs, dtype=np.float64))
+        if pmfs.shape[1] != len(self.grid):
+            raise ValueError("The PMFs have {:d} entries but the grid has {:d}.".format(pmfs.shape[1], len(self.grid)))
+        self.bin_edges = None if bin_edges is None else np.asarray(bin_edges, dtype=np.float64)
+        if self.bin_edges is not None and len(self.bin_edges) != pmfs.shape[0]:
+            raise ValueError("Got {:d} PMFs for {:d} bins.".format(pmfs.shape[0], len(self.bin_edges)))
+        cdfs = np.cumsum(pmfs, axis=1)
+        self.cdfs = cdfs/cdfs[:, -1:]
+
+    @classmethod
+    def from_binned_function(cls, func, grid, bin_edges):
+        """Tabulate a function of a conditioning variable and the grid that is piecewise constant in the bins of the conditioning variable
+
+        Parameters
+        ----------
+        func : callable
+            the unnormalized PMF, called as `func(z, grid)`
+        grid : array-like
+            the values to sample
+        bin_edges : array-like
+            the right edges of the bins of `z` in increasing order, the last being `np.inf`
+
+        Returns
+        -------
+        CDFTable
+            the table, with one CDF per bin
+
+        """
+        bin_edges = np.asarray(bin_edges, dtype=np.float64)
+        # A value of the conditioning variable in each bin, its left edge
+        z_in_bins = np.concatenate([[bin_edges[0] - 1.0], bin_edges[:-1]])
+        return cls(grid, [func(z, grid) for z in z_in_bins], bin_edges)
+
+    def get_bin(self, z):
+        """Get the index of the bin of each value of the conditioning variable
+
+        Parameters
+        ----------
+        z : float or array-like
+            the conditioning variable
+
+        Returns
+        -------
+        int or np.array
+            the bin indices
+
+        """
+        return np.minimum(np.searchsorted(self.bin_edges, z, side='right'), len(self.bin_edges) - 1)
+
+    def sample(self, z=None, size=None, rng=None):
+        """Sample from the table
+
+        Parameters
+        ----------
+        z : float, array-like, or None
+            the conditioning variable, if the table is binned. If an array, one value is drawn for each entry and `size` is ignored.
+        size : int or None
+            number of values to draw. If None, a single value is returned. Default: None
+        rng : np.random.Generator or None
+            random number generator. If None, the global `np.random` state is used. Default: None
+
+        Returns
+        -------
+        float or np.array
+            the sampled values
+
+        """
+        if self.bin_edges is None or np.ndim(z) == 0:
+            cdf = self.cdfs[0 if self.bin_edges is None else self.get_bin(z)]
+            return self.grid[np.searchsorted(cdf, get_rng(rng).random(size), side='right')]
+        # Search the table of each bin for all its values at once. Offsetting the tables of the bins into a single table would round `u` close to 1 into the next bin.
+        bin_i = self.get_bin(z)
+        u = get_rng(rng).random(np.shape(z))
+        idx = np.empty(np.shape(z), dtype=np.int64)
+        for b in np.unique(bin_i):
+            in_bin = (bin_i == b)
+            idx[in_bin] = np.searchsorted(self.cdfs[b], u[in_bin], side='right')
+        return self.grid[idx]
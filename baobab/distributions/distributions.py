@@ -1,6 +1,7 @@
 import inspect
 import numpy as np
 import scipy.stats as stats
+import scipy.special as special
 import numba
 from math import gamma, erf
 
@@ -10,9 +11,58 @@ __all__ += ['sample_multivar_normal','sample_one_minus_rayleigh']
 __all__ += ['eval_{:s}_pdf'.format(d) for d in dist_names]
 __all__ += ['eval_{:s}_logpdf'.format(d) for d in dist_names]
 __all__ += ['eval_{:s}_logpdf_approx'.format(d) for d in dist_names]
-__all__ += ['hyperparams']
+__all__ += ['hyperparams', 'get_rng']
 
-def sample_uniform(lower, upper):
+def get_rng(rng):
+    """Get the random number generator to sample with
+
+    Parameters
+    ----------
+    rng : np.random.Generator or None
+        the generator. If None, the global `np.random` state is used.
+
+    Note
+    ----
+    Only methods shared by `np.random.Generator` and the `np.random` module are called on
+    the returned object.
+
+    """
+    return np.random if rng is None else rng
+
+def _sample_truncated_standard_normal(a, b, size, rng):
+    """Sample from the standard normal truncated to [a, b] by inverse-CDF sampling
+
+    Parameters
+    ----------
+    a : float
+        min value in units of sigma
+    b : float
+        max value in units of sigma
+    size : int or None
+        number of samples to draw
+    rng : np.random.Generator or np.random
+        the random number generator
+
+    Note
+    ----
+    The interval is reflected into the lower tail, where the CDF is resolved to full
+    relative precision, so that truncation far into either tail remains accurate.
+
+    """
+    flip = a > 0.0
+    if flip:
+        a, b = -b, -a
+    cdf_a = special.ndtr(a)
+    cdf_b = special.ndtr(b)
+    u = rng.random(size)
+    sample = special.ndtri(cdf_a + u*(cdf_b - cdf_a))
+    # Guard against round-off at the edges of the interval
+    sample = np.clip(sample, a, b)
+    if flip:
+        sample = -sample
+    return sample
+
+def sample_uniform(lower, upper, size=None, rng=None):
     """Sample from a uniform distribution
 
     Parameters
@@ -21,14 +71,18 @@ def sample_uniform(lower, upper):
         min value
     upper : float
         max value
+    size : int or None
+        number of samples to draw. If None, a single float is returned. Default: None
+    rng : np.random.Generator or None
+        random number generator. If None, the global `np.random` state is used. Default: None
 
     Returns
     -------
-    float
-        uniform sample
+    float or np.array
+        uniform sample(s)
 
     """
-    u = np.random.rand()
+    u = get_rng(rng).random(size)
     sample = lower + (upper - lower)*u
     return sample
 
@@ -65,7 +119,7 @@ def eval_uniform_logpdf_approx(eval_at, lower, upper):
     normed_eval_logpdf[eval_at>upper] -= np.abs(eval_at[eval_at>upper]-upper) + 1000
     return normed_eval_logpdf
 
-def sample_one_minus_rayleigh(scale, lower):
+def sample_one_minus_rayleigh(scale, lower, size=None, rng=None):
     """Samples from a Rayleigh distribution and gets one minus the value,
     often used for ellipticity modulus
 
@@ -75,19 +129,29 @@ def sample_one_minus_rayleigh(scale, lower):
         scale of the Rayleigh distribution
     lower : float
         min allowed value of the one minus Rayleigh sample
+    size : int or None
+        number of samples to draw. If None, a single float is returned. Default: None
+    rng : np.random.Generator or None
+        random number generator. If None, the global `np.random` state is used. Default: None
+
+    Note
+    ----
+    The Rayleigh distribution is truncated at `1 - lower` by inverse-CDF sampling.
 
     Returns
     -------
-    float
-        one minus the Rayleigh sample
+    float or np.array
+        one minus the Rayleigh sample(s)
 
     """
-    q = 0.0
-    while q < lower:
-        q = 1.0 - np.random.rayleigh(scale, size=None)
+    # CDF of the Rayleigh distribution at the truncation
+    cdf_max = -np.expm1(-0.5*((1.0 - lower)/scale)**2.0)
+    u = get_rng(rng).random(size)
+    rayleigh = scale*np.sqrt(-2.0*np.log1p(-u*cdf_max))
+    q = 1.0 - rayleigh
     return q
 
-def sample_normal(mu, sigma, lower=-np.inf, upper=np.inf):
+def sample_normal(mu, sigma, lower=-np.inf, upper=np.inf, size=None, rng=None):
     """Samples from a normal distribution, optionally truncated
 
     Parameters
@@ -100,18 +164,24 @@ def sample_normal(mu, sigma, lower=-np.inf, upper=np.inf):
         min value (default: -np.inf)
     upper : float
         max value (default: np.inf)
+    size : int or None
+        number of samples to draw. If None, a single float is returned. Default: None
+    rng : np.random.Generator or None
+        random number generator. If None, the global `np.random` state is used. Default: None
 
     Returns 
     -------
-    float
-        a sample from the specified normal
+    float or np.array
+        sample(s) from the specified normal
 
     """
-    sample = stats.truncnorm((lower - mu)/sigma, (upper - mu)/sigma,
-                             loc=mu, scale=sigma).rvs()
+    rng = get_rng(rng)
+    if lower == -np.inf and upper == np.inf:
+        return mu + sigma*rng.standard_normal(size)
+    sample = mu + sigma*_sample_truncated_standard_normal((lower - mu)/sigma, (upper - mu)/sigma, size, rng)
     return sample
 
-def sample_lognormal(mu, sigma, lower=-np.inf, upper=np.inf):
+def sample_lognormal(mu, sigma, lower=-np.inf, upper=np.inf, size=None, rng=None):
     """Samples from a lognormal distribution, optionally truncated
 
     Parameters
@@ -124,15 +194,18 @@ def sample_lognormal(mu, sigma, lower=-np.inf, upper=np.inf):
         min value (default: -np.inf)
     upper : float
         max value (default: np.inf)
+    size : int or None
+        number of samples to draw. If None, a single float is returned. Default: None
+    rng : np.random.Generator or None
+        random number generator. If None, the global `np.random` state is used. Default: None
 
     Returns 
     -------
-    float
-        a sample from the specified normal
+    float or np.array
+        sample(s) from the specified lognormal
 
     """
-    sample = np.exp(stats.truncnorm((lower - mu)/sigma, (upper - mu)/sigma,
-                             loc=mu, scale=sigma).rvs())
+    sample = np.exp(sample_normal(mu, sigma, lower=lower, upper=upper, size=size, rng=rng))
     return sample
 
 def eval_normal_pdf(eval_at, mu, sigma, lower=-np.inf, upper=np.inf):
@@ -262,7 +335,7 @@ def eval_lognormal_logpdf_approx(eval_at, mu, sigma, lower=0, upper=np.inf):
     eval_normed_logpdf=eval_normed_logpdf.reshape(eval_shape)
     return eval_normed_logpdf
 
-def sample_multivar_normal(mu, cov_mat, is_log=None, lower=-np.inf, upper=np.inf):
+def sample_multivar_normal(mu, cov_mat, is_log=None, lower=-np.inf, upper=np.inf, size=None, rng=None):
     """Samples from an N-dimensional normal distribution, optionally truncated
 
     An error will be raised if the cov_mat is not PSD.
@@ -279,15 +352,20 @@ def sample_multivar_normal(mu, cov_mat, is_log=None, lower=-np.inf, upper=np.inf
         min values (default: None)
     upper : None, float, or 1-D array_like, of length N
         max values (default: None)
+    size : int or None
+        number of samples to draw. If None, a single sample of shape [N,] is returned. Default: None
+    rng : np.random.Generator or None
+        random number generator. If None, the global `np.random` state is used. Default: None
 
     Returns
     -------
-    float
-        a sample from the specified N-dimensional normal
+    np.array of shape [N,] or [size, N]
+        sample(s) from the specified N-dimensional normal
 
         """
+    rng = get_rng(rng)
     N = len(mu)
-    sample = np.random.multivariate_normal(mean=mu, cov=cov_mat, check_valid='raise')
+    sample = rng.multivariate_normal(mean=mu, cov=cov_mat, size=size, check_valid='raise')
 
     # TODO: get the PDF, scaled for truncation
     # TODO: issue warning if significant portion of marginal PDF is truncated
@@ -295,17 +373,20 @@ def sample_multivar_normal(mu, cov_mat, is_log=None, lower=-np.inf, upper=np.inf
         if not (len(lower) == N and len(upper) == N):
             raise ValueError("lower and upper bounds must have length (# of parameters)")
         # Reject samples outside of bounds, repeat sampling until accepted
-        while not np.all([np.greater(sample, lower), np.greater(upper, sample)]):
-            print(sample)
-            print(lower, upper)
-            sample = np.random.multivariate_normal(mean=mu, cov=cov_mat)
+        sample = np.atleast_2d(sample)
+        rejected = ~np.all(np.logical_and(np.greater(sample, lower), np.greater(upper, sample)), axis=-1)
+        while np.any(rejected):
+            sample[rejected] = rng.multivariate_normal(mean=mu, cov=cov_mat, size=np.sum(rejected))
+            rejected = ~np.all(np.logical_and(np.greater(sample, lower), np.greater(upper, sample)), axis=-1)
+        if size is None:
+            sample = sample[0]
     
     if is_log is not None:
-        sample[is_log] = np.exp(sample[is_log])
+        sample[..., is_log] = np.exp(sample[..., is_log])
 
     return sample
 
-def sample_beta(a, b, lower=0.0, upper=1.0):
+def sample_beta(a, b, lower=0.0, upper=1.0, size=None, rng=None):
     """Samples from a beta distribution, scaled/shifted
 
     Parameters
@@ -318,14 +399,18 @@ def sample_beta(a, b, lower=0.0, upper=1.0):
         min value (default: 0.0)
     upper : float
         max value (default: 1.0)
+    size : int or None
+        number of samples to draw. If None, a single float is returned. Default: None
+    rng : np.random.Generator or None
+        random number generator. If None, the global `np.random` state is used. Default: None
 
     Returns 
     -------
-    float
-        a sample from the specified beta
+    float or np.array
+        sample(s) from the specified beta
     
     """
-    sample = np.random.beta(a, b)
+    sample = get_rng(rng).beta(a, b, size=size)
     sample = sample*(upper - lower) + lower
     # TODO: check if same as
     # stats.beta(a=a, b=b, loc=lower, scale=upper-lower).rvs()
@@ -397,7 +482,7 @@ def eval_beta_logpdf_approx(eval_at,a,b,lower,upper):
     eval_logpdf=eval_logpdf.reshape(eval_shape)
     return eval_logpdf
 
-def sample_generalized_normal(mu=0.0, alpha=1.0, p=10.0, lower=-np.inf, upper=np.inf):
+def sample_generalized_normal(mu=0.0, alpha=1.0, p=10.0, lower=-np.inf, upper=np.inf, size=None, rng=None):
     """Samples from a generalized normal distribution, optionally truncated
 
     Note
@@ -421,21 +506,62 @@ def sample_generalized_normal(mu=0.0, alpha=1.0, p=10.0, lower=-np.inf, upper=np
         min value (default: -np.inf)
     upper : float
         max value (default: np.inf)
+    size : int or None
+        number of samples to draw. If None, a single float is returned. Default: None
+    rng : np.random.Generator or None
+        random number generator. If None, the global `np.random` state is used. Default: None
+
+    Note
+    ----
+    Untruncated samples are drawn from ``|z|**p ~ Gamma(1/p)`` with ``z = (x - mu)/alpha``.
+    Truncation is done by vectorized rejection when most of the mass lies within the bounds,
+    and otherwise by inverse-CDF sampling, with the CDF ``0.5*(1 + sign(z)*P(1/p, |z|**p))``
+    where ``P`` is the regularized lower incomplete gamma function.
+
+    Returns
+    -------
+    float or np.array
+        sample(s) from the specified generalized normal
 
     References
     ----------
     .. [1] `"Generalized normal distribution, Version 1" <https://en.wikipedia.org/wiki/Generalized_normal_distribution#Version_1>`_
 
     """
-    sample = stats.gennorm.rvs(size=None, beta=p, loc=mu, scale=alpha)
-    # Reject samples outside of bounds, repeat sampling until accepted
-    out_of_bounds = not np.logical_and(np.greater(sample, lower), np.greater(upper, sample))
-    #print(out_of_bounds, sample, lower, upper)
-    while out_of_bounds is True:
-        sample = stats.gennorm.rvs(size=None, beta=p, loc=mu, scale=alpha)
-        out_of_bounds = not np.logical_and(np.greater(sample, lower), np.greater(upper, sample))
+    rng = get_rng(rng)
+    if lower == -np.inf and upper == np.inf:
+        return _sample_untruncated_generalized_normal(mu, alpha, p, size, rng)
+    # Signed CDF, i.e. 2*CDF - 1, at the bounds
+    z_bounds = (np.array([lower, upper], dtype=float) - mu)/alpha
+    signed_cdf_bounds = np.sign(z_bounds)*special.gammainc(1.0/p, np.abs(z_bounds)**p)
+    acceptance = 0.5*(signed_cdf_bounds[1] - signed_cdf_bounds[0])
+    if acceptance > 0.5:
+        # Vectorized rejection, oversampling by the expected acceptance
+        n_samples = 1 if size is None else size
+        sample = np.empty(0)
+        while len(sample) < n_samples:
+            n_draws = int(np.ceil((n_samples - len(sample))/acceptance)) + 1
+            draws = _sample_untruncated_generalized_normal(mu, alpha, p, n_draws, rng)
+            draws = draws[np.logical_and(np.greater(draws, lower), np.greater(upper, draws))]
+            sample = np.concatenate([sample, draws])
+        sample = sample[:n_samples]
+        return sample[0] if size is None else sample
+    u = signed_cdf_bounds[0] + rng.random(size)*(signed_cdf_bounds[1] - signed_cdf_bounds[0])
+    z = np.sign(u)*special.gammaincinv(1.0/p, np.abs(u))**(1.0/p)
+    sample = np.clip(mu + alpha*z, lower, upper)
     return sample
 
+def _sample_untruncated_generalized_normal(mu, alpha, p, size, rng):
+    """Sample from the generalized normal without truncation
+
+    See `sample_generalized_normal` for parameter definitions.
+
+    """
+    # |z|**p is gamma-distributed with shape 1/p
+    abs_z = rng.gamma(1.0/p, size=size)**(1.0/p)
+    sign = np.where(rng.random(size) < 0.5, -1.0, 1.0)
+    return mu + alpha*sign*abs_z
+
 def eval_generalized_normal_pdf(eval_at, mu=0.0, alpha=1.0, p=10.0, lower=-np.inf, upper=np.inf):
     """Evaluate the generalized normal pdf, scaled/shifted
 
@@ -527,4 +653,4 @@ def eval_generalized_normal_logpdf_approx(eval_at, mu=0.0, alpha=1.0, p=10.0, lo
 hyperparams = {}
 for dist_name in dist_names:
     sampling_f = globals()['sample_{:s}'.format(dist_name)]
-    hyperparams[dist_name] = inspect.getargspec(sampling_f).args
\ No newline at end of file
+    hyperparams[dist_name] = [arg for arg in inspect.getargspec(sampling_f).args if arg not in ['size', 'rng']]
\ No newline at end of file
@@ -9,16 +9,41 @@ To run this script, pass in the desired config file as argument::
 
     $ generate baobab/configs/tdlmc_diagonal_config.py --n_data 1000
 
+To shard the rendering across a pool of 8 worker processes, pass in `--n_workers`::
+
+    $ generate baobab/configs/tdlmc_diagonal_config.py --n_data 1000 --n_workers 8
+
+The output does not depend on the number of workers.
+
+To stream the images and metadata into a single chunked HDF5 file instead of one `.npy` file per image, pass in `--output_format hdf5`, optionally with a compression filter::
+
+    $ generate baobab/configs/tdlmc_diagonal_config.py --n_data 1000 --output_format hdf5 --compression lzf
+
+To store the images in a reduced precision, pass in `--precision`, one of 'float64' (default), 'float32', 'float16', 'asinh_uint16', and 'log_uint16'. The uint16 precisions quantize the asinh- or log-scaled flux of each image, whose scale is stored in the metadata columns `img_scale_*`, and are softened by the background noise `--noise_floor` if given::
+
+    $ generate baobab/configs/tdlmc_diagonal_config.py --n_data 1000 --precision asinh_uint16 --noise_floor 0.01
+
+The error of each image introduced by the reduced precision is stored in the metadata columns `img_roundtrip_*`, and summarized at the end of the run. Given a noise floor, the error is also compared to the noise of each pixel, i.e. the noise floor and the Poisson noise of the configured exposure time.
+
+To write the metadata as a Parquet dataset `metadata.parquet` with typed and fixed-size list columns instead of `metadata.csv`, pass in `--metadata_format parquet`.
+
+After each checkpoint chunk is written, the manifest `manifest.json` in the destination folder records the number of complete indices, the random stream of the next index, and the selection tallies. To resume an interrupted run from its last checkpoint, rerun the same command with `--resume`::
+
+    $ generate baobab/configs/tdlmc_diagonal_config.py --n_data 1000 --resume
+
+The resumed run discards any output beyond the last checkpoint and yields the same dataset as an uninterrupted run.
+
 """
 
 import os, sys
+import re
+import csv
 import random
 import argparse
-import gc
+import multiprocessing
 from types import SimpleNamespace
 from tqdm import tqdm
 import numpy as np
-import pandas as pd
 # Lenstronomy modules
 import lenstronomy
 print("Lenstronomy path being used: {:s}".format(lenstronomy.__path__[0]))
@@ -26,12 +51,13 @@ from lenstronomy.LensModel.lens_model import LensModel
 from lenstronomy.LensModel.Solver.lens_equation_solver import LensEquationSolver
 from lenstronomy.LightModel.light_model import LightModel
 from lenstronomy.PointSource.point_source import PointSource
-from lenstronomy.SimulationAPI.data_api import DataAPI
 import lenstronomy.Util.util as util
 # Baobab modules
 from baobab.configs import BaobabConfig
 import baobab.bnn_priors as bnn_priors
-from baobab.sim_utils import instantiate_PSF_models, get_PSF_model, generate_image, Selection
+from baobab.io_utils import HDF5Writer, MetadataBuffer, ParquetMetadataWriter, write_manifest, read_manifest, PRECISIONS, ImageEncoder, get_roundtrip_errors
+from baobab.data_augmentation import NoiseModelNumpy
+from baobab.sim_utils import instantiate_PSF_models, generate_image, find_bright_images, RenderContext, Selection, MagnificationScreen, BatchImageFinder, BROADCASTING_LENS_PROFILES
 
 def parse_args():
     """Parse command-line arguments
@@ -41,134 +67,727 @@ def parse_args():
     parser.add_argument('config', help='train config file path')
     parser.add_argument('--n_data', default=None, dest='n_data', type=int,
                         help='size of dataset to generate (overrides config file)')
+    parser.add_argument('--n_workers', default=1, dest='n_workers', type=int,
+                        help='number of worker processes among which to shard the dataset indices. Default: 1')
+    parser.add_argument('--output_format', default='npy', dest='output_format', type=str,
+                        choices=['npy', 'hdf5'],
+                        help='format of the output: one .npy file per image with metadata.csv, or a single HDF5 file. Default: npy')
+    parser.add_argument('--compression', default=None, dest='compression', type=str,
+                        choices=['gzip', 'lzf'],
+                        help='compression filter of the images in the HDF5 file. Default: None')
+    parser.add_argument('--metadata_format', default='csv', dest='metadata_format', type=str,
+                        choices=['csv', 'parquet'],
+                        help='format of the metadata written next to the images. Default: csv')
+    parser.add_argument('--precision', default=None, dest='precision', type=str,
+                        choices=PRECISIONS,
+                        help='storage precision of the images (overrides config file). Default: float64')
+    parser.add_argument('--noise_floor', default=None, dest='noise_floor', type=float,
+                        help='standard deviation of the background noise, softening the uint16 precisions and the unit of their round-trip errors (overrides config file)')
+    parser.add_argument('--resume', default=False, dest='resume', action='store_true',
+                        help='resume an interrupted run from the last checkpoint recorded in the destination folder')
     args = parser.parse_args()
     # sys.argv rerouting for setuptools entry point
     if args is None:
         args = SimpleNamespace()
         args.config = sys.argv[0]
         args.n_data = sys.argv[1]
+        args.n_workers = 1
+        args.output_format = 'npy'
+        args.compression = None
+        args.metadata_format = 'csv'
+        args.precision = None
+        args.noise_floor = None
+        args.resume = False
     return args
 
-def main():
-    args = parse_args()
-    cfg = BaobabConfig.from_file(args.config)
-    if args.n_data is not None:
-        cfg.n_data = args.n_data
-    # Seed for reproducibility
-    np.random.seed(cfg.seed)
-    random.seed(cfg.seed)
-    # Create data directory
-    save_dir = cfg.out_dir
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-        print("Destination folder path: {:s}".format(save_dir))
-        print("Log path: {:s}".format(cfg.log_path))
-        cfg.export_log()
-    else:
-        raise OSError("Destination folder already exists.")
+def get_idx_seed(seed, idx):
+    """Derive the seed of the random stream dedicated to a single dataset index
+
+    Each index is generated from its own stream, so the image and metadata at `idx`
+    do not depend on how many samples were rejected at earlier indices or on which
+    worker rendered it.
+
+    Parameters
+    ----------
+    seed : int
+        the global seed, `cfg.seed`
+    idx : int
+        the dataset index
+
+    Returns
+    -------
+    int
+        the seed of the random stream for `idx`
+
+    """
+    return int(np.random.SeedSequence(seed, spawn_key=(idx,)).generate_state(1)[0])
+
+def get_idx_rng(seed, idx):
+    """Get the counter-based random number generator dedicated to a single dataset index
+
+    The generator is a Philox generator keyed by the child of `SeedSequence(seed)` with spawn key `(idx,)`,
+    i.e. the `idx`-th child returned by `SeedSequence(seed).spawn`, without spawning the earlier children.
+    It is threaded through the BNN prior and the samplers, so any subset of indices can be regenerated
+    bit for bit, on any worker and in any order.
+
+    Parameters
+    ----------
+    seed : int
+        the global seed, `cfg.seed`
+    idx : int
+        the dataset index
+
+    Returns
+    -------
+    np.random.Generator
+        the generator for `idx`
+
+    """
+    return np.random.Generator(np.random.Philox(np.random.SeedSequence(seed, spawn_key=(idx,))))
+
+def instantiate_models(cfg):
+    """Instantiate the lenstronomy models, selection, and BNN prior used to render the images
+
+    Each worker process holds its own instances.
+
+    Parameters
+    ----------
+    cfg : BaobabConfig
+        the baobab config
+
+    Returns
+    -------
+    SimpleNamespace
+        the instantiated models
+
+    """
+    models = SimpleNamespace()
     # Instantiate PSF models
-    psf_models = instantiate_PSF_models(cfg.psf, cfg.instrument.pixel_scale)
-    n_psf = len(psf_models)
+    models.psf_models = instantiate_PSF_models(cfg.psf, cfg.instrument.pixel_scale)
+    models.n_psf = len(models.psf_models)
+    # Render contexts, built on first use for each PSF
+    models.render_contexts = {}
     # Instantiate density models
     kwargs_model = dict(
                     lens_model_list=[cfg.bnn_omega.lens_mass.profile, cfg.bnn_omega.external_shear.profile],
                     source_light_model_list=[cfg.bnn_omega.src_light.profile],
-                    )       
-    lens_mass_model = LensModel(lens_model_list=kwargs_model['lens_model_list'])
-    src_light_model = LightModel(light_model_list=kwargs_model['source_light_model_list'])
-    lens_eq_solver = LensEquationSolver(lens_mass_model)
-    lens_light_model = None
-    ps_model = None                                     
+                    )
+    models.lens_mass_model = LensModel(lens_model_list=kwargs_model['lens_model_list'])
+    models.src_light_model = LightModel(light_model_list=kwargs_model['source_light_model_list'])
+    models.lens_eq_solver = LensEquationSolver(models.lens_mass_model)
+    # Solver of the point-source images of a whole batch of candidates, if the lens profiles broadcast
+    models.image_finder = None
+    if 'agn_light' in cfg.components and all(profile in BROADCASTING_LENS_PROFILES for profile in kwargs_model['lens_model_list']):
+        models.image_finder = BatchImageFinder(kwargs_model['lens_model_list'], cfg.instrument.pixel_scale, cfg.image.num_pix)
+    models.lens_light_model = None
+    models.ps_model = None
     if 'lens_light' in cfg.components:
         kwargs_model['lens_light_model_list'] = [cfg.bnn_omega.lens_light.profile]
-        lens_light_model = LightModel(light_model_list=kwargs_model['lens_light_model_list'])
+        models.lens_light_model = LightModel(light_model_list=kwargs_model['lens_light_model_list'])
     if 'agn_light' in cfg.components:
         kwargs_model['point_source_model_list'] = [cfg.bnn_omega.agn_light.profile]
-        ps_model = PointSource(point_source_type_list=kwargs_model['point_source_model_list'], fixed_magnification_list=[False])
+        models.ps_model = PointSource(point_source_type_list=kwargs_model['point_source_model_list'], fixed_magnification_list=[False])
     # Instantiate Selection object
-    selection = Selection(cfg.selection, cfg.components)
+    models.selection = Selection(cfg.selection, cfg.components)
+    # Instantiate the pre-render magnification screen
+    models.magnification_screen = None
+    if cfg.selection.magnification.screen:
+        models.magnification_screen = MagnificationScreen(models.lens_mass_model, models.src_light_model, cfg.components, cfg.selection.magnification.min)
     # Initialize BNN prior
-    bnn_prior = getattr(bnn_priors, cfg.bnn_prior_class)(cfg.bnn_omega, cfg.components)
-    # Initialize empty metadata dataframe
-    metadata = pd.DataFrame()
-    metadata_path = os.path.join(save_dir, 'metadata.csv')
-    current_idx = 0 # running idx of dataset
-    pbar = tqdm(total=cfg.n_data)
-    while current_idx < cfg.n_data:
-        sample = bnn_prior.sample() # FIXME: sampling in batches
-        # Selections on sampled parameters
-        if selection.reject_initial(sample):
-            continue
-        psf_model = get_PSF_model(psf_models, n_psf, current_idx)
-        # Instantiate the image maker data_api with detector and observation conditions 
+    models.bnn_prior = getattr(bnn_priors, cfg.bnn_prior_class)(cfg.bnn_omega, cfg.components)
+    # Derive the observables of the accepted candidates only
+    models.bnn_prior.defer_observables = True
+    if 'agn_light' in cfg.components and hasattr(models.bnn_prior, 'time_delays_from_images'):
+        # Evaluate the time delays of a chunk at once, at the image positions solved for while rendering
+        models.bnn_prior.time_delays_from_images = models.bnn_prior.time_delays.calculate_time_delays
+    # Encoder of the images into their storage precision
+    models.image_encoder = ImageEncoder(**cfg.output_precision)
+    # Noise of the images above the noise floor, the reference of the round-trip errors of the encoding
+    models.noise_model = None
+    noise_kwargs = {k: v for k, v in cfg.get_noise_kwargs().items() if not isinstance(v, dict)}
+    if cfg.output_precision.noise_floor is not None and 'exposure_time' in noise_kwargs:
+        noise_kwargs.update(background_noise=cfg.output_precision.noise_floor)
+        models.noise_model = NoiseModelNumpy(**noise_kwargs)
+    # Metadata buffer of a checkpoint chunk, reused across chunks
+    models.metadata_buffer = MetadataBuffer(cfg.checkpoint_interval)
+    return models
+
+def get_render_context(idx, cfg, models):
+    """Get the render context of the PSF used at the given index, building it on first use
+
+    Parameters
+    ----------
+    idx : int
+        the dataset index
+    cfg : BaobabConfig
+        the baobab config
+    models : SimpleNamespace
+        the models returned by `instantiate_models`
+
+    Returns
+    -------
+    RenderContext
+        the detector and image models of the PSF
+
+    """
+    psf_i = idx%models.n_psf
+    if psf_i not in models.render_contexts:
+        psf_model = models.psf_models[psf_i]
         kwargs_detector = util.merge_dicts(cfg.instrument, cfg.bandpass, cfg.observation)
+        # Observing conditions sampled per image only enter the noise added online, not the noiseless images
+        kwargs_detector = {k: v for k, v in kwargs_detector.items() if not isinstance(v, dict)}
+        kwargs_detector.setdefault('exposure_time', 1.0)
         kwargs_detector.update(seeing=cfg.psf.fwhm,
                                psf_type=cfg.psf.type,
                                kernel_point_source=psf_model,
                                background_noise=0.0)
-        data_api = DataAPI(cfg.image.num_pix, **kwargs_detector)
-        # Generate the image
-        img, img_features = generate_image(sample, psf_model, data_api, lens_mass_model, src_light_model, lens_eq_solver, cfg.instrument.pixel_scale, cfg.image.num_pix, cfg.components, cfg.numerics, min_magnification=cfg.selection.magnification.min, lens_light_model=lens_light_model, ps_model=ps_model)
-        if img is None: # couldn't make the magnification cut
+        models.render_contexts[psf_i] = RenderContext(psf_model, kwargs_detector, cfg.image.num_pix, models.lens_mass_model, models.src_light_model, cfg.numerics, lens_light_model=models.lens_light_model, ps_model=models.ps_model)
+    return models.render_contexts[psf_i]
+
+def get_metadata(sample, img_features, cfg):
+    """Collect the labels of a single image into a flat dictionary
+
+    Parameters
+    ----------
+    sample : dict
+        sampled model parameters
+    img_features : dict
+        image features returned by `generate_image`
+    cfg : BaobabConfig
+        the baobab config
+
+    Returns
+    -------
+    dict
+        the metadata row of the image
+
+    """
+    meta = {}
+    for comp in cfg.components:
+        for param_name, param_value in sample[comp].items():
+            meta['{:s}_{:s}'.format(comp, param_name)] = param_value
+    #if cfg.bnn_prior_class in ['DiagonalCosmoBNNPrior']:
+    #    if cfg.bnn_omega.time_delays.calculate_time_delays:
+    #        # Order time delays in increasing dec
+    #        unordered_td = sample['misc']['true_td'] # np array
+    #        increasing_dec_i = np.argsort(img_features['y_image'])
+    #        td = unordered_td[increasing_dec_i]
+    #        td = td[1:] - td[0] # take BCD - A
+    #        sample['misc']['true_td'] = list(td)
+    #        img_features['x_image'] = img_features['x_image'][increasing_dec_i]
+    #        img_features['y_image'] = img_features['y_image'][increasing_dec_i]
+    if cfg.bnn_prior_class in ['EmpiricalBNNPrior', 'DiagonalCosmoBNNPrior']:
+        for misc_name, misc_value in sample['misc'].items():
+            meta['{:s}'.format(misc_name)] = misc_value
+    if 'agn_light' in cfg.components:
+        x_image = np.zeros(4)
+        y_image = np.zeros(4)
+        n_img = len(img_features['x_image'])
+        meta['n_img'] = n_img
+        x_image[:n_img] = img_features['x_image']
+        y_image[:n_img] = img_features['y_image']
+        for i in range(4):
+            meta['x_image_{:d}'.format(i)] = x_image[i]
+            meta['y_image_{:d}'.format(i)] = y_image[i]
+    meta['total_magnification'] = img_features['total_magnification']
+    return meta
+
+def find_image_positions(samples, image_finder):
+    """Solve for the point-source image positions of a list of samples at once
+
+    Parameters
+    ----------
+    samples : list of dict
+        sampled model parameters of each candidate
+    image_finder : BatchImageFinder
+        the image finder
+
+    Returns
+    -------
+    list of tuple of np.array
+        the x and y coordinates of the images of each sample in arcsec
+
+    """
+    kwargs_lens = [{k: np.array([s[comp][k] for s in samples]) for k in samples[0][comp]} for comp in ['lens_mass', 'external_shear']]
+    x_src = np.array([s['src_light']['center_x'] for s in samples])
+    y_src = np.array([s['src_light']['center_y'] for s in samples])
+    x_image, y_image, n_img = image_finder.find_images(x_src, y_src, kwargs_lens)
+    return [(x_image[i, :n_img[i]], y_image[i, :n_img[i]]) for i in range(len(samples))]
+
+def generate_single(idx, cfg, models):
+    """Sample parameters until they pass the selections, and render the image at the given index
+
+    Parameters
+    ----------
+    idx : int
+        the dataset index
+    cfg : BaobabConfig
+        the baobab config
+    models : SimpleNamespace
+        the models returned by `instantiate_models`
+
+    Returns
+    -------
+    tuple of (np.array, dict, dict)
+        the image, its sampled parameters, and its image features
+
+    """
+    # Random stream of this index, independent of the other indices
+    rng = get_idx_rng(cfg.seed, idx)
+    # Seed the global states as well, for the third-party code that samples from them, e.g. the numerical kinematics
+    idx_seed = get_idx_seed(cfg.seed, idx)
+    np.random.seed(idx_seed)
+    random.seed(idx_seed)
+    render_context = get_render_context(idx, cfg, models)
+    psf_model = render_context.psf_model
+    data_api = render_context.data_api
+    while True:
+        # Draw the candidate systems in batches
+        batch = models.bnn_prior.sample_batch(cfg.sample_batch_size, rng=rng)
+        # Selections on sampled parameters, evaluated on the whole batch
+        passed = np.flatnonzero(models.selection.get_initial_mask(batch))
+        candidates = [models.bnn_prior.get_single_sample(batch, i) for i in passed]
+        positions = [None]*len(candidates)
+        if models.image_finder is not None and len(candidates) > 0:
+            # Point-source images of all the candidates at once
+            positions = find_image_positions(candidates, models.image_finder)
+        # Render the candidates in order until one is accepted
+        for sample, image_positions in zip(candidates, positions):
+            if models.magnification_screen is not None:
+                if models.ps_model is not None and image_positions is None:
+                    image_positions = find_bright_images(sample, models.lens_eq_solver, cfg.instrument.pixel_scale, cfg.image.num_pix)
+                # Upper bound on the magnification before rendering
+                if models.magnification_screen.reject(sample, render_context, image_positions):
+                    continue
+            img, img_features = generate_image(sample, psf_model, data_api, models.lens_mass_model, models.src_light_model, models.lens_eq_solver, cfg.instrument.pixel_scale, cfg.image.num_pix, cfg.components, cfg.numerics, min_magnification=cfg.selection.magnification.min, lens_light_model=models.lens_light_model, ps_model=models.ps_model, image_model=render_context.image_model, image_positions=image_positions)
+            if img is None: # couldn't make the magnification cut
+                continue
+            # Observables of the accepted candidate only, e.g. the velocity dispersion
+            models.bnn_prior.add_observables(sample)
+            return img, sample, img_features
+
+def add_time_delays(samples, img_features_list, bnn_prior):
+    """Evaluate the time delays of a chunk of images in a single batch, at the image positions solved for while rendering
+
+    The time delays are stored in `sample['misc']['true_td']` in the order of the image positions `x_image`, `y_image`.
+
+    Parameters
+    ----------
+    samples : list of dict
+        sampled model parameters of each image
+    img_features_list : list of dict
+        image features returned by `generate_image` for each image
+    bnn_prior : DiagonalCosmoBNNPrior
+        the BNN prior
+
+    """
+    n_img = [len(img_features['x_image']) for img_features in img_features_list]
+    x_image = np.full((len(samples), max(n_img)), np.nan)
+    y_image = np.full((len(samples), max(n_img)), np.nan)
+    for i, img_features in enumerate(img_features_list):
+        x_image[i, :n_img[i]] = img_features['x_image']
+        y_image[i, :n_img[i]] = img_features['y_image']
+    true_td = bnn_prior.get_time_delays_batch(bnn_prior.stack_samples(samples), x_image, y_image)
+    for i, sample in enumerate(samples):
+        sample['misc']['true_td'] = true_td[i, :n_img[i]].tolist()
+
+def generate_chunk(chunk_bounds, cfg, models):
+    """Render the images of a contiguous range of dataset indices
+
+    Parameters
+    ----------
+    chunk_bounds : tuple of int
+        the first index and one past the last index of the chunk
+    cfg : BaobabConfig
+        the baobab config
+    models : SimpleNamespace
+        the models returned by `instantiate_models`
+
+    Returns
+    -------
+    tuple of (np.array, pd.DataFrame, dict)
+        the images of the chunk in their storage precision, the metadata of the chunk, with columns sorted lexicographically, and the selection tallies of the chunk
+
+    """
+    start_idx, stop_idx = chunk_bounds
+    models.selection.reset_counts()
+    if models.magnification_screen is not None:
+        models.magnification_screen.reset_counts()
+    models.metadata_buffer.clear()
+    imgs = []
+    samples = []
+    img_features_list = []
+    for idx in range(start_idx, stop_idx):
+        img, sample, img_features = generate_single(idx, cfg, models)
+        imgs.append(img)
+        samples.append(sample)
+        img_features_list.append(img_features)
+    if getattr(models.bnn_prior, 'time_delays_from_images', False):
+        add_time_delays(samples, img_features_list, models.bnn_prior)
+    # Encode the images into their storage precision, with the scale and the round-trip error of each image
+    encoder = models.image_encoder
+    raw_imgs = np.stack(imgs)
+    imgs, img_columns = encoder.encode(raw_imgs)
+    if encoder.precision != 'float64':
+        noise_sigma = encoder.noise_floor
+        if models.noise_model is not None:
+            # Background and Poisson noise of each pixel
+            noise_sigma = models.noise_model.get_noise_sigma2(raw_imgs)**0.5
+        img_columns.update(get_roundtrip_errors(raw_imgs, encoder.decode(imgs, img_columns), noise_sigma))
+    for i, (idx, sample, img_features) in enumerate(zip(range(start_idx, stop_idx), samples, img_features_list)):
+        meta = get_metadata(sample, img_features, cfg)
+        meta['img_filename'] = 'X_{0:07d}.npy'.format(idx)
+        for col, values in img_columns.items():
+            meta[col] = values[i]
+        models.metadata_buffer.append(meta)
+    # Sort columns lexicographically
+    metadata = models.metadata_buffer.to_dataframe(sort_columns=True)
+    selection_counts = dict(models.selection.rejection_counts, n_evaluated=models.selection.n_evaluated)
+    if models.magnification_screen is not None:
+        selection_counts.update(n_screen_evaluated=models.magnification_screen.n_evaluated,
+                                n_screened=models.magnification_screen.n_screened)
+    return imgs, metadata, selection_counts
+
+def print_selection_summary(selection_counts):
+    """Print the fraction of sampled systems rejected by each selection
+
+    Parameters
+    ----------
+    selection_counts : dict
+        number of samples rejected by each selection, along with the number of samples evaluated under the key `n_evaluated` and, if the magnification screen was used, the numbers of samples it evaluated and screened out under the keys `n_screen_evaluated` and `n_screened`
+
+    """
+    screen_keys = ['n_screen_evaluated', 'n_screened']
+    n_evaluated = selection_counts.get('n_evaluated', 0)
+    print("Number of sampled systems: {:d}".format(n_evaluated))
+    for name, count in selection_counts.items():
+        if name in ['n_evaluated'] + screen_keys:
             continue
-        # Save image file
-        img_filename = 'X_{0:07d}.npy'.format(current_idx)
-        img_path = os.path.join(save_dir, img_filename)
-        np.save(img_path, img)
-        # Save labels
-        meta = {}
-        for comp in cfg.components:
-            for param_name, param_value in sample[comp].items():
-                meta['{:s}_{:s}'.format(comp, param_name)] = param_value  
-        #if cfg.bnn_prior_class in ['DiagonalCosmoBNNPrior']:
-        #    if cfg.bnn_omega.time_delays.calculate_time_delays:
-        #        # Order time delays in increasing dec
-        #        unordered_td = sample['misc']['true_td'] # np array
-        #        increasing_dec_i = np.argsort(img_features['y_image'])
-        #        td = unordered_td[increasing_dec_i]
-        #        td = td[1:] - td[0] # take BCD - A
-        #        sample['misc']['true_td'] = list(td)
-        #        img_features['x_image'] = img_features['x_image'][increasing_dec_i]
-        #        img_features['y_image'] = img_features['y_image'][increasing_dec_i]
-        if cfg.bnn_prior_class in ['EmpiricalBNNPrior', 'DiagonalCosmoBNNPrior']:
-            for misc_name, misc_value in sample['misc'].items():
-                meta['{:s}'.format(misc_name)] = misc_value
-        if 'agn_light' in cfg.components:
-            x_image = np.zeros(4)
-            y_image = np.zeros(4)
-            n_img = len(img_features['x_image'])
-            meta['n_img'] = n_img
-            x_image[:n_img] = img_features['x_image']
-            y_image[:n_img] = img_features['y_image']
-            for i in range(4):
-                meta['x_image_{:d}'.format(i)] = x_image[i]
-                meta['y_image_{:d}'.format(i)] = y_image[i]
-        meta['total_magnification'] = img_features['total_magnification']
-        meta['img_filename'] = img_filename
-        metadata = metadata.append(meta, ignore_index=True)
-        # Export metadata.csv for the first time
-        if current_idx == 0:
-            # Sort columns lexicographically
-            metadata = metadata.reindex(sorted(metadata.columns), axis=1)
-            # Export to csv
-            metadata.to_csv(metadata_path, index=None)
-            # Initialize empty dataframe for next checkpoint chunk
-            metadata = pd.DataFrame()
-            gc.collect()
-
-        # Export metadata every checkpoint interval
-        if (current_idx + 1)%cfg.checkpoint_interval == 0:
-            # Export to csv
-            metadata.to_csv(metadata_path, index=None, mode='a', header=None)
-            # Initialize empty dataframe for next checkpoint chunk
-            metadata = pd.DataFrame()
-            gc.collect()
+        print("Rejected by `{:s}`: {:d} ({:.1%})".format(name, count, count/max(n_evaluated, 1)))
+    if 'n_screen_evaluated' in selection_counts:
+        n_screen_evaluated = selection_counts['n_screen_evaluated']
+        n_screened = selection_counts['n_screened']
+        print("Screened out by the magnification screen: {:d} of {:d} ({:.1%})".format(n_screened, n_screen_evaluated, n_screened/max(n_screen_evaluated, 1)))
+
+def print_roundtrip_summary(roundtrip_stats, precision):
+    """Print the error of the images introduced by their storage precision
+
+    Parameters
+    ----------
+    roundtrip_stats : dict
+        number of images `n_data`, maximum absolute error `max_err`, sum of the mean squared errors `sum_sq_err`, and, if a noise floor was given, maximum absolute error in units of the noise `max_err_over_noise` of the images, accumulated from the columns returned by `get_roundtrip_errors`
+    precision : str
+        the storage precision of the images
+
+    """
+    max_err = roundtrip_stats['max_err']
+    rms_err = np.sqrt(roundtrip_stats['sum_sq_err']/max(roundtrip_stats['n_data'], 1))
+    print("Round-trip error of the {:s} images: max {:.3g}, rms {:.3g}".format(precision, max_err, rms_err))
+    if 'max_err_over_noise' in roundtrip_stats:
+        print("Maximum round-trip error in units of the noise: {:.3g}".format(roundtrip_stats['max_err_over_noise']))
+
+# Per-process state of the workers, set by `_init_worker`
+_worker_cfg = None
+_worker_models = None
+_worker_error = None
+
+def _init_worker(cfg):
+    """Instantiate the models of a worker process
+
+    """
+    global _worker_cfg, _worker_models
+    _worker_cfg = cfg
+    _worker_models = instantiate_models(cfg)
+
+def _init_pool_worker(cfg):
+    """Instantiate the models of a pool worker process, deferring any error to its first chunk
+
+    A pool replaces the workers whose initializer raises, endlessly, so the error is raised from the chunks instead.
+
+    """
+    global _worker_error
+    try:
+        _init_worker(cfg)
+    except Exception as e:
+        _worker_error = e
+
+def _generate_chunk_in_worker(chunk_bounds):
+    """Render a chunk with the models of the current worker process
+
+    """
+    if _worker_error is not None:
+        raise _worker_error
+    return generate_chunk(chunk_bounds, _worker_cfg, _worker_models)
+
+def get_rng_manifest(seed, next_idx):
+    """Get the manifest entry describing the random streams of the run from the next index on
+
+    Parameters
+    ----------
+    seed : int
+        the global seed, `cfg.seed`
+    next_idx : int
+        the next dataset index to generate
+
+    Returns
+    -------
+    dict
+        the seed, the next index, the bit generator, and the key of its generator and seed of the global states
+
+    """
+    state = get_idx_rng(seed, next_idx).bit_generator.state
+    return dict(seed=seed,
+                next_idx=next_idx,
+                bit_generator=state['bit_generator'],
+                next_idx_key=[int(k) for k in state['state']['key']],
+                next_idx_seed=get_idx_seed(seed, next_idx))
+
+def get_manifest(chunk_bounds, cfg, args, selection_counts, metadata_path, parquet_writer):
+    """Get the checkpoint manifest recording the state of the run once a chunk is written
+
+    Parameters
+    ----------
+    chunk_bounds : tuple of int
+        the first index and one past the last index of the last chunk written
+    cfg : BaobabConfig
+        the baobab config
+    args : argparse.Namespace
+        the command-line arguments
+    selection_counts : dict
+        the selection tallies of the chunks written so far
+    metadata_path : str or os.path object
+        path of `metadata.csv`
+    parquet_writer : ParquetMetadataWriter or None
+        the Parquet metadata writer, if the metadata are written as Parquet
+
+    Returns
+    -------
+    dict
+        the manifest
+
+    """
+    n_complete = chunk_bounds[1]
+    manifest = dict(n_complete=n_complete,
+                    last_chunk_bounds=list(chunk_bounds),
+                    n_data=cfg.n_data,
+                    checkpoint_interval=cfg.checkpoint_interval,
+                    num_pix=cfg.image.num_pix,
+                    output_format=args.output_format,
+                    compression=args.compression,
+                    metadata_format=args.metadata_format,
+                    precision=cfg.output_precision.precision,
+                    # Each index has its own random stream, so the random state of the run is the stream of the next index
+                    rng=get_rng_manifest(cfg.seed, n_complete),
+                    n_accepted=n_complete,
+                    selection_counts={name: int(count) for name, count in selection_counts.items()})
+    if args.output_format == 'npy' and parquet_writer is None:
+        manifest['metadata_csv_size'] = os.path.getsize(metadata_path)
+    if parquet_writer is not None:
+        manifest['n_parquet_parts'] = parquet_writer.n_parts
+    return manifest
+
+def check_manifest(manifest, cfg, args):
+    """Check that the run to resume was generated with the same settings and random streams
+
+    Parameters
+    ----------
+    manifest : dict
+        the checkpoint manifest of the run to resume
+    cfg : BaobabConfig
+        the baobab config
+    args : argparse.Namespace
+        the command-line arguments
+
+    """
+    current = dict(seed=cfg.seed, num_pix=cfg.image.num_pix, output_format=args.output_format,
+                   compression=args.compression, metadata_format=args.metadata_format,
+                   precision=cfg.output_precision.precision)
+    # Runs predating the storage precisions were stored in float64
+    recorded = dict(manifest, seed=manifest['rng']['seed'], precision=manifest.get('precision', 'float64'))
+    mismatches = ['{:s} ({:s} != {:s})'.format(key, str(value), str(recorded[key])) for key, value in current.items() if value != recorded[key]]
+    if len(mismatches) > 0:
+        raise ValueError("Cannot resume a run generated with different settings: {:s}.".format(', '.join(mismatches)))
+    if get_rng_manifest(cfg.seed, manifest['rng']['next_idx']) != manifest['rng']:
+        raise ValueError("Cannot resume a run generated with different random streams.")
+
+def remove_images_from(save_dir, n_complete):
+    """Remove the .npy image files of the indices beyond the last checkpoint
+
+    Parameters
+    ----------
+    save_dir : str or os.path object
+        the destination folder
+    n_complete : int
+        number of complete indices
+
+    """
+    for filename in os.listdir(save_dir):
+        match = re.match(r'^X_(\d+)\.npy$', filename)
+        if match is not None and int(match.group(1)) >= n_complete:
+            os.remove(os.path.join(save_dir, filename))
+
+def read_last_csv_row(path):
+    """Read the header and the last row of a CSV file without reading the whole file
+
+    Parameters
+    ----------
+    path : str or os.path object
+        path of the CSV file
+
+    Returns
+    -------
+    dict
+        the last row, keyed by the column names
+
+    """
+    with open(path, 'rb') as f:
+        header = f.readline().decode()
+        f.seek(0, os.SEEK_END)
+        f.seek(max(f.tell() - 2**16, 0))
+        last_line = f.read().splitlines()[-1].decode()
+    header, last_row = csv.reader([header, last_line])
+    return dict(zip(header, last_row))
+
+def restore_checkpoint(manifest, save_dir, metadata_path, cfg, parquet_writer):
+    """Validate the last chunk recorded in the checkpoint manifest and discard the metadata written after it
+
+    The images and metadata beyond the checkpoint in the HDF5 file and the Parquet dataset are discarded by their writers.
+
+    Parameters
+    ----------
+    manifest : dict
+        the checkpoint manifest of the run to resume
+    save_dir : str or os.path object
+        the destination folder
+    metadata_path : str or os.path object
+        path of `metadata.csv`
+    cfg : BaobabConfig
+        the baobab config
+    parquet_writer : ParquetMetadataWriter or None
+        the Parquet metadata writer, if the metadata are written as Parquet
+
+    """
+    n_complete = manifest['n_complete']
+    last_start, last_stop = manifest['last_chunk_bounds']
+    if manifest['output_format'] == 'npy':
+        for idx in range(last_start, last_stop):
+            img_path = os.path.join(save_dir, 'X_{0:07d}.npy'.format(idx))
+            try:
+                img = np.load(img_path)
+            except (OSError, ValueError) as e:
+                raise ValueError("The last checkpoint chunk is corrupt: cannot read {:s} ({:s}).".format(img_path, str(e)))
+            if img.shape != (cfg.image.num_pix, cfg.image.num_pix):
+                raise ValueError("The last checkpoint chunk is corrupt: {:s} has shape {:s}.".format(img_path, str(img.shape)))
+    if 'metadata_csv_size' in manifest:
+        # Discard the rows appended after the checkpoint
+        if os.path.getsize(metadata_path) < manifest['metadata_csv_size']:
+            raise ValueError("The last checkpoint chunk is corrupt: {:s} is shorter than recorded.".format(metadata_path))
+        with open(metadata_path, 'r+') as f:
+            f.truncate(manifest['metadata_csv_size'])
+        last_row = read_last_csv_row(metadata_path)
+        if last_row.get('img_filename') != 'X_{0:07d}.npy'.format(n_complete - 1):
+            raise ValueError("The last checkpoint chunk is corrupt: the last row of {:s} is not that of index {:d}.".format(metadata_path, n_complete - 1))
+    if parquet_writer is not None:
+        n_rows = parquet_writer.pq.read_metadata(parquet_writer.get_part_path(parquet_writer.n_parts - 1)).num_rows
+        if n_rows != last_stop - last_start:
+            raise ValueError("The last checkpoint chunk is corrupt: its Parquet part has {:d} rows instead of {:d}.".format(n_rows, last_stop - last_start))
+
+def main():
+    args = parse_args()
+    cfg = BaobabConfig.from_file(args.config)
+    if args.n_data is not None:
+        cfg.n_data = args.n_data
+    if args.precision is not None:
+        cfg.output_precision.precision = args.precision
+    if args.noise_floor is not None:
+        cfg.output_precision.noise_floor = args.noise_floor
+    # Create data directory
+    save_dir = cfg.out_dir
+    manifest_path = os.path.join(save_dir, 'manifest.json')
+    manifest = None
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+        print("Destination folder path: {:s}".format(save_dir))
+    elif not args.resume:
+        raise OSError("Destination folder already exists. Pass in --resume to resume an interrupted run.")
+    elif os.path.exists(manifest_path):
+        manifest = read_manifest(manifest_path)
+        check_manifest(manifest, cfg, args)
+        print("Resuming from index {:d} in destination folder path: {:s}".format(manifest['n_complete'], save_dir))
+    else:
+        # Interrupted before the first checkpoint
+        print("No checkpoint found, starting over in destination folder path: {:s}".format(save_dir))
+    print("Log path: {:s}".format(cfg.log_path))
+    cfg.export_log()
+    n_complete = 0 if manifest is None else manifest['n_complete']
+    metadata_path = os.path.join(save_dir, 'metadata.csv')
+    parquet_writer = None
+    if args.metadata_format == 'parquet':
+        n_parts = 0 if manifest is None else manifest['n_parquet_parts']
+        parquet_writer = ParquetMetadataWriter(os.path.join(save_dir, 'metadata.parquet'), n_parts=n_parts)
+    writer = None
+    if args.output_format == 'hdf5':
+        h5_path = os.path.join(save_dir, '{:s}.h5'.format(os.path.basename(os.path.normpath(save_dir))))
+        print("HDF5 path: {:s}".format(h5_path))
+        writer = HDF5Writer(h5_path, (cfg.image.num_pix, cfg.image.num_pix), dtype=ImageEncoder(**cfg.output_precision).dtype, compression=args.compression, n_complete=None if manifest is None else n_complete)
+    else:
+        remove_images_from(save_dir, n_complete)
+    selection_counts = {}
+    if manifest is not None:
+        restore_checkpoint(manifest, save_dir, metadata_path, cfg, parquet_writer)
+        selection_counts = dict(manifest['selection_counts'])
+    roundtrip_stats = dict(n_data=0, max_err=0.0, sum_sq_err=0.0)
+    # Shard the remaining dataset indices into checkpoint chunks
+    chunk_bounds = [(start_idx, min(start_idx + cfg.checkpoint_interval, cfg.n_data)) for start_idx in range(n_complete, cfg.n_data, cfg.checkpoint_interval)]
+    pool = None
+    if args.n_workers > 1:
+        # Each worker instantiates its own models, and raises any error of a broken config from its chunks
+        pool = multiprocessing.Pool(args.n_workers, initializer=_init_pool_worker, initargs=(cfg,))
+        # Chunks are returned in index order
+        chunk_results = pool.imap(_generate_chunk_in_worker, chunk_bounds)
+    else:
+        _init_worker(cfg)
+        chunk_results = map(_generate_chunk_in_worker, chunk_bounds)
+    pbar = tqdm(total=cfg.n_data, initial=min(n_complete, cfg.n_data))
+    for bounds, (imgs, metadata, chunk_selection_counts) in zip(chunk_bounds, chunk_results):
+        if writer is not None:
+            # Append the chunk to the HDF5 file, where images are indexed by row
+            writer.append(imgs, metadata.drop(columns='img_filename'))
+        else:
+            # Save image files
+            for img_filename, img in zip(metadata['img_filename'].values, imgs):
+                img_path = os.path.join(save_dir, img_filename)
+                np.save(img_path, img)
+            if parquet_writer is None:
+                # Export metadata every checkpoint interval, with the header for the first chunk
+                if bounds[0] == 0:
+                    metadata.to_csv(metadata_path, index=None)
+                else:
+                    metadata.to_csv(metadata_path, index=None, mode='a', header=None)
+        if parquet_writer is not None:
+            # Export metadata every checkpoint interval as a part of the Parquet dataset
+            parquet_writer.write(metadata)
+        for name, count in chunk_selection_counts.items():
+            selection_counts[name] = selection_counts.get(name, 0) + count
+        if 'img_roundtrip_max_err' in metadata:
+            roundtrip_stats['n_data'] += len(metadata)
+            roundtrip_stats['max_err'] = max(roundtrip_stats['max_err'], metadata['img_roundtrip_max_err'].max())
+            roundtrip_stats['sum_sq_err'] += np.sum(metadata['img_roundtrip_rms_err'].values**2.0)
+            if 'img_roundtrip_max_err_over_noise' in metadata:
+                roundtrip_stats['max_err_over_noise'] = max(roundtrip_stats.get('max_err_over_noise', 0.0), metadata['img_roundtrip_max_err_over_noise'].max())
+        # Record the checkpoint once the chunk is fully written
+        write_manifest(manifest_path, get_manifest(bounds, cfg, args, selection_counts, metadata_path, parquet_writer))
         # Update progress
-        current_idx += 1
-        pbar.update(1)
-    # Export to csv
-    metadata.to_csv(metadata_path, index=None, mode='a', header=None)
+        pbar.update(len(imgs))
     pbar.close()
-    
+    if writer is not None:
+        writer.close()
+    print_selection_summary(selection_counts)
+    if roundtrip_stats['n_data'] > 0:
+        print_roundtrip_summary(roundtrip_stats, cfg.output_precision.precision)
+    if pool is not None:
+        pool.close()
+        pool.join()
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,6 @@
+from .hdf5_utils import *
+from .metadata_buffer import *
+from .parquet_utils import *
+from .manifest_utils import *
+from .memmap_reader import *
+from .precision_utils import *
\ No newline at end of file
@@ -0,0 +1,131 @@
+import numpy as np
+import h5py
+__all__ = ['HDF5Writer']
+
+class HDF5Writer:
+    """Streams images and their metadata into a single HDF5 file, one checkpoint chunk at a time
+
+    The images are stored in the resizable, chunked dataset `images` of shape `[n_data, num_pix, num_pix]`. The metadata are stored column by column in the group `metadata`, with one resizable dataset per column.
+    The attribute `n_complete` of the file counts the rows whose image and metadata have both been written and flushed to disk, so the rows beyond it can be discarded if the run is interrupted.
+    To resume an interrupted run, pass in the number of rows to keep as `n_complete`: the existing file is reopened and the rows beyond it are discarded.
+
+    """
+    def __init__(self, path, img_shape, dtype=np.float64, compression=None, chunk_size=None, n_complete=None):
+        """
+        Parameters
+        ----------
+        path : str or os.path object
+            path of the HDF5 file to create
+        img_shape : tuple
+            shape of a single image
+        dtype : np.dtype
+            data type of the stored images. Default: np.float64
+        compression : str or None
+            HDF5 compression filter of the images, one of 'gzip' and 'lzf', or None for no compression. Default: None
+        chunk_size : int or None
+            number of images in an HDF5 chunk. If None, chosen so that a chunk takes about 1 MiB.
+        n_complete : int or None
+            if not None, the number of rows of the existing file to keep. The file is created anew if None. Default: None
+
+        """
+        self.path = path
+        self.img_shape = tuple(img_shape)
+        self.dtype = np.dtype(dtype)
+        if n_complete is not None:
+            self._reopen(n_complete)
+            return
+        if chunk_size is None:
+            chunk_size = max(1, 2**20//(int(np.prod(self.img_shape))*self.dtype.itemsize))
+        self.file = h5py.File(path, mode='w')
+        self.file.create_dataset('images', shape=(0,) + self.img_shape,
+                                 maxshape=(None,) + self.img_shape,
+                                 chunks=(chunk_size,) + self.img_shape,
+                                 dtype=self.dtype,
+                                 compression=compression)
+        self.metadata = self.file.create_group('metadata')
+        self.columns = None
+        self.file.attrs['n_complete'] = 0
+
+    def _reopen(self, n_complete):
+        """Reopen an existing file and truncate the images and metadata columns to the first `n_complete` rows
+
+        """
+        self.file = h5py.File(self.path, mode='a')
+        n_written = int(self.file.attrs['n_complete'])
+        if n_written < n_complete:
+            self.file.close()
+            raise ValueError("Cannot keep {:d} rows of {:s}, which has only {:d} complete rows.".format(n_complete, self.path, n_written))
+        images = self.file['images']
+        if images.shape[1:] != self.img_shape or images.dtype != self.dtype:
+            self.file.close()
+            raise ValueError("The images of {:s} have shape {:s} and type {:s}, inconsistent with the writer.".format(self.path, str(images.shape[1:]), str(images.dtype)))
+        images.resize(n_complete, axis=0)
+        self.metadata = self.file['metadata']
+        self.columns = list(self.metadata.attrs['columns']) if 'columns' in self.metadata.attrs else None
+        for col in self.columns or []:
+            self.metadata[col].resize(n_complete, axis=0)
+        self.file.attrs['n_complete'] = n_complete
+        self.file.flush()
+
+    @property
+    def n_complete(self):
+        """Number of rows written and flushed to disk
+
+        """
+        return int(self.file.attrs['n_complete'])
+
+    def _create_columns(self, metadata):
+        """Create a resizable dataset for each metadata column, with numeric columns stored natively and the rest as strings
+
+        """
+        self.columns = list(metadata.columns)
+        for col in self.columns:
+            values = metadata[col].values
+            if values.dtype.kind in 'biuf':
+                col_dtype = values.dtype
+            else:
+                col_dtype = h5py.string_dtype()
+            self.metadata.create_dataset(col, shape=(0,), maxshape=(None,), chunks=True, dtype=col_dtype)
+        self.metadata.attrs['columns'] = self.columns
+
+    def _append_rows(self, dataset, values):
+        """Append values along the first axis of a resizable dataset
+
+        """
+        n_old = dataset.shape[0]
+        dataset.resize(n_old + len(values), axis=0)
+        dataset[n_old:] = values
+
+    def append(self, imgs, metadata):
+        """Append a chunk of images and their metadata, then flush the file
+
+        Parameters
+        ----------
+        imgs : list or np.array
+            images of the chunk, each of shape `img_shape`
+        metadata : pd.DataFrame
+            metadata of the chunk, one row per image, with the same columns for every chunk
+
+        """
+        if len(imgs) != len(metadata):
+            raise ValueError("Got {:d} images but {:d} metadata rows.".format(len(imgs), len(metadata)))
+        if self.columns is None:
+            self._create_columns(metadata)
+        elif sorted(metadata.columns) != sorted(self.columns):
+            raise ValueError("Metadata columns differ from those of the previous chunks.")
+        self._append_rows(self.file['images'], np.asarray(imgs, dtype=self.dtype))
+        for col in self.columns:
+            dataset = self.metadata[col]
+            values = metadata[col].values
+            if h5py.check_string_dtype(dataset.dtype) is not None:
+                values = np.array([str(v) for v in values], dtype=object)
+            self._append_rows(dataset, values)
+        # Mark the chunk as complete only after all its rows are written
+        self.file.attrs['n_complete'] = self.n_complete + len(imgs)
+        self.file.flush()
+
+    def close(self):
+        """Close the file
+
+        """
+        self.file.close()
@@ -0,0 +1,40 @@
+import os
+import json
+__all__ = ['write_manifest', 'read_manifest']
+
+def write_manifest(path, manifest):
+    """Atomically write the checkpoint manifest as JSON
+
+    The manifest is written to a temporary file, synced to disk, and renamed over the previous manifest, so the file at `path` is always a complete manifest.
+
+    Parameters
+    ----------
+    path : str or os.path object
+        path of the manifest file
+    manifest : dict
+        JSON-serializable manifest
+
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def read_manifest(path):
+    """Read the checkpoint manifest
+
+    Parameters
+    ----------
+    path : str or os.path object
+        path of the manifest file
+
+    Returns
+    -------
+    dict
+        the manifest
+
+    """
+    with open(path, 'r') as f:
+        return json.load(f)
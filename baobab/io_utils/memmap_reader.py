@@ -0,0 +1,188 @@
+import os
+import numpy as np
+import h5py
+__all__ = ['MemmapReader', 'write_npy_store']
+
+def write_npy_store(store_dir, images, metadata, pixels_mean=None, pixels_std=None):
+    """Write images and their labels as a store of `.npy` files that can be memory-mapped by `MemmapReader`
+
+    The store consists of the image array `images.npy`, the pixel-wise statistics `pixels_mean.npy` and `pixels_std.npy`, and one array `labels/<column>.npy` per numeric metadata column.
+
+    Parameters
+    ----------
+    store_dir : str or os.path object
+        directory of the store, created if it does not exist
+    images : np.array
+        the images, of shape `[n_data] + img_shape`
+    metadata : pd.DataFrame
+        metadata of the images, one row per image
+    pixels_mean : np.array or None
+        pixel-wise mean of the images, of shape `img_shape`. Computed from the images if None. Default: None
+    pixels_std : np.array or None
+        pixel-wise standard deviation of the images, of shape `img_shape`. Computed from the images if None. Default: None
+
+    """
+    if len(images) != len(metadata):
+        raise ValueError("Got {:d} images but {:d} metadata rows.".format(len(images), len(metadata)))
+    os.makedirs(os.path.join(store_dir, 'labels'), exist_ok=True)
+    np.save(os.path.join(store_dir, 'images.npy'), images)
+    if pixels_mean is None:
+        pixels_mean = np.mean(images, axis=0, dtype=np.float64)
+    if pixels_std is None:
+        pixels_std = np.std(images, axis=0, dtype=np.float64)
+    np.save(os.path.join(store_dir, 'pixels_mean.npy'), np.asarray(pixels_mean, dtype=np.float32))
+    np.save(os.path.join(store_dir, 'pixels_std.npy'), np.asarray(pixels_std, dtype=np.float32))
+    for col in metadata.columns:
+        values = metadata[col].values
+        if values.dtype.kind in 'biuf':
+            np.save(os.path.join(store_dir, 'labels', '{:s}.npy'.format(col)), values)
+
+class MemmapReader:
+    """Reader of a dataset stored as one contiguous image array and a columnar label store, both memory-mapped
+
+    The dataset is either a directory written by `write_npy_store`, or an HDF5 file written by `to_hdf5 --layout unchunked`, whose datasets are stored contiguously and uncompressed so that they can be mapped in place. Only the pages of the requested images are read, and they are shared through the page cache by all the processes reading the same file, e.g. dataloader workers.
+    Batches are gathered by index straight from the mapped arrays into the output, then standardized in place with the stored `pixels_mean` and `pixels_std`. Without standardization, a slice of indices is returned as a view of the mapped array, without any copy.
+
+    Note
+    ----
+    The mapped arrays are not pickled along with the reader, but mapped anew in the unpickled reader, e.g. in spawned worker processes.
+
+    """
+    def __init__(self, path, label_names=None, standardize=True):
+        """
+        Parameters
+        ----------
+        path : str or os.path object
+            path of the `.npy` store directory or of the HDF5 file
+        label_names : list of str or None
+            names of the metadata columns stacked into the labels, in order. If None, all the numeric columns are used, in lexicographic order. Default: None
+        standardize : bool
+            whether to standardize the images with the pixel-wise mean and standard deviation. Pixels with a vanishing standard deviation are only centered. Default: True
+
+        """
+        self.path = path
+        self.standardize = standardize
+        self._map()
+        if label_names is None:
+            label_names = sorted(self.columns)
+        missing = [name for name in label_names if name not in self.columns]
+        if missing:
+            raise KeyError("Label columns {:s} are not in the store.".format(', '.join(missing)))
+        self.label_names = list(label_names)
+
+    def _map(self):
+        """Memory-map the images, pixel-wise statistics, and label columns
+
+        """
+        if os.path.isdir(self.path):
+            load = lambda name: np.load(os.path.join(self.path, '{:s}.npy'.format(name)), mmap_mode='r')
+            self.images = load('images')
+            pixels_mean = load('pixels_mean')
+            pixels_std = load('pixels_std')
+            label_dir = os.path.join(self.path, 'labels')
+            self.columns = {os.path.splitext(f)[0]: load(os.path.join('labels', os.path.splitext(f)[0])) for f in os.listdir(label_dir) if f.endswith('.npy')}
+        else:
+            with h5py.File(self.path, 'r') as f:
+                self.images = self._map_hdf5_dataset(f['images'])
+                pixels_mean = f['pixels_mean'][...]
+                pixels_std = f['pixels_std'][...]
+                self.columns = {col: self._map_hdf5_dataset(dataset) for col, dataset in f['labels'].items()}
+        self.n_data = self.images.shape[0]
+        self.img_shape = self.images.shape[1:]
+        self.pixels_mean = np.asarray(pixels_mean, dtype=np.float32)
+        self.pixels_std = np.asarray(pixels_std, dtype=np.float32)
+        self._inv_pixels_std = np.divide(1.0, self.pixels_std, out=np.ones_like(self.pixels_std), where=self.pixels_std > 0.0)
+
+    def _map_hdf5_dataset(self, dataset):
+        """Memory-map an HDF5 dataset stored contiguously and uncompressed
+
+        """
+        offset = dataset.id.get_offset()
+        if dataset.chunks is not None or offset is None:
+            raise ValueError("The dataset `{:s}` of {:s} is chunked or empty and cannot be memory-mapped. Convert the data with `to_hdf5 --layout unchunked`.".format(dataset.name, str(self.path)))
+        return np.memmap(self.path, dtype=dataset.dtype, mode='r', offset=offset, shape=dataset.shape)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ['images', 'pixels_mean', 'pixels_std', '_inv_pixels_std', 'columns']:
+            state.pop(name)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._map()
+
+    def __len__(self):
+        return self.n_data
+
+    def get_images(self, idx, out=None):
+        """Get a batch of images
+
+        Parameters
+        ----------
+        idx : array-like of int or slice
+            indices of the images
+        out : np.array or None
+            float32 array of shape `[len(idx)] + img_shape` to write the batch into, e.g. reused across batches. Default: None
+
+        Returns
+        -------
+        np.array
+            the images, standardized if `standardize` is True. A slice of indices without standardization is returned as a read-only view of the mapped images.
+
+        """
+        if isinstance(idx, slice):
+            if not self.standardize and out is None:
+                return self.images[idx]
+            idx = np.arange(self.n_data)[idx]
+        idx = np.asarray(idx)
+        if out is None:
+            out = np.empty((len(idx),) + self.img_shape, dtype=np.float32)
+        if self.images.dtype == out.dtype:
+            # Gather the pages of the requested images straight into the output
+            np.take(self.images, idx, axis=0, out=out)
+        else:
+            out[...] = self.images[idx]
+        if self.standardize:
+            out -= self.pixels_mean
+            out *= self._inv_pixels_std
+        return out
+
+    def get_labels(self, idx):
+        """Get the labels of a batch of images
+
+        Parameters
+        ----------
+        idx : array-like of int or slice
+            indices of the images
+
+        Returns
+        -------
+        np.array
+            the labels, of shape `[len(idx), len(label_names)]`
+
+        """
+        if isinstance(idx, slice):
+            idx = np.arange(self.n_data)[idx]
+        labels = np.empty((len(idx), len(self.label_names)))
+        for i, name in enumerate(self.label_names):
+            labels[:, i] = self.columns[name][idx]
+        return labels
+
+    def get_batch(self, idx, out=None):
+        """Get a batch of images and their labels
+
+        Parameters
+        ----------
+        idx : array-like of int or slice
+            indices of the images
+        out : np.array or None
+            float32 array to write the images into. Default: None
+
+        Returns
+        -------
+        tuple of np.array
+            the images and the labels
+
+        """
+        return self.get_images(idx, out=out), self.get_labels(idx)
@@ -0,0 +1,106 @@
+import numbers
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+__all__ = ['MetadataBuffer']
+
+class MetadataBuffer:
+    """Preallocated, columnar buffer of the metadata rows of a checkpoint chunk
+
+    Each column is a typed NumPy array of length `capacity`, so appending a row costs the same regardless of the number of rows already in the buffer. The schema is fixed by the first row appended, unless given: integer values get an int64 column, other real numbers a float64 column, booleans a bool column, and anything else (e.g. strings or lists) an object column.
+
+    """
+    def __init__(self, capacity, schema=None):
+        """
+        Parameters
+        ----------
+        capacity : int
+            maximum number of rows
+        schema : OrderedDict or None
+            data type of each column, keyed by the column name. Inferred from the first row if None.
+
+        """
+        self.capacity = capacity
+        self.n_rows = 0
+        self.schema = None
+        self.columns = None
+        if schema is not None:
+            self._allocate(schema)
+
+    @staticmethod
+    def infer_schema(row):
+        """Infer the data type of each column from a single row
+
+        Parameters
+        ----------
+        row : dict
+            a metadata row
+
+        Returns
+        -------
+        OrderedDict
+            data type of each column, keyed by the column name
+
+        """
+        schema = OrderedDict()
+        for name, value in row.items():
+            if isinstance(value, (bool, np.bool_)):
+                schema[name] = np.dtype(bool)
+            elif isinstance(value, numbers.Integral):
+                schema[name] = np.dtype(np.int64)
+            elif isinstance(value, numbers.Real):
+                schema[name] = np.dtype(np.float64)
+            else:
+                schema[name] = np.dtype(object)
+        return schema
+
+    def _allocate(self, schema):
+        """Allocate the columns of the buffer
+
+        """
+        self.schema = OrderedDict((name, np.dtype(dtype)) for name, dtype in schema.items())
+        self.columns = OrderedDict((name, np.empty(self.capacity, dtype=dtype)) for name, dtype in self.schema.items())
+
+    def append(self, row):
+        """Append a metadata row
+
+        Parameters
+        ----------
+        row : dict
+            the metadata row, with the same keys as the schema
+
+        """
+        if self.schema is None:
+            self._allocate(self.infer_schema(row))
+        if self.n_rows == self.capacity:
+            raise ValueError("The metadata buffer is full, with {:d} rows.".format(self.capacity))
+        if len(row) != len(self.schema) or any(name not in row for name in self.schema):
+            raise ValueError("The metadata row has columns {:s}, inconsistent with the schema.".format(str(sorted(row.keys()))))
+        for name, column in self.columns.items():
+            column[self.n_rows] = row[name]
+        self.n_rows += 1
+
+    def to_dataframe(self, sort_columns=True):
+        """Get the rows appended so far as a DataFrame
+
+        Parameters
+        ----------
+        sort_columns : bool
+            whether to sort the columns lexicographically. Default: True
+
+        Returns
+        -------
+        pd.DataFrame
+            the metadata
+
+        """
+        if self.schema is None:
+            return pd.DataFrame()
+        names = sorted(self.columns) if sort_columns else list(self.columns)
+        return pd.DataFrame(OrderedDict((name, self.columns[name][:self.n_rows]) for name in names))
+
+    def clear(self):
+        """Empty the buffer, keeping the schema and the allocated columns
+
+        """
+        self.n_rows = 0
@@ -0,0 +1,209 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+__all__ = ['FIXED_SIZE_LIST_COLUMNS', 'ParquetMetadataWriter', 'read_metadata_parquet']
+
+# Length of the fixed-size list columns, with the columns `x_image_0`, ..., `x_image_3` grouped into `x_image`, etc.
+FIXED_SIZE_LIST_COLUMNS = {'x_image': 4, 'y_image': 4, 'true_td': 4}
+
+def _import_pyarrow():
+    """Import pyarrow, which is only required for the Parquet metadata
+
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Writing and reading the metadata as Parquet requires the pyarrow package.")
+    return pa, pq
+
+def _group_list_columns(columns, list_sizes):
+    """Map each fixed-size list column to the metadata columns it gathers
+
+    """
+    groups = {}
+    for col in columns:
+        match = re.match(r'^(.+)_(\d+)$', col)
+        if col in list_sizes:
+            groups[col] = [col]
+        elif match is not None and match.group(1) in list_sizes:
+            groups.setdefault(match.group(1), []).append(col)
+    for name, cols in groups.items():
+        groups[name] = sorted(cols, key=lambda c: int(c.rsplit('_', 1)[1]) if c != name else 0)
+    return groups
+
+def _pad_list(values, size):
+    """Pad or truncate a list of floats to the given size, padding with NaN
+
+    """
+    padded = np.full(size, np.nan)
+    values = np.atleast_1d(np.asarray(values, dtype=np.float64))[:size]
+    padded[:len(values)] = values
+    return padded
+
+class ParquetMetadataWriter:
+    """Writes the metadata of each checkpoint chunk as a Parquet file with a fixed schema
+
+    The chunks are the parts of a Parquet dataset, i.e. the directory `path` holding the files `part-00000.parquet`, `part-00001.parquet`, etc., which can be read at once with `read_metadata_parquet` or `pd.read_parquet`. Each part is written to a temporary file and renamed, so an interrupted run leaves only complete parts. To resume an interrupted run, pass in the number of parts to keep as `n_parts`.
+    Numeric columns keep their NumPy types and strings are stored as strings. The columns of `list_sizes`, e.g. the time delays or the image positions split into `x_image_0`, ..., `x_image_3`, are stored as fixed-size list columns of float64, padded with NaN.
+
+    """
+    def __init__(self, path, list_sizes=FIXED_SIZE_LIST_COLUMNS, n_parts=0):
+        """
+        Parameters
+        ----------
+        path : str or os.path object
+            path of the directory of the Parquet dataset
+        list_sizes : dict
+            length of each fixed-size list column, keyed by the column name
+        n_parts : int
+            number of existing parts to keep, whose schema the next parts follow. The other parts and temporary files in `path` are removed. Default: 0
+
+        """
+        self.pa, self.pq = _import_pyarrow()
+        self.path = path
+        self.list_sizes = list_sizes
+        self.schema = None
+        self.n_parts = n_parts
+        os.makedirs(path, exist_ok=True)
+        for filename in os.listdir(path):
+            match = re.match(r'^part-(\d+)\.parquet(\.tmp)?$', filename)
+            if match is not None and (match.group(2) is not None or int(match.group(1)) >= n_parts):
+                os.remove(os.path.join(path, filename))
+        if n_parts > 0:
+            last_part_path = self.get_part_path(n_parts - 1)
+            if not os.path.exists(last_part_path):
+                raise ValueError("Cannot keep {:d} parts of {:s}, which has no part {:s}.".format(n_parts, path, last_part_path))
+            self.schema = self.pq.read_schema(last_part_path)
+
+    def get_part_path(self, part_i):
+        """Get the path of a part of the dataset
+
+        Parameters
+        ----------
+        part_i : int
+            index of the part
+
+        Returns
+        -------
+        str
+            path of the part
+
+        """
+        return os.path.join(self.path, 'part-{:05d}.parquet'.format(part_i))
+
+    def get_schema(self, metadata):
+        """Get the Arrow schema of the metadata, with the fixed-size list columns in place of the columns they gather
+
+        Parameters
+        ----------
+        metadata : pd.DataFrame
+            the metadata of a chunk
+
+        Returns
+        -------
+        pyarrow.Schema
+            the schema
+
+        """
+        pa = self.pa
+        groups = _group_list_columns(metadata.columns, self.list_sizes)
+        grouped_cols = set(col for cols in groups.values() for col in cols)
+        fields = []
+        for col in metadata.columns:
+            if col in grouped_cols:
+                continue
+            values = metadata[col].values
+            if values.dtype.kind in 'biuf':
+                fields.append(pa.field(col, pa.from_numpy_dtype(values.dtype)))
+            else:
+                fields.append(pa.field(col, pa.string()))
+        for name in sorted(groups):
+            fields.append(pa.field(name, pa.list_(pa.float64(), self.list_sizes[name])))
+        return pa.schema(fields)
+
+    def to_table(self, metadata):
+        """Convert the metadata of a chunk into an Arrow table following the schema
+
+        Parameters
+        ----------
+        metadata : pd.DataFrame
+            the metadata of a chunk
+
+        Returns
+        -------
+        pyarrow.Table
+            the table
+
+        """
+        pa = self.pa
+        if self.schema is None:
+            self.schema = self.get_schema(metadata)
+        groups = _group_list_columns(metadata.columns, self.list_sizes)
+        arrays = []
+        for field in self.schema:
+            if isinstance(field.type, pa.FixedSizeListType):
+                size = field.type.list_size
+                cols = groups.get(field.name, [])
+                if cols == [field.name]:
+                    # A single column of lists
+                    flat = np.concatenate([_pad_list(v, size) for v in metadata[field.name].values]) if len(metadata) else np.empty(0)
+                else:
+                    flat = np.stack([_pad_list(row, size) for row in metadata[cols].values]).ravel() if len(metadata) else np.empty(0)
+                arrays.append(pa.FixedSizeListArray.from_arrays(pa.array(flat, type=pa.float64()), size))
+            elif pa.types.is_string(field.type):
+                arrays.append(pa.array([str(v) for v in metadata[field.name].values], type=pa.string()))
+            else:
+                arrays.append(pa.array(metadata[field.name].values, type=field.type))
+        return pa.Table.from_arrays(arrays, schema=self.schema)
+
+    def write(self, metadata):
+        """Write the metadata of a chunk as the next part of the dataset
+
+        Parameters
+        ----------
+        metadata : pd.DataFrame
+            the metadata of a chunk, with the same columns for every chunk
+
+        """
+        table = self.to_table(metadata)
+        part_path = self.get_part_path(self.n_parts)
+        tmp_path = part_path + '.tmp'
+        self.pq.write_table(table, tmp_path)
+        os.replace(tmp_path, part_path)
+        self.n_parts += 1
+
+def read_metadata_parquet(path, columns=None, flatten=False):
+    """Read the metadata written by `ParquetMetadataWriter`
+
+    Parameters
+    ----------
+    path : str or os.path object
+        path of the directory of the Parquet dataset
+    columns : list or None
+        columns to read. All columns are read if None.
+    flatten : bool
+        whether to split the fixed-size list columns into one column per entry, e.g. `x_image` into `x_image_0`, ..., `x_image_3`, as in `metadata.csv`. Default: False
+
+    Returns
+    -------
+    pd.DataFrame
+        the metadata, with the fixed-size list columns as arrays unless flattened
+
+    """
+    pa, pq = _import_pyarrow()
+    table = pq.read_table(path, columns=columns)
+    list_cols = [field.name for field in table.schema if isinstance(field.type, pa.FixedSizeListType)]
+    metadata = table.drop(list_cols).to_pandas()
+    for name in list_cols:
+        column = table.column(name).combine_chunks()
+        values = column.flatten().to_numpy(zero_copy_only=False).reshape(-1, column.type.list_size)
+        if flatten:
+            for i in range(values.shape[1]):
+                metadata['{:s}_{:d}'.format(name, i)] = values[:, i]
+        else:
+            metadata[name] = list(values)
+    if flatten:
+        metadata = metadata.reindex(sorted(metadata.columns), axis=1)
+    return metadata
@@ -0,0 +1,133 @@
+import numpy as np
+__all__ = ['PRECISIONS', 'SCALE_COLUMNS', 'ImageEncoder', 'get_roundtrip_errors']
+
+# Storage precisions of the images, from lossless to the most compact
+PRECISIONS = ['float64', 'float32', 'float16', 'asinh_uint16', 'log_uint16']
+# Metadata columns of the per-image scale of the uint16 precisions
+SCALE_COLUMNS = ['img_scale_offset', 'img_scale_softening', 'img_scale_min', 'img_scale_max']
+
+class ImageEncoder:
+    """Encodes batches of images into a reduced storage precision, and decodes them back
+
+    The float precisions are plain casts. The uint16 precisions quantize a scaled flux `u = f((x - offset)/softening)` over the range `[min(u), max(u)]` of each image into the 65536 levels of a uint16, where `f` is `arcsinh` for 'asinh_uint16', with zero offset, and `log1p` for 'log_uint16', with the minimum of the image as offset. Both are linear below the softening and logarithmic above it, so the absolute error grows with the flux, like the Poisson noise, and is a fraction of the softening for the faint pixels. The scale of each image is returned alongside the encoded images, to be stored in the metadata columns `SCALE_COLUMNS`.
+
+    """
+    max_level = 2**16 - 1
+
+    def __init__(self, precision='float64', noise_floor=None, relative_softening=1.e-3):
+        """
+        Parameters
+        ----------
+        precision : str
+            one of `PRECISIONS`. Default: 'float64'
+        noise_floor : float or None
+            standard deviation of the background noise of the images, in the image units. If not None, it is the softening of the uint16 scalings. Default: None
+        relative_softening : float
+            softening of the uint16 scalings relative to the peak of each image, if `noise_floor` is None. Default: 1.e-3
+
+        """
+        if precision not in PRECISIONS:
+            raise ValueError("Precision must be one of {:s}, got {:s}.".format(', '.join(PRECISIONS), str(precision)))
+        self.precision = precision
+        self.noise_floor = noise_floor
+        self.relative_softening = relative_softening
+        self.is_scaled = precision.endswith('_uint16')
+        self.dtype = np.dtype(np.uint16 if self.is_scaled else precision)
+
+    def _get_scaling(self):
+        """Get the scaling function and its inverse
+
+        """
+        if self.precision == 'asinh_uint16':
+            return np.arcsinh, np.sinh
+        return np.log1p, np.expm1
+
+    def encode(self, imgs):
+        """Encode a batch of images
+
+        Parameters
+        ----------
+        imgs : np.array
+            the images, of shape `[N, H, W]`
+
+        Returns
+        -------
+        tuple of (np.array, dict)
+            the encoded images of type `dtype`, and the scale of each image keyed by `SCALE_COLUMNS`, empty for the float precisions
+
+        """
+        imgs = np.asarray(imgs, dtype=np.float64)
+        if not self.is_scaled:
+            if self.dtype != np.float64 and np.abs(imgs).max(initial=0.0) > np.finfo(self.dtype).max:
+                raise ValueError("The images overflow {:s}; use a uint16 precision instead.".format(self.precision))
+            return imgs.astype(self.dtype), {}
+        n_data = imgs.shape[0]
+        flat = imgs.reshape(n_data, -1)
+        if self.precision == 'asinh_uint16':
+            offset = np.zeros(n_data)
+        else:
+            offset = flat.min(axis=1)
+        if self.noise_floor is None:
+            peak = np.abs(flat - offset[:, np.newaxis]).max(axis=1)
+            softening = np.where(peak > 0.0, peak, 1.0)*self.relative_softening
+        else:
+            softening = np.full(n_data, float(self.noise_floor))
+        scaling, _ = self._get_scaling()
+        u = scaling((flat - offset[:, np.newaxis])/softening[:, np.newaxis])
+        u_min = u.min(axis=1)
+        u_max = u.max(axis=1)
+        # Constant images are encoded as level 0
+        u_range = np.where(u_max > u_min, u_max - u_min, 1.0)
+        levels = np.rint((u - u_min[:, np.newaxis])/u_range[:, np.newaxis]*self.max_level)
+        scale = dict(zip(SCALE_COLUMNS, [offset, softening, u_min, u_max]))
+        return levels.astype(self.dtype).reshape(imgs.shape), scale
+
+    def decode(self, encoded, scale=None):
+        """Decode a batch of encoded images
+
+        Parameters
+        ----------
+        encoded : np.array
+            the encoded images, of shape `[N, H, W]`
+        scale : dict or pd.DataFrame or None
+            the scale of each image keyed by `SCALE_COLUMNS`, e.g. the metadata rows of the images. Only required for the uint16 precisions. Default: None
+
+        Returns
+        -------
+        np.array
+            the decoded images, of type float64
+
+        """
+        if not self.is_scaled:
+            return np.asarray(encoded, dtype=np.float64)
+        encoded = np.asarray(encoded)
+        offset, softening, u_min, u_max = [np.asarray(scale[col], dtype=np.float64).reshape((-1,) + (1,)*(encoded.ndim - 1)) for col in SCALE_COLUMNS]
+        _, inverse_scaling = self._get_scaling()
+        u = u_min + encoded*((u_max - u_min)/self.max_level)
+        return offset + softening*inverse_scaling(u)
+
+def get_roundtrip_errors(imgs, decoded, noise_sigma=None):
+    """Compute the error of each image introduced by the encoding
+
+    Parameters
+    ----------
+    imgs : np.array
+        the original images, of shape `[N, H, W]`
+    decoded : np.array
+        the decoded images, of the same shape
+    noise_sigma : float or np.array or None
+        standard deviation of the noise, in the image units, either the noise floor or a map of the noise of each pixel broadcasting against the images. Default: None
+
+    Returns
+    -------
+    dict
+        the maximum absolute error `img_roundtrip_max_err` and root-mean-square error `img_roundtrip_rms_err` of each image, in the image units, and if `noise_sigma` is not None, the maximum absolute error in units of the noise, `img_roundtrip_max_err_over_noise`
+
+    """
+    err = np.asarray(decoded, dtype=np.float64) - imgs
+    flat_err = err.reshape(len(imgs), -1)
+    errors = dict(img_roundtrip_max_err=np.abs(flat_err).max(axis=1),
+                  img_roundtrip_rms_err=np.sqrt(np.mean(flat_err**2.0, axis=1)))
+    if noise_sigma is not None:
+        errors['img_roundtrip_max_err_over_noise'] = np.abs(err/noise_sigma).reshape(len(imgs), -1).max(axis=1)
+    return errors
@@ -3,4 +3,7 @@ from .psf_utils import *
 from .image_utils import *
 from .metadata_utils import *
 from .selection_utils import *
-from .kinematics_utils import *
\ No newline at end of file
+from .magnification_utils import *
+from .kinematics_utils import *
+from .time_delay_utils import *
+from .lens_equation_utils import *
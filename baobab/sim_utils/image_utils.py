@@ -2,10 +2,103 @@ import copy
 import numpy as np
 # Lenstronomy modules
 from lenstronomy.ImSim.image_model import ImageModel
-from baobab.sim_utils import amp_to_mag_extended, amp_to_mag_point, get_lensed_total_flux, get_unlensed_total_flux
-__all__ = ['generate_image', 'generate_image_simple']
+from lenstronomy.SimulationAPI.data_api import DataAPI
+from baobab.sim_utils import amp_to_mag_extended, amp_to_mag_point, get_unlensed_total_flux
+__all__ = ['RenderContext', 'render_components', 'find_bright_images', 'generate_image', 'generate_image_simple']
 
-def generate_image(sample, psf_model, data_api, lens_mass_model, src_light_model, lens_eq_solver, pixel_scale, num_pix, components, kwargs_numerics, min_magnification=0.0, lens_light_model=None, ps_model=None):
+class RenderContext:
+    """Detector and image models for a single PSF, built once and reused across images
+
+    Only the model parameters change from one image to the next, so the pixel grid, PSF convolution, and numerics set up by `DataAPI` and `ImageModel` can be shared by all images rendered with the same PSF.
+
+    """
+    def __init__(self, psf_model, kwargs_detector, num_pix, lens_mass_model, src_light_model, kwargs_numerics, lens_light_model=None, ps_model=None):
+        """
+        Parameters
+        ----------
+        psf_model : lenstronomy PSF object
+            the PSF kernel point source map
+        kwargs_detector : dict
+            detector and observation conditions passed to `DataAPI`
+        num_pix : int
+            number of pixels on a side of the image
+        lens_mass_model : lenstronomy LensModel object
+            the lens mass model
+        src_light_model : lenstronomy LightModel object
+            the source light model
+        kwargs_numerics : dict
+            numerics settings of the image model (copy of `cfg.numerics`)
+        lens_light_model : lenstronomy LightModel object
+            the lens light model, if the lens light is rendered
+        ps_model : lenstronomy PointSource object
+            the point source model, if the point source is rendered
+
+        """
+        self.psf_model = psf_model
+        self.data_api = DataAPI(num_pix, **kwargs_detector)
+        self.image_model = ImageModel(self.data_api.data_class, psf_model, lens_mass_model, src_light_model, lens_light_model, ps_model, kwargs_numerics=kwargs_numerics)
+
+def render_components(image_model, kwargs_lens_mass, kwargs_src_light, kwargs_lens_light=None, kwargs_ps=None):
+    """Render each component of the image once
+
+    The image returned by `image_model.image` is the sum of the component images, so the component images can be reused for both the magnification and the exported image.
+
+    Parameters
+    ----------
+    image_model : lenstronomy ImageModel object
+        the image model
+    kwargs_lens_mass : list
+        list of the lens mass and external shear kwargs
+    kwargs_src_light : list
+        list of the source light kwargs, with 'amp'
+    kwargs_lens_light : list or None
+        list of the lens light kwargs, with 'amp', if the lens light is rendered
+    kwargs_ps : list or None
+        list of the point source kwargs, with the lensed 'point_amp', if the point source is rendered
+
+    Returns
+    -------
+    dict
+        the image of each rendered component among 'src_light', 'lens_light', and 'agn_light'
+
+    """
+    component_imgs = dict()
+    component_imgs['src_light'] = image_model.source_surface_brightness(kwargs_src_light, kwargs_lens_mass)
+    if kwargs_lens_light is not None:
+        component_imgs['lens_light'] = image_model.lens_surface_brightness(kwargs_lens_light)
+    if kwargs_ps is not None:
+        component_imgs['agn_light'] = image_model.point_source(kwargs_ps, kwargs_lens_mass)
+    return component_imgs
+
+def find_bright_images(sample, lens_eq_solver, pixel_scale, num_pix):
+    """Solve for the positions of the brightest point-source images of a single sample within the image
+
+    Parameters
+    ----------
+    sample : dict
+        sampled model parameters
+    lens_eq_solver : lenstronomy LensEquationSolver object
+        the lens equation solver
+    pixel_scale : float
+        pixel scale in arcsec/pix
+    num_pix : int
+        number of pixels on a side of the image
+
+    Returns
+    -------
+    tuple of np.array
+        the x and y coordinates of the images in arcsec
+
+    """
+    kwargs_lens_mass = [sample['lens_mass'], sample['external_shear']]
+    return lens_eq_solver.findBrightImage(sample['src_light']['center_x'],
+                                         sample['src_light']['center_y'],
+                                         kwargs_lens_mass,
+                                         numImages=4,
+                                         min_distance=pixel_scale,
+                                         search_window=num_pix*pixel_scale)
+
+def generate_image(sample, psf_model, data_api, lens_mass_model, src_light_model, lens_eq_solver, pixel_scale, num_pix, components, kwargs_numerics, min_magnification=0.0, lens_light_model=None, ps_model=None, image_model=None, image_positions=None):
     """Generate an image from provided model and model parameters
 
     Parameters
@@ -16,7 +109,10 @@ def generate_image(sample, psf_model, data_api, lens_mass_model, src_light_model
         the PSF kernel point source map
     data_api : lenstronomy DataAPI object
         tool that handles detector and observation conditions 
-    
+    image_model : lenstronomy ImageModel object
+        image model built from `data_api` and `psf_model`, e.g. cached in a `RenderContext`. Built on the fly if None.
+    image_positions : tuple of np.array or None
+        the x and y coordinates of the point-source images, e.g. solved for a batch of samples by `BatchImageFinder`. Solved for with `lens_eq_solver` if None.
 
     Returns
     -------
@@ -34,12 +130,10 @@ def generate_image(sample, psf_model, data_api, lens_mass_model, src_light_model
     kwargs_ps = None
     # Add AGN point source metadata
     if 'agn_light' in components:
-        x_image, y_image = lens_eq_solver.findBrightImage(sample['src_light']['center_x'],
-                                                          sample['src_light']['center_y'],
-                                                          kwargs_lens_mass,
-                                                          numImages=4,
-                                                          min_distance=pixel_scale, 
-                                                          search_window=num_pix*pixel_scale)
+        if image_positions is None:
+            x_image, y_image = find_bright_images(sample, lens_eq_solver, pixel_scale, num_pix)
+        else:
+            x_image, y_image = image_positions
         magnification = np.abs(lens_mass_model.magnification(x_image, y_image, kwargs=kwargs_lens_mass))
         unlensed_mag = sample['agn_light']['magnitude'] # unlensed agn mag
         kwargs_unlensed_mag_ps = [{'ra_image': x_image, 'dec_image': y_image, 'magnitude': unlensed_mag}] # note unlensed magnitude
@@ -56,16 +150,25 @@ def generate_image(sample, psf_model, data_api, lens_mass_model, src_light_model
         kwargs_lens_light = [sample['lens_light']]
         kwargs_lens_light = amp_to_mag_extended(kwargs_lens_light, lens_light_model, data_api)
     # Instantiate image model
-    image_model = ImageModel(image_data, psf_model, lens_mass_model, src_light_model, lens_light_model, ps_model, kwargs_numerics=kwargs_numerics)
+    if image_model is None:
+        image_model = ImageModel(image_data, psf_model, lens_mass_model, src_light_model, lens_light_model, ps_model, kwargs_numerics=kwargs_numerics)
+    # Render each component once
+    component_imgs = render_components(image_model, kwargs_lens_mass, kwargs_src_light, kwargs_lens_light, kwargs_ps)
+    lensed_img = component_imgs['src_light']
+    if 'agn_light' in component_imgs:
+        lensed_img = lensed_img + component_imgs['agn_light']
     # Compute magnification
-    lensed_total_flux = get_lensed_total_flux(kwargs_lens_mass, kwargs_src_light, kwargs_lens_light, kwargs_ps, image_model)
+    lensed_total_flux = np.sum(lensed_img)
     unlensed_total_flux = get_unlensed_total_flux(kwargs_src_light, src_light_model, kwargs_unlensed_amp_ps, ps_model)
     total_magnification = lensed_total_flux/unlensed_total_flux
     # Apply magnification cut
     if total_magnification < min_magnification:
         return None, None
-    # Generate image for export
-    img = image_model.image(kwargs_lens_mass, kwargs_src_light, kwargs_lens_light, kwargs_ps)
+    # Generate image for export from the cached component images
+    img = component_imgs['src_light']
+    for comp in ['lens_light', 'agn_light']:
+        if comp in component_imgs:
+            img = img + component_imgs[comp]
     # Add noise
     #if add_noise:
     #    noise = data_api.noise_for_model(img, background_noise=True, poisson_noise=True, seed=None)
@@ -0,0 +1,237 @@
+import numpy as np
+from lenstronomy.LensModel.lens_model import LensModel
+from baobab.sim_utils.time_delay_utils import BROADCASTING_LENS_PROFILES
+__all__ = ['BatchImageFinder']
+
+class BatchImageFinder:
+    """Solver of the lens equation for the point-source images of a batch of lenses, mirroring `LensEquationSolver.findBrightImage`
+
+    All the lenses are solved at once. The candidate images are found on a coarse grid, shared by all the lenses, that spans the image with cells `coarse_factor` pixels wide. Each cell is split into two triangles, and every triangle whose mapping onto the source plane encloses the source position seeds a candidate at its centroid. The candidates of all the lenses are then refined together with Newton steps, each step bounded by `min_distance`.
+    As in `findBrightImage`, the candidates that do not reach `precision_limit` in the source plane are dropped, the solutions closer than `min_distance` to a previous one are merged, the `num_images` brightest images are kept and sorted by arrival time. The images fainter than `magnification_limit` are dropped as well, e.g. the central image of a lens shallower than isothermal, which the pixel grid of `findBrightImage` does not resolve.
+
+    Note
+    ----
+    The lens parameters are broadcast along the candidates, so the lens profiles must be in `BROADCASTING_LENS_PROFILES`. The SPEMD profile is evaluated with its pure-NumPy implementation EPL.
+
+    """
+    def __init__(self, lens_model_list, pixel_scale, num_pix, num_images=4, min_distance=None, magnification_limit=1.e-2, coarse_factor=2, precision_limit=1.e-10, num_iter_max=20):
+        """
+        Parameters
+        ----------
+        lens_model_list : list
+            the lenstronomy lens profiles, e.g. `['SPEMD', 'SHEAR_GAMMA_PSI']`
+        pixel_scale : float
+            pixel scale in arcsec/pix
+        num_pix : int
+            number of pixels on a side of the image, which sets the search window
+        num_images : int
+            maximum number of images returned per lens. Default: 4
+        min_distance : float or None
+            minimum separation between two images in arcsec, and maximum length of a Newton step. If None, the pixel scale is used. Default: None
+        magnification_limit : float
+            minimum absolute magnification of an image. Default: 1.e-2
+        coarse_factor : int
+            number of pixels on a side of a cell of the candidate grid. Default: 2
+        precision_limit : float
+            maximum distance in the source plane, in arcsec, between the source and the ray-shot image. Default: 1.e-10
+        num_iter_max : int
+            maximum number of Newton steps. Default: 20
+
+        """
+        if not all(profile in BROADCASTING_LENS_PROFILES for profile in lens_model_list):
+            raise NotImplementedError("The batched image finder only supports the lens profiles {:s}.".format(', '.join(BROADCASTING_LENS_PROFILES)))
+        self.lens_model = LensModel([BROADCASTING_LENS_PROFILES[profile] for profile in lens_model_list])
+        self.num_images = num_images
+        self.min_distance = pixel_scale if min_distance is None else min_distance
+        self.magnification_limit = magnification_limit
+        self.precision_limit = precision_limit
+        self.num_iter_max = num_iter_max
+        # Coarse grid covering the search window, as in `findBrightImage` with `search_window=num_pix*pixel_scale`
+        fov = num_pix*pixel_scale
+        self.n_cells = int(np.ceil(num_pix/coarse_factor))
+        vertices = np.arange(self.n_cells + 1)*fov/self.n_cells - 0.5*fov
+        x_vertices, y_vertices = np.meshgrid(vertices, vertices)
+        self.x_vertices = x_vertices.ravel()
+        self.y_vertices = y_vertices.ravel()
+
+    def get_candidates(self, x_src, y_src, kwargs_lens):
+        """Find the starting points of the Newton steps, as the centroids of the triangles of the coarse grid whose mapping encloses the source
+
+        Parameters
+        ----------
+        x_src : np.array
+            x coordinates of the sources in arcsec, of length `n_lenses`
+        y_src : np.array
+            y coordinates of the sources in arcsec, of length `n_lenses`
+        kwargs_lens : list of dict
+            the lenstronomy kwargs of each lens profile, with arrays of length `n_lenses` as values
+
+        Returns
+        -------
+        tuple of np.array
+            the lens index and the x and y coordinates of each candidate, ordered by lens
+
+        """
+        kwargs_columns = [{k: np.asarray(v)[:, np.newaxis] for k, v in kw.items()} for kw in kwargs_lens]
+        shape = (len(x_src), self.n_cells + 1, self.n_cells + 1)
+        x_grid = np.tile(self.x_vertices, (len(x_src), 1))
+        y_grid = np.tile(self.y_vertices, (len(x_src), 1))
+        beta_x, beta_y = self.lens_model.ray_shooting(x_grid, y_grid, kwargs_columns)
+        beta_x = beta_x.reshape(shape) - x_src[:, np.newaxis, np.newaxis]
+        beta_y = beta_y.reshape(shape) - y_src[:, np.newaxis, np.newaxis]
+        x_vertices = self.x_vertices.reshape(shape[1:])
+        y_vertices = self.y_vertices.reshape(shape[1:])
+        n = self.n_cells
+        lens_i, x_cand, y_cand = [], [], []
+        # Split each cell into two triangles, given as the offsets of their vertices
+        for triangle in [((0, 0), (0, 1), (1, 0)), ((1, 1), (1, 0), (0, 1))]:
+            (x0, y0), (x1, y1), (x2, y2) = [(beta_x[:, i:n + i, j:n + j], beta_y[:, i:n + i, j:n + j]) for (i, j) in triangle]
+            det = (x1 - x0)*(y2 - y0) - (x2 - x0)*(y1 - y0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # Barycentric coordinates of the source position
+                l1 = ((-x0)*(y2 - y0) - (x2 - x0)*(-y0))/det
+                l2 = ((x1 - x0)*(-y0) - (-x0)*(y1 - y0))/det
+                inside = (l1 >= 0.0) & (l2 >= 0.0) & (l1 + l2 <= 1.0)
+            lens_tri, row, col = np.nonzero(inside)
+            x_centroid = sum(x_vertices[i:n + i, j:n + j] for (i, j) in triangle)/3.0
+            y_centroid = sum(y_vertices[i:n + i, j:n + j] for (i, j) in triangle)/3.0
+            lens_i.append(lens_tri)
+            x_cand.append(x_centroid[row, col])
+            y_cand.append(y_centroid[row, col])
+        # Local minima of the distance to the source among the 8 neighbors of each vertex, as in `findBrightImage`, for the images in folded triangles, e.g. near the radial critical curve
+        dist = np.hypot(beta_x, beta_y)
+        center = dist[:, 1:-1, 1:-1]
+        is_min = np.ones(center.shape, dtype=bool)
+        for i in range(3):
+            for j in range(3):
+                if (i, j) != (1, 1):
+                    is_min &= center < dist[:, i:n - 1 + i, j:n - 1 + j]
+        lens_min, row, col = np.nonzero(is_min)
+        lens_i.append(lens_min)
+        x_cand.append(x_vertices[1:-1, 1:-1][row, col])
+        y_cand.append(y_vertices[1:-1, 1:-1][row, col])
+        lens_i = np.concatenate(lens_i)
+        order = np.argsort(lens_i, kind='stable')
+        return lens_i[order], np.concatenate(x_cand)[order], np.concatenate(y_cand)[order]
+
+    def refine(self, x, y, x_src, y_src, kwargs_lens):
+        """Refine the candidates with Newton steps on the lens equation, each bounded by `min_distance`
+
+        A step that does not bring the ray-shot candidate closer to the source is halved at the next iteration, and the candidates that reached `precision_limit` are frozen.
+
+        Parameters
+        ----------
+        x : np.array
+            x coordinates of the candidates in arcsec
+        y : np.array
+            y coordinates of the candidates in arcsec
+        x_src : np.array
+            x coordinates of the source of each candidate in arcsec
+        y_src : np.array
+            y coordinates of the source of each candidate in arcsec
+        kwargs_lens : list of dict
+            the lenstronomy kwargs of each lens profile, with arrays of the same length as `x` as values
+
+        Returns
+        -------
+        tuple of np.array
+            the refined x and y coordinates, and the remaining distance to the source in the source plane
+
+        """
+        x = x.copy()
+        y = y.copy()
+        beta_x, beta_y = self.lens_model.ray_shooting(x, y, kwargs_lens)
+        delta = np.hypot(beta_x - x_src, beta_y - y_src)
+        damping = np.ones(len(x))
+        for _ in range(self.num_iter_max):
+            active = np.flatnonzero(delta > self.precision_limit)
+            if len(active) == 0:
+                break
+            kwargs_active = [{k: v[active] for k, v in kw.items()} for kw in kwargs_lens]
+            x_a, y_a = x[active], y[active]
+            d_x = beta_x[active] - x_src[active]
+            d_y = beta_y[active] - y_src[active]
+            f_xx, f_xy, f_yx, f_yy = self.lens_model.hessian(x_a, y_a, kwargs_active)
+            det = (1.0 - f_xx)*(1.0 - f_yy) - f_xy*f_yx
+            # Image-plane offset solving the linearized lens equation
+            step_x = ((1.0 - f_yy)*d_x + f_yx*d_y)/det
+            step_y = (f_xy*d_x + (1.0 - f_xx)*d_y)/det
+            step_length = np.hypot(step_x, step_y)
+            scale = damping[active]*np.minimum(1.0, self.min_distance/step_length)
+            x_new = x_a - scale*step_x
+            y_new = y_a - scale*step_y
+            beta_x_new, beta_y_new = self.lens_model.ray_shooting(x_new, y_new, kwargs_active)
+            delta_new = np.hypot(beta_x_new - x_src[active], beta_y_new - y_src[active])
+            improved = delta_new <= delta[active]
+            accepted = active[improved]
+            x[accepted] = x_new[improved]
+            y[accepted] = y_new[improved]
+            beta_x[accepted] = beta_x_new[improved]
+            beta_y[accepted] = beta_y_new[improved]
+            delta[accepted] = delta_new[improved]
+            damping[accepted] = 1.0
+            damping[active[~improved]] *= 0.5
+        return x, y, delta
+
+    def find_images(self, x_src, y_src, kwargs_lens):
+        """Find the brightest images of the point source of each lens
+
+        Parameters
+        ----------
+        x_src : array-like
+            x coordinates of the sources in arcsec, of length `n_lenses`
+        y_src : array-like
+            y coordinates of the sources in arcsec, of length `n_lenses`
+        kwargs_lens : list of dict
+            the lenstronomy kwargs of each lens profile, with arrays of length `n_lenses` as values
+
+        Returns
+        -------
+        tuple of (np.array, np.array, np.array)
+            the x and y coordinates of the images in arcsec, of shape `[n_lenses, num_images]`, sorted by arrival time and padded with NaN, and the number of images of each lens, as stored in `meta['n_img']`
+
+        """
+        x_src = np.atleast_1d(np.asarray(x_src, dtype=np.float64))
+        y_src = np.atleast_1d(np.asarray(y_src, dtype=np.float64))
+        kwargs_lens = [{k: np.broadcast_to(np.asarray(v, dtype=np.float64), x_src.shape) for k, v in kw.items()} for kw in kwargs_lens]
+        n_lenses = len(x_src)
+        x_image = np.full((n_lenses, self.num_images), np.nan)
+        y_image = np.full((n_lenses, self.num_images), np.nan)
+        lens_i, x_cand, y_cand = self.get_candidates(x_src, y_src, kwargs_lens)
+        if len(lens_i) == 0:
+            return x_image, y_image, np.zeros(n_lenses, dtype=int)
+        kwargs_cand = [{k: v[lens_i] for k, v in kw.items()} for kw in kwargs_lens]
+        x_cand, y_cand, delta = self.refine(x_cand, y_cand, x_src[lens_i], y_src[lens_i], kwargs_cand)
+        # Lay out the candidates of each lens along the rows of padded arrays
+        n_cand = np.bincount(lens_i, minlength=n_lenses)
+        rank = np.arange(len(lens_i)) - np.repeat(np.cumsum(n_cand) - n_cand, n_cand)
+        shape = (n_lenses, n_cand.max())
+        is_image = np.zeros(shape, dtype=bool)
+        is_image[lens_i, rank] = delta <= self.precision_limit
+        x_pad = np.zeros(shape)
+        y_pad = np.zeros(shape)
+        x_pad[lens_i, rank] = x_cand
+        y_pad[lens_i, rank] = y_cand
+        # Merge the solutions closer than `min_distance` to a previous solution of the same lens
+        close = (np.abs(x_pad[:, :, np.newaxis] - x_pad[:, np.newaxis, :]) < self.min_distance) & (np.abs(y_pad[:, :, np.newaxis] - y_pad[:, np.newaxis, :]) < self.min_distance)
+        close &= is_image[:, np.newaxis, :] & np.tril(np.ones(shape[1:], dtype=bool), k=-1)
+        is_image &= ~np.any(close, axis=-1)
+        # Keep the brightest images
+        kwargs_columns = [{k: v[:, np.newaxis] for k, v in kw.items()} for kw in kwargs_lens]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            magnification = np.abs(self.lens_model.magnification(x_pad, y_pad, kwargs_columns))
+        is_image &= magnification >= self.magnification_limit
+        magnification = np.where(is_image, magnification, -np.inf)
+        brightest = np.argsort(-magnification, axis=-1, kind='stable')[:, :self.num_images]
+        n_img = np.minimum(np.sum(is_image, axis=-1), self.num_images)
+        x_bright = np.take_along_axis(x_pad, brightest, axis=-1)
+        y_bright = np.take_along_axis(y_pad, brightest, axis=-1)
+        is_bright = np.arange(brightest.shape[1]) < n_img[:, np.newaxis]
+        # Sort them by arrival time
+        fermat_pot = self.lens_model.fermat_potential(x_bright, y_bright, kwargs_columns, x_src[:, np.newaxis], y_src[:, np.newaxis])
+        order = np.argsort(np.where(is_bright, fermat_pot, np.inf), axis=-1, kind='stable')
+        x_bright = np.take_along_axis(x_bright, order, axis=-1)
+        y_bright = np.take_along_axis(y_bright, order, axis=-1)
+        x_image[:, :brightest.shape[1]] = np.where(is_bright, x_bright, np.nan)
+        y_image[:, :brightest.shape[1]] = np.where(is_bright, y_bright, np.nan)
+        return x_image, y_image, n_img
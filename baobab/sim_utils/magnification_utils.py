@@ -0,0 +1,161 @@
+import numpy as np
+from baobab.sim_utils import amp_to_mag_extended, get_unlensed_total_flux
+__all__ = ['MagnificationScreen']
+
+class MagnificationScreen:
+    """Upper bound on the total magnification, used to reject samples before rendering the image
+
+    The total magnification of `generate_image` is the flux within the image of the PSF-convolved lensed source and point source, over their unlensed flux. Convolving a non-negative image with a kernel only moves flux around and loses the flux spread over the edges of the image, so the flux within the image is at most the flux of the unconvolved image times the sum of the positive pixels of the kernel, i.e. 1 for a normalized, non-negative kernel. The bound is the flux of the unconvolved lensed source, rendered on the pixel grid and with the numerics of the image, plus the flux of the point-source images, magnified at the same image positions as in `generate_image`.
+    A sample is screened out only if the bound falls below the minimum magnification, so the screen never rejects a sample the exact cut in `generate_image` would keep. The screened-out samples skip the PSF convolutions, the lens light, and the rendering of the point source.
+
+    """
+    def __init__(self, lens_mass_model, src_light_model, components, min_magnification):
+        """
+        Parameters
+        ----------
+        lens_mass_model : lenstronomy LensModel object
+            the lens mass model with the lens mass and external shear profiles
+        src_light_model : lenstronomy LightModel object
+            the source light model
+        components : list
+            list of components to render (copy of `cfg.components`)
+        min_magnification : float
+            minimum total magnification of the exact cut
+
+        """
+        self.lens_mass_model = lens_mass_model
+        self.src_light_model = src_light_model
+        self.include_point_source = 'agn_light' in components
+        self.min_magnification = min_magnification
+        self.reset_counts()
+
+    def reset_counts(self):
+        """Reset the tallies of screened samples
+
+        """
+        self.n_evaluated = 0
+        self.n_screened = 0
+
+    @property
+    def screened_fraction(self):
+        """Fraction of the evaluated samples that were screened out
+
+        """
+        return self.n_screened/max(self.n_evaluated, 1)
+
+    @staticmethod
+    def get_kernel_factor(psf_model):
+        """Get the factor by which the PSF convolution can at most scale the flux within the image, the sum of the positive pixels of the normalized kernel
+
+        Parameters
+        ----------
+        psf_model : lenstronomy PSF object
+            the PSF
+
+        Returns
+        -------
+        float
+            the factor, 1 for a non-negative kernel
+
+        """
+        kernel = psf_model.kernel_point_source
+        return np.sum(np.maximum(kernel, 0.0))/np.sum(kernel)
+
+    def get_point_source_flux(self, sample, render_context, image_positions=None):
+        """Get the upper bound on the lensed flux of the point source and the total unlensed flux
+
+        Parameters
+        ----------
+        sample : dict
+            sampled model parameters
+        render_context : RenderContext
+            the detector and image models the image would be rendered with
+        image_positions : tuple of np.array or None
+            the x and y coordinates of the point-source images, required if the point source is rendered
+
+        Returns
+        -------
+        tuple of float
+            the upper bound on the lensed flux of the point source, 0 if it is not rendered, and the total unlensed flux of the source and point source
+
+        """
+        data_api = render_context.data_api
+        kwargs_src_light = amp_to_mag_extended([sample['src_light']], self.src_light_model, data_api)
+        unlensed_flux = get_unlensed_total_flux(kwargs_src_light, self.src_light_model)
+        lensed_flux = 0.0
+        if self.include_point_source:
+            kwargs_lens_mass = [sample['lens_mass'], sample['external_shear']]
+            point_amp = data_api.magnitude2cps(sample['agn_light']['magnitude'])
+            x_image, y_image = image_positions
+            lensed_flux += point_amp*np.sum(np.abs(self.lens_mass_model.magnification(x_image, y_image, kwargs_lens_mass)))
+            unlensed_flux += point_amp
+        return self.get_kernel_factor(render_context.psf_model)*lensed_flux, unlensed_flux
+
+    def get_source_flux(self, sample, render_context):
+        """Get the upper bound on the lensed flux of the source
+
+        Parameters
+        ----------
+        sample : dict
+            sampled model parameters
+        render_context : RenderContext
+            the detector and image models the image would be rendered with
+
+        Returns
+        -------
+        float
+            the flux of the unconvolved lensed source within the image times the kernel factor
+
+        """
+        kwargs_lens_mass = [sample['lens_mass'], sample['external_shear']]
+        kwargs_src_light = amp_to_mag_extended([sample['src_light']], self.src_light_model, render_context.data_api)
+        unconvolved = render_context.image_model.source_surface_brightness(kwargs_src_light, kwargs_lens_mass, unconvolved=True)
+        return self.get_kernel_factor(render_context.psf_model)*np.sum(unconvolved)
+
+    def get_magnification_bound(self, sample, render_context, image_positions=None):
+        """Get the upper bound on the total magnification as defined in `generate_image`
+
+        Parameters
+        ----------
+        sample : dict
+            sampled model parameters
+        render_context : RenderContext
+            the detector and image models the image would be rendered with
+        image_positions : tuple of np.array or None
+            the x and y coordinates of the point-source images, required if the point source is rendered
+
+        Returns
+        -------
+        float
+            the upper bound
+
+        """
+        point_flux, unlensed_flux = self.get_point_source_flux(sample, render_context, image_positions)
+        return (point_flux + self.get_source_flux(sample, render_context))/unlensed_flux
+
+    def reject(self, sample, render_context, image_positions=None):
+        """Determine whether the sample can be rejected without rendering it
+
+        Parameters
+        ----------
+        sample : dict
+            sampled model parameters
+        render_context : RenderContext
+            the detector and image models the image would be rendered with
+        image_positions : tuple of np.array or None
+            the x and y coordinates of the point-source images, required if the point source is rendered
+
+        Returns
+        -------
+        bool
+            whether to reject this sample
+
+        """
+        self.n_evaluated += 1
+        point_flux, unlensed_flux = self.get_point_source_flux(sample, render_context, image_positions)
+        threshold_flux = self.min_magnification*unlensed_flux
+        # The lensed source is only rendered if the point source alone may not make the cut
+        if point_flux < threshold_flux and point_flux + self.get_source_flux(sample, render_context) < threshold_flux:
+            self.n_screened += 1
+            return True
+        return False
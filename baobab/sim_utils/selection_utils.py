@@ -1,8 +1,152 @@
-__all__ = ['Selection']
+import ast
+import operator
+from collections import OrderedDict
+import numpy as np
+__all__ = ['Selection', 'compile_selection']
+
+# Operators allowed in the selection expressions, applied elementwise
+_binary_ops = {
+               ast.Add: operator.add,
+               ast.Sub: operator.sub,
+               ast.Mult: operator.mul,
+               ast.Div: operator.truediv,
+               ast.FloorDiv: operator.floordiv,
+               ast.Mod: operator.mod,
+               ast.Pow: operator.pow,
+               }
+_unary_ops = {
+              ast.UAdd: operator.pos,
+              ast.USub: operator.neg,
+              ast.Not: np.logical_not,
+              }
+_compare_ops = {
+                ast.Lt: np.less,
+                ast.LtE: np.less_equal,
+                ast.Gt: np.greater,
+                ast.GtE: np.greater_equal,
+                ast.Eq: np.equal,
+                ast.NotEq: np.not_equal,
+                }
+# Functions allowed in the selection expressions, callable bare or as `np.<name>`
+_functions = {name: getattr(np, name) for name in ['abs', 'sqrt', 'exp', 'log', 'log10',
+                                                   'sin', 'cos', 'tan', 'arctan', 'arctan2',
+                                                   'hypot', 'minimum', 'maximum']}
+
+# Literal nodes emitted by the parser before Python 3.8, mapped to the attribute holding their value
+_legacy_literals = [(getattr(ast, name), attr) for name, attr in [('Num', 'n'), ('Str', 's'), ('NameConstant', 'value')] if hasattr(ast, name)]
+
+_not_literal = object()
+
+def _get_literal(node):
+    """Get the value of a literal node, or `_not_literal` if the node is not a literal
+
+    """
+    if isinstance(node, ast.Constant):
+        return node.value
+    for literal_type, attr in _legacy_literals:
+        if type(node) is literal_type:
+            return getattr(node, attr)
+    return _not_literal
+
+def _compile_node(node, arg_name, expr):
+    """Recursively compile a node of a selection expression into a function of the sample
+
+    """
+    value = _get_literal(node)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return lambda x: value
+    if isinstance(node, ast.Name) and node.id == arg_name:
+        return lambda x: x
+    if isinstance(node, ast.Subscript):
+        key = node.slice
+        # Before Python 3.9, the subscript is wrapped in `ast.Index`
+        if hasattr(ast, 'Index') and type(key) is ast.Index:
+            key = key.value
+        key = _get_literal(key)
+        if not isinstance(key, str):
+            raise ValueError("Only string keys are supported in the selection '{:s}'".format(expr))
+        get_container = _compile_node(node.value, arg_name, expr)
+        def get_item(x):
+            value = get_container(x)[key]
+            # Leave nested dictionaries alone, and turn list-valued parameters into arrays
+            return value if isinstance(value, dict) else np.asarray(value)
+        return get_item
+    if isinstance(node, ast.BinOp) and type(node.op) in _binary_ops:
+        op = _binary_ops[type(node.op)]
+        left = _compile_node(node.left, arg_name, expr)
+        right = _compile_node(node.right, arg_name, expr)
+        return lambda x: op(left(x), right(x))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _unary_ops:
+        op = _unary_ops[type(node.op)]
+        operand = _compile_node(node.operand, arg_name, expr)
+        return lambda x: op(operand(x))
+    if isinstance(node, ast.BoolOp):
+        # `and`, `or` become elementwise so that they apply to batches
+        op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        values = [_compile_node(v, arg_name, expr) for v in node.values]
+        def bool_op(x):
+            out = values[0](x)
+            for v in values[1:]:
+                out = op(out, v(x))
+            return out
+        return bool_op
+    if isinstance(node, ast.Compare) and all(type(op) in _compare_ops for op in node.ops):
+        # Chained comparisons, e.g. `a < b < c`, are the conjunction of the pairwise comparisons
+        ops = [_compare_ops[type(op)] for op in node.ops]
+        operands = [_compile_node(v, arg_name, expr) for v in [node.left] + node.comparators]
+        def compare(x):
+            evaluated = [o(x) for o in operands]
+            out = ops[0](evaluated[0], evaluated[1])
+            for i in range(1, len(ops)):
+                out = np.logical_and(out, ops[i](evaluated[i], evaluated[i + 1]))
+            return out
+        return compare
+    if isinstance(node, ast.Call) and not node.keywords:
+        func = node.func
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id in ['np', 'numpy']:
+            func_name = func.attr
+        elif isinstance(func, ast.Name):
+            func_name = func.id
+        else:
+            func_name = None
+        if func_name in _functions:
+            f = _functions[func_name]
+            args = [_compile_node(a, arg_name, expr) for a in node.args]
+            return lambda x: f(*[a(x) for a in args])
+    raise ValueError("Unsupported syntax '{:s}' in the selection '{:s}'".format(ast.dump(node), expr))
+
+def compile_selection(expr):
+    """Compile a selection string into a vectorized predicate without evaluating arbitrary code
+
+    The selection is written as a lambda of the sample, e.g. `"lambda x: x['lens_mass']['theta_E'] > 0.5"`.
+    Only item access with string keys, numeric constants, arithmetic, comparisons, boolean operators,
+    and a few NumPy functions are allowed.
+
+    Parameters
+    ----------
+    expr : str
+        the selection string
+
+    Returns
+    -------
+    callable
+        function taking the sample (a single sample or a batch of samples whose parameters are arrays) and returning True, or a boolean array, where the selection passes
+
+    """
+    try:
+        tree = ast.parse(expr.strip(), mode='eval').body
+    except SyntaxError:
+        raise ValueError("The selection '{:s}' is not a valid expression".format(expr))
+    if not isinstance(tree, ast.Lambda) or len(tree.args.args) != 1:
+        raise ValueError("The selection '{:s}' must be a lambda function of a single argument".format(expr))
+    body = _compile_node(tree.body, tree.args.args[0].arg, expr)
+    return lambda sample: np.asarray(body(sample), dtype=bool)
 
 class Selection:
     """Selections applied to the sampled set of parameters
 
+    The selections are compiled once and evaluated on whole batches of samples. The number of samples rejected by each selection is tallied in `rejection_counts`.
+
     """
     def __init__(self, selection_cfg, components):
         """
@@ -15,25 +159,59 @@ class Selection:
 
         """
         self.components = components
-        self.init_selections = [eval(s) for s in selection_cfg['initial']]
-        self.init_selections += self.get_ellipticity_selections()
+        self.init_selections = OrderedDict((s, compile_selection(s)) for s in selection_cfg['initial'])
+        self.init_selections.update(self.get_ellipticity_selections())
+        self.reset_counts()
 
     def get_ellipticity_selections(self):
         """Get default selections for a self-consistent ellipticity definition
 
         Returns
         -------
-        list
-            lambda functions with the sample dictionary as the argument, each of which returns True if the selection passes
+        OrderedDict
+            functions with the sample dictionary as the argument, each of which returns True if the selection passes, keyed by the selection name
 
         """
-        ellip_selections = []
-        ellip_selections += [lambda x: ((x['lens_mass']['e1']**2.0 + x['lens_mass']['e2']**2.0)**0.5 < 1.0)]
-        ellip_selections += [lambda x: ((x['src_light']['e1']**2.0 + x['src_light']['e2']**2.0)**0.5 < 1.0)]
+        ellip_selections = OrderedDict()
+        ellip_comps = ['lens_mass', 'src_light']
         if 'lens_light' in self.components:
-            ellip_selections += [lambda x: ((x['lens_light']['e1']**2.0 + x['lens_light']['e2']**2.0)**0.5 < 1.0)]
+            ellip_comps.append('lens_light')
+        for comp in ellip_comps:
+            s = "lambda x: (x['{0:s}']['e1']**2.0 + x['{0:s}']['e2']**2.0)**0.5 < 1.0".format(comp)
+            ellip_selections['{:s} ellipticity'.format(comp)] = compile_selection(s)
         return ellip_selections
 
+    def reset_counts(self):
+        """Reset the tallies of evaluated samples and of rejections per selection
+
+        """
+        self.n_evaluated = 0
+        self.rejection_counts = OrderedDict((name, 0) for name in self.init_selections)
+
+    def get_initial_mask(self, batch):
+        """Evaluate all the selections on a batch of samples
+
+        Each selection is evaluated on every sample, so a sample failing several selections counts toward each of them in `rejection_counts`.
+
+        Parameters
+        ----------
+        batch : dict
+            sampled parameters, with an array of values for each parameter, as returned by the BNN prior's `sample_batch`
+
+        Returns
+        -------
+        np.array of bool
+            whether each sample passes all the selections
+
+        """
+        passed = [selection(batch) for selection in self.init_selections.values()]
+        passed = np.broadcast_arrays(*passed)
+        mask = np.logical_and.reduce(passed, axis=0)
+        self.n_evaluated += mask.size
+        for name, p in zip(self.init_selections, passed):
+            self.rejection_counts[name] += int(np.size(p) - np.count_nonzero(p))
+        return mask
+
     def reject_initial(self, sample):
         """Determine whether to reject the sample
 
@@ -48,6 +226,4 @@ class Selection:
             whether to reject this sample
 
         """
-        passed = [l(sample) for l in self.init_selections]
-        if not all(passed):
-            return True
\ No newline at end of file
+        return not bool(self.get_initial_mask(sample))
@@ -0,0 +1,95 @@
+import numpy as np
+from lenstronomy.LensModel.lens_model import LensModel
+import lenstronomy.Util.constants as const
+__all__ = ['BROADCASTING_LENS_PROFILES', 'BatchTimeDelays']
+
+# Lens profiles whose lenstronomy implementation broadcasts over arrays of parameters,
+# mapped to the profile evaluated in their place. EPL is the pure-NumPy implementation of the SPEMD profile.
+BROADCASTING_LENS_PROFILES = {'SPEMD': 'EPL', 'EPL': 'EPL', 'SHEAR_GAMMA_PSI': 'SHEAR_GAMMA_PSI', 'SHEAR': 'SHEAR'}
+
+class BatchTimeDelays:
+    """Fermat potential and time delays of a batch of lenses, at image positions that have already been solved for, e.g. while rendering the images
+
+    The images of all the lenses are evaluated in a single lenstronomy call, with the lens parameters broadcast along the image axis, if all the profiles are in `BROADCASTING_LENS_PROFILES`. Otherwise, the lenses are evaluated one by one.
+
+    """
+    def __init__(self, lens_model_list):
+        """
+        Parameters
+        ----------
+        lens_model_list : list
+            the lenstronomy lens profiles, e.g. `['SPEMD', 'SHEAR_GAMMA_PSI']`
+
+        """
+        self.broadcast = all(profile in BROADCASTING_LENS_PROFILES for profile in lens_model_list)
+        if self.broadcast:
+            lens_model_list = [BROADCASTING_LENS_PROFILES[profile] for profile in lens_model_list]
+        self.lens_model = LensModel(lens_model_list)
+
+    def get_fermat_potential(self, x_image, y_image, kwargs_lens):
+        """Evaluate the Fermat potential at the image positions, relative to the source position inferred from the images
+
+        Parameters
+        ----------
+        x_image : array-like
+            x coordinates of the images in arcsec, of shape `[n_lenses, max_n_img]` and padded with NaN
+        y_image : array-like
+            y coordinates of the images in arcsec, of the same shape as `x_image`
+        kwargs_lens : list of dict
+            the lenstronomy kwargs of each lens profile, with arrays of length `n_lenses` as values
+
+        Returns
+        -------
+        np.array
+            the Fermat potential in arcsec^2, of the same shape as `x_image` and NaN where there is no image
+
+        """
+        x_image = np.asarray(x_image, dtype=np.float64)
+        y_image = np.asarray(y_image, dtype=np.float64)
+        is_image = ~np.isnan(x_image)
+        # Evaluate the padded entries at the first image, and mask them out afterwards
+        x_eval = np.where(is_image, x_image, x_image[:, :1])
+        y_eval = np.where(is_image, y_image, y_image[:, :1])
+        if self.broadcast:
+            kwargs_columns = [{k: np.asarray(v)[:, np.newaxis] for k, v in kw.items()} for kw in kwargs_lens]
+            fermat_pot = self._get_fermat_potential(x_eval, y_eval, is_image, kwargs_columns)
+        else:
+            fermat_pot = np.empty(x_eval.shape)
+            for i in range(x_eval.shape[0]):
+                kwargs_lens_i = [{k: np.asarray(v)[i] for k, v in kw.items()} for kw in kwargs_lens]
+                fermat_pot[i] = self._get_fermat_potential(x_eval[i], y_eval[i], is_image[i], kwargs_lens_i)
+        return np.where(is_image, fermat_pot, np.nan)
+
+    def _get_fermat_potential(self, x_image, y_image, is_image, kwargs_lens):
+        """Evaluate the Fermat potential relative to the mean source position of the images along the last axis
+
+        """
+        x_src, y_src = self.lens_model.ray_shooting(x_image, y_image, kwargs_lens)
+        n_img = np.sum(is_image, axis=-1, keepdims=True)
+        x_src = np.sum(np.where(is_image, x_src, 0.0), axis=-1, keepdims=True)/n_img
+        y_src = np.sum(np.where(is_image, y_src, 0.0), axis=-1, keepdims=True)/n_img
+        return self.lens_model.fermat_potential(x_image, y_image, kwargs_lens, x_src, y_src)
+
+    def get_time_delays(self, x_image, y_image, kwargs_lens, D_dt):
+        """Evaluate the time delays at the image positions
+
+        Parameters
+        ----------
+        x_image : array-like
+            x coordinates of the images in arcsec, of shape `[n_lenses, max_n_img]` and padded with NaN
+        y_image : array-like
+            y coordinates of the images in arcsec, of the same shape as `x_image`
+        kwargs_lens : list of dict
+            the lenstronomy kwargs of each lens profile, with arrays of length `n_lenses` as values
+        D_dt : array-like
+            the time-delay distance of each lens in Mpc, including any external convergence factor
+
+        Returns
+        -------
+        np.array
+            the time delays in days, of the same shape as `x_image` and NaN where there is no image
+
+        """
+        fermat_pot = self.get_fermat_potential(x_image, y_image, kwargs_lens)
+        D_dt = np.asarray(D_dt, dtype=np.float64)[:, np.newaxis]*const.Mpc
+        return D_dt/const.c*fermat_pot/const.day_s*const.arcsec**2.0
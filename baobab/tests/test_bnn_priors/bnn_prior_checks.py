@@ -0,0 +1,65 @@
+import numpy as np
+import scipy.stats as stats
+
+class BNNPriorChecks:
+    """Tests shared by the suites of the BNN priors, mixed into a `unittest.TestCase` that implements `get_bnn_prior`
+
+    """
+    def get_bnn_prior(self):
+        """Get the BNN prior to test
+
+        """
+        raise NotImplementedError
+
+    def test_sample_batch(self):
+        """Tests batched sampling, which should have the same structure as a single sample
+
+        """
+        bnn_prior = self.get_bnn_prior()
+        n = 5
+        sample = bnn_prior.sample()
+        batch = bnn_prior.sample_batch(n)
+        self.assertEqual(set(batch.keys()), set(sample.keys()))
+        for comp in sample:
+            self.assertEqual(set(batch[comp].keys()), set(sample[comp].keys()))
+            for param_name in sample[comp]:
+                self.assertEqual(len(batch[comp][param_name]), n)
+        single = bnn_prior.get_single_sample(batch, n - 1)
+        np.testing.assert_equal(single['lens_mass']['center_x'], batch['lens_mass']['center_x'][-1])
+
+    def test_sample_batch_distribution(self):
+        """Tests that batched sampling draws each parameter from the same distribution as stacked single samples
+
+        """
+        bnn_prior = self.get_bnn_prior()
+        n = 1000
+        batch = bnn_prior.sample_batch(n, rng=np.random.default_rng(0))
+        rng = np.random.default_rng(1)
+        stacked = bnn_prior.stack_samples([bnn_prior.sample(rng=rng) for _ in range(n)])
+        for comp in stacked:
+            for param_name, values in stacked[comp].items():
+                if np.ndim(values) != 1:
+                    continue
+                batch_values = np.asarray(batch[comp][param_name], dtype=np.float64)
+                self.assertTrue(np.all(np.isfinite(batch_values)), msg='{:s} {:s}'.format(comp, param_name))
+                # Two-sample Kolmogorov-Smirnov test, with fixed generators
+                p_value = stats.ks_2samp(batch_values, np.asarray(values, dtype=np.float64)).pvalue
+                self.assertGreater(p_value, 1.e-4, msg='{:s} {:s}'.format(comp, param_name))
+
+    def test_rng(self):
+        """Tests that sampling with a generator is reproducible and independent of the global random state
+
+        """
+        bnn_prior = self.get_bnn_prior()
+        np.random.seed(0)
+        batch = bnn_prior.sample_batch(3, rng=np.random.default_rng(123))
+        sample = bnn_prior.sample(rng=np.random.default_rng(456))
+        np.random.seed(1)
+        batch_again = bnn_prior.sample_batch(3, rng=np.random.default_rng(123))
+        sample_again = bnn_prior.sample(rng=np.random.default_rng(456))
+        for comp in batch:
+            for param_name in batch[comp]:
+                np.testing.assert_array_equal(batch[comp][param_name], batch_again[comp][param_name])
+        for comp in sample:
+            for param_name in sample[comp]:
+                np.testing.assert_array_equal(sample[comp][param_name], sample_again[comp][param_name])
@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+from astropy.cosmology import FlatLambdaCDM, LambdaCDM
+from baobab.bnn_priors.cosmology_cache import CosmologyCache
+from baobab.bnn_priors.parameter_models import approximate_theta_E_for_SIS
+
+class TestCosmologyCache(unittest.TestCase):
+    """Tests for the interpolated distances of the cosmology cache
+
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.cosmo = FlatLambdaCDM(H0=74.151, Om0=0.27)
+        cls.cosmo_cache = CosmologyCache(cls.cosmo)
+
+    def test_error_bound(self):
+        """Test that the measured interpolation error is within the documented bound and holds off the grid
+
+        """
+        self.assertLess(self.cosmo_cache.max_rel_error, 1.e-9)
+        rng = np.random.default_rng(123)
+        z = rng.uniform(0.01, 12.0, size=100) # including redshifts beyond the grid
+        np.testing.assert_allclose(self.cosmo_cache.comoving_distance(z), self.cosmo.comoving_distance(z).value, rtol=1.e-9)
+        np.testing.assert_allclose(self.cosmo_cache.distmod(z), self.cosmo.distmod(z).value, rtol=0.0, atol=1.e-8)
+        np.testing.assert_allclose(self.cosmo_cache.arcsec_per_kpc_comoving(z), self.cosmo.arcsec_per_kpc_comoving(z).value, rtol=1.e-9)
+        np.testing.assert_allclose(self.cosmo_cache.angular_diameter_distance(z), self.cosmo.angular_diameter_distance(z).value, rtol=1.e-9)
+
+    def test_lens_source_distances(self):
+        """Test the distances between lens and source redshifts against astropy and lenstronomy
+
+        """
+        from lenstronomy.Cosmo.lens_cosmo import LensCosmo
+        z_lens = np.array([0.3, 0.5, 1.2])
+        z_src = np.array([1.0, 2.5, 3.0])
+        D_ls = self.cosmo.angular_diameter_distance_z1z2(z_lens, z_src).value
+        np.testing.assert_allclose(self.cosmo_cache.angular_diameter_distance_z1z2(z_lens, z_src), D_ls, rtol=1.e-9)
+        np.testing.assert_allclose(self.cosmo_cache.D_ls_over_D_s(z_lens, z_src), D_ls/self.cosmo.angular_diameter_distance(z_src).value, rtol=1.e-9)
+        for i in range(len(z_lens)):
+            lens_cosmo = LensCosmo(z_lens[i], z_src[i], cosmo=self.cosmo)
+            np.testing.assert_allclose(self.cosmo_cache.time_delay_distance(z_lens[i], z_src[i]), lens_cosmo.ddt, rtol=1.e-8)
+            np.testing.assert_allclose(approximate_theta_E_for_SIS(250.0, z_lens[i], z_src[i], self.cosmo_cache), approximate_theta_E_for_SIS(250.0, z_lens[i], z_src[i], self.cosmo), rtol=1.e-8)
+        theta_E = approximate_theta_E_for_SIS(np.full(3, 250.0), z_lens, z_src, self.cosmo_cache)
+        self.assertEqual(theta_E.shape, (3,))
+
+    def test_non_flat(self):
+        """Test that non-flat cosmologies are rejected
+
+        """
+        with self.assertRaises(ValueError):
+            CosmologyCache(LambdaCDM(H0=70.0, Om0=0.3, Ode0=0.6))
+
+if __name__ == '__main__':
+    unittest.main()
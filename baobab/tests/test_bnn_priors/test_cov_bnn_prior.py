@@ -1,6 +1,7 @@
 import unittest
+from baobab.tests.test_bnn_priors.bnn_prior_checks import BNNPriorChecks
 
-class TestCovBNNPrior(unittest.TestCase):
+class TestCovBNNPrior(BNNPriorChecks, unittest.TestCase):
     """A suite of tests alerting us for breakge, e.g. errors in
     instantiation of classes or execution of scripts, for CovBNNPrior
 
@@ -13,6 +14,14 @@ class TestCovBNNPrior(unittest.TestCase):
         cfg = configs.BaobabConfig.from_file(configs.tdlmc_cov_config.__file__)
         return cfg
 
+    def get_bnn_prior(self):
+        """Get the CovBNNPrior of the config
+
+        """
+        from baobab.bnn_priors import CovBNNPrior
+        cfg = self.test_tdlmc_cov_config()
+        return CovBNNPrior(cfg.bnn_omega, cfg.components)
+
     def test_cov_bnn_prior(self):
         """Tests instantiation and sampling of CovBNNPrior
 
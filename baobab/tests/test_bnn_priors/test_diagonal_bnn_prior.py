@@ -1,6 +1,7 @@
 import unittest
+from baobab.tests.test_bnn_priors.bnn_prior_checks import BNNPriorChecks
 
-class TestDiagonalBNNPrior(unittest.TestCase):
+class TestDiagonalBNNPrior(BNNPriorChecks, unittest.TestCase):
     """A suite of tests alerting us for breakge, e.g. errors in
     instantiation of classes or execution of scripts, for DiagonalBNNPrior
 
@@ -13,6 +14,14 @@ class TestDiagonalBNNPrior(unittest.TestCase):
         cfg = configs.BaobabConfig.from_file(configs.tdlmc_diagonal_config.__file__)
         return cfg
 
+    def get_bnn_prior(self):
+        """Get the DiagonalBNNPrior of the config
+
+        """
+        from baobab.bnn_priors import DiagonalBNNPrior
+        cfg = self.test_tdlmc_diagonal_config()
+        return DiagonalBNNPrior(cfg.bnn_omega, cfg.components)
+
     def test_diagonal_bnn_prior(self):
         """Tests instantiation and sampling of DiagonalBNNPrior
 
@@ -1,6 +1,7 @@
 import unittest
+from baobab.tests.test_bnn_priors.bnn_prior_checks import BNNPriorChecks
 
-class TestDiagonalCosmoBNNPrior(unittest.TestCase):
+class TestDiagonalCosmoBNNPrior(BNNPriorChecks, unittest.TestCase):
     """A suite of tests alerting us for breakge, e.g. errors in
     instantiation of classes or execution of scripts, for DiagonalBNNPrior
 
@@ -13,6 +14,14 @@ class TestDiagonalCosmoBNNPrior(unittest.TestCase):
         cfg = configs.BaobabConfig.from_file(configs.tdlmc_diagonal_cosmo_config.__file__)
         return cfg
 
+    def get_bnn_prior(self):
+        """Get the DiagonalCosmoBNNPrior of the config
+
+        """
+        from baobab.bnn_priors import DiagonalCosmoBNNPrior
+        cfg = self.test_tdlmc_diagonal_cosmo_config()
+        return DiagonalCosmoBNNPrior(cfg.bnn_omega, cfg.components)
+
     def test_diagonal_cosmo_bnn_prior(self):
         """Tests instantiation and sampling of DiagonalBNNPrior
 
@@ -22,5 +31,125 @@ class TestDiagonalCosmoBNNPrior(unittest.TestCase):
         diagonal_cosmo_bnn_prior = DiagonalCosmoBNNPrior(cfg.bnn_omega, cfg.components)
         return diagonal_cosmo_bnn_prior.sample()
 
+    def test_vel_disp_table(self):
+        """Tests that the velocity dispersion is evaluated from the lookup table for the analytic model
+
+        """
+        import numpy as np
+        from baobab.bnn_priors import DiagonalCosmoBNNPrior
+        cfg = self.test_tdlmc_diagonal_cosmo_config()
+        cfg.bnn_omega.kinematics.calculate_vel_disp = True
+        diagonal_cosmo_bnn_prior = DiagonalCosmoBNNPrior(cfg.bnn_omega, cfg.components)
+        batch = diagonal_cosmo_bnn_prior.sample_batch(4, rng=np.random.default_rng(0))
+        true_vd = np.array(batch['misc']['true_vd'])
+        self.assertTrue(np.all(np.isfinite(true_vd)) and np.all(true_vd > 0.0))
+        single = diagonal_cosmo_bnn_prior.get_single_sample(batch, 2)
+        D_s_over_D_ds = 1.0/diagonal_cosmo_bnn_prior.cosmo_cache.D_ls_over_D_s(single['misc']['z_lens'], single['misc']['z_src'])
+        expected = diagonal_cosmo_bnn_prior.vel_disp_table.velocity_dispersion(single['lens_mass']['theta_E'], single['lens_mass']['gamma'], single['lens_light']['R_sersic'], D_s_over_D_ds, single['misc']['kappa_ext'])
+        np.testing.assert_allclose(true_vd[2], expected)
+
+    def test_defer_observables(self):
+        """Tests that the deferred velocity dispersion of a sample of a batch matches the one computed with the batch
+
+        """
+        import numpy as np
+        from baobab.bnn_priors import DiagonalCosmoBNNPrior
+        cfg = self.test_tdlmc_diagonal_cosmo_config()
+        cfg.bnn_omega.kinematics.calculate_vel_disp = True
+        diagonal_cosmo_bnn_prior = DiagonalCosmoBNNPrior(cfg.bnn_omega, cfg.components)
+        batch = diagonal_cosmo_bnn_prior.sample_batch(4, rng=np.random.default_rng(0))
+        diagonal_cosmo_bnn_prior.defer_observables = True
+        deferred_batch = diagonal_cosmo_bnn_prior.sample_batch(4, rng=np.random.default_rng(0))
+        self.assertNotIn('true_vd', deferred_batch['misc'])
+        single = diagonal_cosmo_bnn_prior.add_observables(diagonal_cosmo_bnn_prior.get_single_sample(deferred_batch, 2))
+        np.testing.assert_allclose(single['misc']['true_vd'], batch['misc']['true_vd'][2])
+
+    def test_get_time_delays(self):
+        """Tests that the time delays with the cached cosmology agree with those of TDCosmography
+
+        """
+        import numpy as np
+        from lenstronomy.Analysis.td_cosmography import TDCosmography
+        from lenstronomy.LensModel.lens_model import LensModel
+        from lenstronomy.PointSource.point_source import PointSource
+        from baobab.bnn_priors import DiagonalCosmoBNNPrior
+        from baobab.sim_utils import BatchTimeDelays
+        cfg = self.test_tdlmc_diagonal_cosmo_config()
+        diagonal_cosmo_bnn_prior = DiagonalCosmoBNNPrior(cfg.bnn_omega, cfg.components)
+        # Time-delay models with profiles that do not require compiled dependencies
+        kwargs_model = dict(lens_model_list=['SIE', 'SHEAR_GAMMA_PSI'], point_source_model_list=['SOURCE_POSITION'])
+        diagonal_cosmo_bnn_prior.td_lens_model = LensModel(kwargs_model['lens_model_list'])
+        diagonal_cosmo_bnn_prior.td_point_source = PointSource(['SOURCE_POSITION'], diagonal_cosmo_bnn_prior.td_lens_model)
+        diagonal_cosmo_bnn_prior.batch_time_delays = BatchTimeDelays(kwargs_model['lens_model_list'])
+        kwargs_lens = [dict(theta_E=1.1, e1=0.05, e2=-0.03, center_x=0.0, center_y=0.0), dict(gamma_ext=0.03, psi_ext=0.4, ra_0=0.0, dec_0=0.0)]
+        kwargs_ps = [dict(ra_source=0.05, dec_source=0.02)]
+        td_cosmo = TDCosmography(0.5, 2.0, kwargs_model, cosmo_fiducial=diagonal_cosmo_bnn_prior.cosmo)
+        expected = td_cosmo.time_delays(kwargs_lens, kwargs_ps, kappa_ext=0.02)
+        true_td = diagonal_cosmo_bnn_prior.get_time_delays(kwargs_lens, kwargs_ps, 0.5, 2.0, 0.02)
+        np.testing.assert_allclose(np.sort(true_td), np.sort(expected), rtol=1.e-6)
+
+    def test_sample_time_delays(self):
+        """Tests that a sample drawn directly from the prior carries its time delays, unless they are left to be evaluated at the image positions
+
+        """
+        import numpy as np
+        from lenstronomy.LensModel.lens_model import LensModel
+        from lenstronomy.PointSource.point_source import PointSource
+        from baobab.bnn_priors import DiagonalCosmoBNNPrior
+        from baobab.sim_utils import BatchTimeDelays
+        cfg = self.test_tdlmc_diagonal_cosmo_config()
+        cfg.bnn_omega.time_delays.calculate_time_delays = True
+        diagonal_cosmo_bnn_prior = DiagonalCosmoBNNPrior(cfg.bnn_omega, cfg.components)
+        # SPEMD is evaluated as EPL, the same profile without compiled dependencies
+        diagonal_cosmo_bnn_prior.td_lens_model = LensModel(['EPL', 'SHEAR_GAMMA_PSI'])
+        diagonal_cosmo_bnn_prior.td_point_source = PointSource(['SOURCE_POSITION'], diagonal_cosmo_bnn_prior.td_lens_model)
+        diagonal_cosmo_bnn_prior.batch_time_delays = BatchTimeDelays(['EPL', 'SHEAR_GAMMA_PSI'])
+        sample = diagonal_cosmo_bnn_prior.sample(rng=np.random.default_rng(5))
+        misc = sample['misc']
+        kwargs_ps = [dict(ra_source=sample['src_light']['center_x'], dec_source=sample['src_light']['center_y'])]
+        expected = diagonal_cosmo_bnn_prior.get_time_delays(diagonal_cosmo_bnn_prior.get_kwargs_lens(sample), kwargs_ps, misc['z_lens'], misc['z_src'], misc['kappa_ext'])
+        np.testing.assert_allclose(misc['true_td'], expected)
+        diagonal_cosmo_bnn_prior.time_delays_from_images = True
+        self.assertNotIn('true_td', diagonal_cosmo_bnn_prior.sample(rng=np.random.default_rng(5))['misc'])
+
+    def test_get_time_delays_batch(self):
+        """Tests that the time delays of a batch at given image positions agree with those of TDCosmography for each lens
+
+        """
+        import numpy as np
+        from lenstronomy.Analysis.td_cosmography import TDCosmography
+        from lenstronomy.LensModel.Solver.lens_equation_solver import LensEquationSolver
+        from lenstronomy.LensModel.lens_model import LensModel
+        from baobab.bnn_priors import DiagonalCosmoBNNPrior
+        cfg = self.test_tdlmc_diagonal_cosmo_config()
+        cfg.bnn_omega.time_delays.calculate_time_delays = True
+        diagonal_cosmo_bnn_prior = DiagonalCosmoBNNPrior(cfg.bnn_omega, cfg.components)
+        self.assertFalse(diagonal_cosmo_bnn_prior.time_delays_from_images)
+        diagonal_cosmo_bnn_prior.time_delays_from_images = True
+        n = 4
+        batch = diagonal_cosmo_bnn_prior.sample_batch(n, rng=np.random.default_rng(3))
+        self.assertNotIn('true_td', batch['misc'])
+        # SPEMD is evaluated as EPL, the same profile
+        lens_model = LensModel(['EPL', 'SHEAR_GAMMA_PSI'])
+        solver = LensEquationSolver(lens_model)
+        x_image = np.full((n, 4), np.nan)
+        y_image = np.full((n, 4), np.nan)
+        for i in range(n):
+            kwargs_lens = diagonal_cosmo_bnn_prior.get_kwargs_lens(diagonal_cosmo_bnn_prior.get_single_sample(batch, i))
+            x_i, y_i = solver.findBrightImage(batch['src_light']['center_x'][i], batch['src_light']['center_y'][i], kwargs_lens, numImages=4)
+            x_image[i, :len(x_i)] = x_i
+            y_image[i, :len(y_i)] = y_i
+        true_td = diagonal_cosmo_bnn_prior.get_time_delays_batch(batch, x_image, y_image)
+        self.assertEqual(true_td.shape, (n, 4))
+        np.testing.assert_array_equal(np.isnan(true_td), np.isnan(x_image))
+        kwargs_model = dict(lens_model_list=['EPL', 'SHEAR_GAMMA_PSI'], point_source_model_list=['LENSED_POSITION'])
+        for i in range(n):
+            single = diagonal_cosmo_bnn_prior.get_single_sample(batch, i)
+            is_image = ~np.isnan(x_image[i])
+            td_cosmo = TDCosmography(single['misc']['z_lens'], single['misc']['z_src'], kwargs_model, cosmo_fiducial=diagonal_cosmo_bnn_prior.cosmo)
+            kwargs_ps = [dict(ra_image=x_image[i, is_image], dec_image=y_image[i, is_image])]
+            expected = td_cosmo.time_delays(diagonal_cosmo_bnn_prior.get_kwargs_lens(single), kwargs_ps, kappa_ext=single['misc']['kappa_ext'])
+            np.testing.assert_allclose(true_td[i, is_image], expected, rtol=1.e-5)
+
 if __name__ == '__main__':
     unittest.main()
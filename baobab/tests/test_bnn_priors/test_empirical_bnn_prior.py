@@ -1,6 +1,7 @@
 import unittest
+from baobab.tests.test_bnn_priors.bnn_prior_checks import BNNPriorChecks
 
-class TestEmpiricalBNNPrior(unittest.TestCase):
+class TestEmpiricalBNNPrior(BNNPriorChecks, unittest.TestCase):
     """A suite of tests alerting us for breakge, e.g. errors in
     instantiation of classes or execution of scripts, for EmpiricalBNNPrior
 
@@ -13,6 +14,14 @@ class TestEmpiricalBNNPrior(unittest.TestCase):
         cfg = configs.BaobabConfig.from_file(configs.tdlmc_empirical_config.__file__)
         return cfg
 
+    def get_bnn_prior(self):
+        """Get the EmpiricalBNNPrior of the config
+
+        """
+        from baobab.bnn_priors import EmpiricalBNNPrior
+        cfg = self.test_tdlmc_empirical_config()
+        return EmpiricalBNNPrior(cfg.bnn_omega, cfg.components)
+
     def test_empirical_bnn_prior(self):
         """Tests instantiation and sampling of EmpiricalBNNPrior
 
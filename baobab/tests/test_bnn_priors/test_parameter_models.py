@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+from scipy.integrate import trapezoid
+from baobab.bnn_priors.parameter_models import FundamentalPlane, FundamentalMassHyperplane, AxisRatioRayleigh, redshift_binned_luminosity_function, size_from_luminosity_and_redshift_relation
+
+class TestParameterModels(unittest.TestCase):
+    """Tests that the empirical relations evaluated on arrays agree with their scalar evaluation
+
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(42)
+        cls.vel_disp = rng.uniform(100.0, 400.0, size=50)
+        cls.m_V = rng.uniform(15.0, 22.0, size=50)
+        cls.z = rng.uniform(0.0, 9.0, size=50)
+        cls.M_V = rng.uniform(-23.0, -18.0, size=50)
+
+    def test_deterministic_parts(self):
+        """Test that the relations without scatter match element-wise
+
+        """
+        M_grid = np.arange(-23.0, -17.8, 0.2)
+        lf = redshift_binned_luminosity_function(self.z, M_grid)
+        self.assertEqual(lf.shape, (len(self.z), len(M_grid)))
+        for i, z in enumerate(self.z):
+            np.testing.assert_allclose(lf[i], redshift_binned_luminosity_function(z, M_grid))
+
+    def test_scatter_shapes(self):
+        """Test that the relations with scatter return one value per input, and a float for scalar inputs
+
+        """
+        rng = np.random.default_rng(0)
+        fp = FundamentalPlane(fit_data='SDSS')
+        fmhp = FundamentalMassHyperplane(fit_data='SLACS')
+        self.assertEqual(fp.get_effective_radius(self.vel_disp, self.m_V, rng=rng).shape, (50,))
+        self.assertEqual(fmhp.get_gamma(np.abs(self.m_V), rng=rng).shape, (50,))
+        self.assertEqual(size_from_luminosity_and_redshift_relation(self.z, self.M_V, rng=rng).shape, (50,))
+        self.assertTrue(np.isscalar(fp.get_effective_radius(200.0, 18.0, rng=rng)))
+        self.assertTrue(np.isscalar(size_from_luminosity_and_redshift_relation(2.0, -20.0, rng=rng)))
+
+    def test_scatter_mean(self):
+        """Test that the scatter of the vectorized relations is centered on the relation
+
+        """
+        n = 200000
+        fmhp = FundamentalMassHyperplane(fit_data='SLACS')
+        gammas = fmhp.get_gamma(np.full(n, 5.0), rng=np.random.default_rng(1))
+        expected_gamma = fmhp.a*np.log10(5.0) + fmhp.b + 2.0
+        expected_sig = (fmhp.intrinsic_scatter**2.0 + np.log10(5.0)*fmhp.delta_a**2.0 + fmhp.delta_b**2.0)**0.5
+        np.testing.assert_allclose(np.mean(gammas), expected_gamma, atol=5.0*expected_sig/n**0.5)
+        np.testing.assert_allclose(np.std(gammas), expected_sig, rtol=0.01)
+
+    def test_axis_ratio_truncation(self):
+        """Test that the vectorized rejection sampling of the axis ratio respects the truncation and the scalar path
+
+        """
+        model = AxisRatioRayleigh(fit_data='SDSS')
+        q = model.get_axis_ratio(np.full(100000, 400.0), rng=np.random.default_rng(2))
+        self.assertGreaterEqual(q.min(), model.lower)
+        self.assertLessEqual(q.max(), 1.0)
+        q_single = model.get_axis_ratio(400.0, rng=np.random.default_rng(2))
+        self.assertTrue(model.lower <= q_single <= 1.0)
+        # Truncated Rayleigh mean, by numerical integration
+        scale = model.a*400.0 + model.b
+        x = np.linspace(0.0, 1.0 - model.lower, 100001)
+        pdf = x/scale**2.0*np.exp(-0.5*x**2.0/scale**2.0)
+        expected_mean = 1.0 - trapezoid(x*pdf, x)/trapezoid(pdf, x)
+        np.testing.assert_allclose(np.mean(q), expected_mean, atol=3.e-3)
+
+if __name__ == '__main__':
+    unittest.main()
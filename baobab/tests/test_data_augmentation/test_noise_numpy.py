@@ -0,0 +1,84 @@
+import unittest
+import numpy as np
+import torch
+from baobab.data_augmentation.noise_torch import NoiseModelTorch
+from baobab.data_augmentation import NoiseModelNumpy
+
+class TestNoiseNumpy(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Seed randomness
+
+        """
+        cls.rng = np.random.default_rng(123)
+        cls.img = np.abs(cls.rng.normal(3.0, 3.0, size=(4, 8, 8)))
+        cls.noise_kwargs = dict(
+                                pixel_scale=0.08,
+                                exposure_time=100.0,
+                                magnitude_zero_point=25.9463, 
+                                read_noise=10, 
+                                ccd_gain=7.0,
+                                sky_brightness=20.1,
+                                seeing=0.6, 
+                                num_exposures=1, 
+                                psf_type='GAUSSIAN', 
+                                kernel_point_source=None, 
+                                truncation=5,
+                                background_noise=None
+                                )
+
+    def test_numpy_vs_torch(self):
+        """Compare the NumPy and torch noise variances for both units, with scalar and per-image properties
+
+        """
+        exposure_time = np.array([50.0, 100.0, 200.0, 400.0])
+        sky_brightness = np.array([19.5, 20.1, 20.5, 21.0])
+        for data_count_unit in ['ADU', 'e-']:
+            kwargs = dict(self.noise_kwargs, data_count_unit=data_count_unit)
+            numpy_sigma2 = NoiseModelNumpy(**kwargs).get_noise_sigma2(self.img)
+            torch_sigma2 = NoiseModelTorch(**kwargs).get_noise_sigma2(torch.DoubleTensor(self.img))
+            np.testing.assert_allclose(numpy_sigma2, torch_sigma2.numpy(), rtol=1.e-12)
+            kwargs.update(exposure_time=exposure_time, sky_brightness=sky_brightness)
+            numpy_sigma2 = NoiseModelNumpy(**kwargs).get_noise_sigma2(self.img)
+            self.assertEqual(numpy_sigma2.shape, self.img.shape)
+            for i in range(len(self.img)):
+                kwargs_i = dict(kwargs, exposure_time=exposure_time[i], sky_brightness=sky_brightness[i])
+                torch_sigma2 = NoiseModelTorch(**kwargs_i).get_noise_sigma2(torch.DoubleTensor(self.img[i]))
+                np.testing.assert_allclose(numpy_sigma2[i], torch_sigma2.numpy(), rtol=1.e-12)
+
+    def test_add_noise(self):
+        """Test that the noise is added in place, reproducibly given the generator, with the expected variance
+
+        """
+        noise_model = NoiseModelNumpy(**dict(self.noise_kwargs, exposure_time=np.array([50.0, 100.0, 200.0, 400.0])))
+        img = np.repeat(self.img, 2000, axis=1)
+        noisy_img = img.copy()
+        out = noise_model.add_noise(noisy_img, rng=np.random.default_rng(0))
+        self.assertIs(out, noisy_img)
+        np.testing.assert_array_equal(noise_model.add_noise(img.copy(), rng=np.random.default_rng(0)), noisy_img)
+        # Standardized residuals of each image
+        residuals = (noisy_img - img)/noise_model.get_noise_sigma2(img)**0.5
+        np.testing.assert_allclose(np.std(residuals, axis=(1, 2)), 1.0, atol=0.02)
+        np.testing.assert_allclose(np.mean(residuals, axis=(1, 2)), 0.0, atol=0.02)
+        # Single precision is preserved
+        img_float32 = self.img.astype(np.float32)
+        self.assertEqual(noise_model.add_noise(img_float32, rng=np.random.default_rng(0)).dtype, np.float32)
+        # Without a generator, the global state is used
+        np.random.seed(1)
+        noisy_img = noise_model.add_noise(img.copy())
+        np.random.seed(1)
+        np.testing.assert_array_equal(noise_model.add_noise(img.copy()), noisy_img)
+        np.random.seed(1)
+        np.testing.assert_allclose(noise_model.get_noise_map(img), noisy_img - img, atol=1.e-8)
+        self.assertEqual(noise_model.add_noise(img_float32).dtype, np.float32)
+
+    def test_background_noise(self):
+        """Test that an estimate of the background noise overrides the sky and readout noise
+
+        """
+        noise_model = NoiseModelNumpy(**dict(self.noise_kwargs, background_noise=0.25))
+        np.testing.assert_allclose(noise_model.get_noise_sigma2(np.zeros((2, 3, 3))), 0.0625)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,7 @@ import random
 import unittest
 import numpy as np
 import torch
-from baobab.data_augmentation.noise_torch import NoiseModelTorch
+from baobab.data_augmentation.noise_torch import NoiseModelTorch, sample_noise_kwargs
 from baobab.data_augmentation import get_noise_sigma2_lenstronomy
 
 class TestNoiseTorch(unittest.TestCase):
@@ -71,5 +71,61 @@ class TestNoiseTorch(unittest.TestCase):
         self.assertEqual(numpy_sigma2['readout'], torch_sigma2['readout'])
         np.testing.assert_array_almost_equal(numpy_sigma2['poisson'], torch_sigma2['poisson'].numpy(), decimal=7)
 
+    def test_per_image_noise_kwargs(self):
+        """Test that tensor-valued observing conditions give each image of a batch the noise of a scalar model with its conditions
+
+        """
+        batch_size = 3
+        img = torch.DoubleTensor(np.abs(np.random.randn(batch_size, 1, 4, 4))*3.0)
+        exposure_time = torch.DoubleTensor([50.0, 100.0, 400.0]).reshape(-1, 1, 1, 1)
+        sky_brightness = torch.DoubleTensor([19.5, 20.1, 21.0]).reshape(-1, 1, 1, 1)
+        read_noise = torch.DoubleTensor([5.0, 10.0, 15.0]).reshape(-1, 1, 1, 1)
+        for data_count_unit in ['ADU', 'e-']:
+            kwargs = dict(self.noise_kwargs, exposure_time=exposure_time, sky_brightness=sky_brightness, read_noise=read_noise)
+            sigma2 = NoiseModelTorch(data_count_unit=data_count_unit, **kwargs).get_noise_sigma2(img)
+            self.assertEqual(sigma2.shape, img.shape)
+            for i in range(batch_size):
+                kwargs_i = dict(self.noise_kwargs, exposure_time=exposure_time[i].item(), sky_brightness=sky_brightness[i].item(), read_noise=read_noise[i].item())
+                expected = NoiseModelTorch(data_count_unit=data_count_unit, **kwargs_i).get_noise_sigma2(img[i])
+                np.testing.assert_allclose(sigma2[i].numpy(), expected.numpy(), rtol=1.e-12)
+        # The tensors passed in are left unchanged
+        np.testing.assert_array_equal(read_noise.flatten().numpy(), [5.0, 10.0, 15.0])
+
+    def test_sample_noise_kwargs(self):
+        """Test the realization of the noise kwargs configured as distributions
+
+        """
+        noise_kwargs = dict(self.noise_kwargs, exposure_time=dict(dist='uniform', lower=50.0, upper=200.0), sky_brightness=dict(dist='normal', mu=20.1, sigma=0.3, lower=19.0, upper=21.0))
+        sampled = sample_noise_kwargs(noise_kwargs, 1000, rng=np.random.default_rng(0))
+        self.assertEqual(sampled['exposure_time'].shape, (1000, 1, 1, 1))
+        self.assertEqual(sampled['exposure_time'].dtype, torch.float32)
+        self.assertTrue(torch.all((sampled['exposure_time'] >= 50.0) & (sampled['exposure_time'] <= 200.0)))
+        self.assertTrue(torch.all((sampled['sky_brightness'] >= 19.0) & (sampled['sky_brightness'] <= 21.0)))
+        self.assertEqual(sampled['read_noise'], self.noise_kwargs['read_noise'])
+        # Single precision is preserved through the noise model
+        img = torch.rand(1000, 1, 4, 4)
+        noise_map = NoiseModelTorch(**sampled).get_noise_map(img)
+        self.assertEqual(noise_map.shape, img.shape)
+        self.assertEqual(noise_map.dtype, torch.float32)
+
+    def test_set_conditions(self):
+        """Test that a single noise model reused across batches with per-image conditions matches the models built per image
+
+        """
+        noise_kwargs = dict(self.noise_kwargs, exposure_time=dict(dist='uniform', lower=50.0, upper=200.0), sky_brightness=dict(dist='normal', mu=20.1, sigma=0.3, lower=19.0, upper=21.0))
+        rng = np.random.default_rng(1)
+        batch_size = 4
+        for data_count_unit in ['ADU', 'e-']:
+            noise_model = NoiseModelTorch(data_count_unit=data_count_unit, **sample_noise_kwargs(noise_kwargs, batch_size, rng=rng, dtype=torch.float64))
+            for _ in range(3):
+                sampled = sample_noise_kwargs(noise_kwargs, batch_size, rng=rng, dtype=torch.float64)
+                self.assertIs(noise_model.set_conditions(exposure_time=sampled['exposure_time'], sky_brightness=sampled['sky_brightness']), noise_model)
+                img = torch.DoubleTensor(np.abs(np.random.randn(batch_size, 1, 4, 4))*3.0)
+                sigma2 = noise_model.get_noise_sigma2(img)
+                for i in range(batch_size):
+                    kwargs_i = dict(self.noise_kwargs, exposure_time=sampled['exposure_time'][i].item(), sky_brightness=sampled['sky_brightness'][i].item())
+                    expected = NoiseModelTorch(data_count_unit=data_count_unit, **kwargs_i).get_noise_sigma2(img[i])
+                    np.testing.assert_allclose(sigma2[i].numpy(), expected.numpy(), rtol=1.e-12)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,68 @@
+import os
+import unittest
+import importlib.util
+import numpy as np
+import torch
+import baobab.configs as configs
+from baobab.dataset_torch import OnlineDatasetTorch
+
+class TestDatasetTorch(unittest.TestCase):
+    """Tests for the torch dataset rendering the images on the fly
+
+    """
+    @classmethod
+    def setUpClass(cls):
+        cfg_filepath = os.path.join(os.path.abspath(os.path.dirname(configs.__file__)), 'tdlmc_diagonal_config.py')
+        cls.cfg = configs.BaobabConfig.from_file(cfg_filepath)
+        cls.cfg.image.num_pix = 32
+        cls.label_names = ['lens_mass_theta_E', 'lens_mass_gamma', 'external_shear_gamma_ext']
+
+    def test_batch_indices(self):
+        """Test that the batches of an epoch are the requested range, in order
+
+        """
+        dataset = OnlineDatasetTorch(self.cfg, self.label_names, n_batches=3, first_batch=5)
+        self.assertEqual(list(dataset.get_batch_indices()), [5, 6, 7])
+        self.assertEqual(list(dataset.get_batch_indices(epoch=2)), [11, 12, 13])
+        unlimited = OnlineDatasetTorch(self.cfg, self.label_names).get_batch_indices()
+        self.assertEqual([next(unlimited) for _ in range(4)], [0, 1, 2, 3])
+
+    def test_epochs(self):
+        """Test that consecutive epochs render different batches, and that the epoch can be set
+
+        """
+        for prefetch in [0, 1]:
+            dataset = OnlineDatasetTorch(self.cfg, self.label_names, n_batches=3, first_batch=5, prefetch=prefetch)
+            # Stand-in for the rendering, returning the batch index
+            dataset.generate_batch = lambda batch_i: batch_i
+            self.assertEqual(list(dataset), [5, 6, 7])
+            self.assertEqual(list(dataset), [8, 9, 10])
+            dataset.set_epoch(0)
+            self.assertEqual(list(dataset), [5, 6, 7])
+
+    @unittest.skipUnless(importlib.util.find_spec('fastell4py'), "The SPEMD profile of the config requires fastell4py.")
+    def test_batches(self):
+        """Test the shapes of the batches, and that they do not depend on prefetching or on the number of dataloader workers
+
+        """
+        dataset = OnlineDatasetTorch(self.cfg, self.label_names, batch_size=2, n_batches=2)
+        batches = list(dataset)
+        self.assertEqual(len(batches), 2)
+        imgs, labels = batches[0]
+        self.assertEqual(imgs.shape, (2, 1, 32, 32))
+        self.assertEqual(labels.shape, (2, 3))
+        self.assertEqual(imgs.dtype, torch.float32)
+        self.assertTrue(np.all(labels[:, 0].numpy() > 0.5)) # initial selection on theta_E
+        self.assertFalse(torch.equal(batches[0][0], batches[1][0]))
+        # The next epoch renders new images
+        self.assertFalse(torch.equal(list(dataset)[0][0], batches[0][0]))
+        dataset.set_epoch(0)
+        prefetched = OnlineDatasetTorch(self.cfg, self.label_names, batch_size=2, n_batches=2, prefetch=1)
+        loader = torch.utils.data.DataLoader(dataset, batch_size=None, num_workers=2)
+        for other_batches in [list(prefetched), list(loader)]:
+            for (imgs, labels), (other_imgs, other_labels) in zip(batches, other_batches):
+                torch.testing.assert_close(other_imgs, imgs)
+                torch.testing.assert_close(other_labels, labels)
+
+if __name__ == '__main__':
+    unittest.main()
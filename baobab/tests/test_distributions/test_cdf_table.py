@@ -0,0 +1,83 @@
+import numpy as np
+import unittest
+from baobab.distributions import CDFTable
+
+class TestCDFTable(unittest.TestCase):
+    """A suite of tests verifying the inverse-CDF sampling of the PMF tables
+
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.grid = np.arange(-23.0, -17.8, 0.2)
+        cls.bin_edges = np.array([0.5, 1.0, 2.0, np.inf])
+        # One PMF per bin, peaking at a different grid value
+        cls.pmfs = np.exp(-0.5*(cls.grid[np.newaxis, :] - np.array([[-22.0], [-21.0], [-20.0], [-19.0]]))**2.0)
+        cls.binned_table = CDFTable(cls.grid, cls.pmfs, cls.bin_edges)
+
+    def test_unbinned_matches_choice(self):
+        """Test that an unbinned table draws the same values as `Generator.choice` with the same generator
+
+        """
+        pmf = self.pmfs[1]
+        table = CDFTable(self.grid, pmf)
+        sampled = table.sample(size=1000, rng=np.random.default_rng(7))
+        expected = np.random.default_rng(7).choice(self.grid, 1000, replace=True, p=pmf/np.sum(pmf))
+        np.testing.assert_array_equal(sampled, expected)
+        self.assertTrue(np.isscalar(table.sample(rng=np.random.default_rng(7))))
+
+    def test_get_bin(self):
+        """Test the assignment of the conditioning variable to the bins, by right edge
+
+        """
+        z = np.array([0.0, 0.49, 0.5, 1.5, 2.0, 10.0])
+        np.testing.assert_array_equal(self.binned_table.get_bin(z), [0, 0, 1, 2, 3, 3])
+
+    def test_binned_array_matches_scalar(self):
+        """Test that the vectorized draw for an array of conditioning values matches the scalar draws given the same uniform numbers
+
+        """
+        z = np.random.default_rng(0).uniform(0.0, 3.0, size=500)
+        sampled = self.binned_table.sample(z, rng=np.random.default_rng(3))
+        u = np.random.default_rng(3).random(len(z))
+        expected = [self.grid[np.searchsorted(self.binned_table.cdfs[self.binned_table.get_bin(z_i)], u_i, side='right')] for z_i, u_i in zip(z, u)]
+        np.testing.assert_array_equal(sampled, expected)
+
+    def test_binned_boundary_draw(self):
+        """Test that a uniform number just below 1 draws the last value of the table of its own bin
+
+        """
+        class BoundaryRNG:
+            def random(self, size=None):
+                return np.full(() if size is None else size, np.nextafter(1.0, 0.0))
+        pmfs = np.ones((3, len(self.grid)))
+        pmfs[:, -3:] = 0.0
+        table = CDFTable(self.grid, pmfs, self.bin_edges[1:])
+        z = np.array([0.5, 1.5, 5.0])
+        sampled = table.sample(z, rng=BoundaryRNG())
+        np.testing.assert_array_equal(sampled, np.full(len(z), self.grid[-4]))
+        np.testing.assert_array_equal(sampled, [table.sample(z_i, rng=BoundaryRNG()) for z_i in z])
+
+    def test_binned_frequencies(self):
+        """Test that the sampled frequencies within each bin match the PMF of the bin
+
+        """
+        rng = np.random.default_rng(11)
+        n_samples = 100000
+        for bin_i, z in enumerate([0.2, 0.7, 1.5, 5.0]):
+            sampled = self.binned_table.sample(np.full(n_samples, z), rng=rng)
+            freq = np.array([np.sum(np.isclose(sampled, g)) for g in self.grid])/n_samples
+            expected = self.pmfs[bin_i]/np.sum(self.pmfs[bin_i])
+            np.testing.assert_allclose(freq, expected, atol=0.01)
+
+    def test_from_binned_function(self):
+        """Test the tabulation of a function that is piecewise constant in the bins
+
+        """
+        def func(z, grid):
+            return self.pmfs[np.searchsorted(self.bin_edges, z, side='right')]
+        table = CDFTable.from_binned_function(func, self.grid, self.bin_edges)
+        np.testing.assert_allclose(table.cdfs, self.binned_table.cdfs)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -245,6 +245,74 @@ class TestDistributions(unittest.TestCase):
         lpdf = bb_dist.eval_generalized_normal_logpdf(eval_at,mu,alpha,p)
         np.testing.assert_almost_equal(lpdf_approx, lpdf, precision)
 
+    def test_truncated_normal_sampling(self):
+        """Test the inverse-CDF sampling of the truncated normal against scipy, including truncation far in the tails
+
+        """
+        from scipy.stats import truncnorm
+        rng = np.random.default_rng(123)
+        n_samples = 10**5
+        for mu, sigma, lower, upper in [(1.0, 2.0, 0.0, 3.0), (0.0, 1.0, 5.0, np.inf), (0.0, 1.0, -np.inf, -6.0)]:
+            sample = bb_dist.sample_normal(mu, sigma, lower, upper, size=n_samples, rng=rng)
+            exp_dist = truncnorm((lower - mu)/sigma, (upper - mu)/sigma, loc=mu, scale=sigma)
+            self.assertEqual(sample.shape, (n_samples,))
+            self.assertTrue(np.all(sample >= lower) and np.all(sample <= upper))
+            np.testing.assert_almost_equal(np.mean(sample), exp_dist.mean(), 2)
+            np.testing.assert_almost_equal(np.std(sample), exp_dist.std(), 2)
+
+    def test_truncated_generalized_normal_sampling(self):
+        """Test the truncated generalized normal sampling, by rejection and by inverse CDF, against the truncated PDF
+
+        """
+        rng = np.random.default_rng(123)
+        n_samples = 10**5
+        for mu, alpha, p, lower, upper in [(0.0, 0.5*np.pi, 10.0, -0.5*np.pi, 0.3), (0.0, 0.5, 2.0, 1.0, 1.2)]:
+            sample = bb_dist.sample_generalized_normal(mu, alpha, p, lower, upper, size=n_samples, rng=rng)
+            self.assertEqual(sample.shape, (n_samples,))
+            self.assertTrue(np.all(sample >= lower) and np.all(sample <= upper))
+            grid = np.linspace(lower, upper, 10001)
+            pdf = bb_dist.eval_generalized_normal_pdf(grid, mu, alpha, p, lower, upper)
+            exp_mean = np.trapz(grid*pdf, grid) if hasattr(np, 'trapz') else np.trapezoid(grid*pdf, grid)
+            np.testing.assert_almost_equal(np.mean(sample), exp_mean, 2)
+
+    def test_one_minus_rayleigh_sampling(self):
+        """Test that the one minus Rayleigh samples respect the bound and follow the truncated Rayleigh
+
+        """
+        rng = np.random.default_rng(123)
+        scale = 0.3
+        lower = 0.2
+        sample = bb_dist.sample_one_minus_rayleigh(scale, lower, size=10**5, rng=rng)
+        self.assertTrue(np.all(sample >= lower))
+        # Compare with rejection sampling
+        rayleigh = rng.rayleigh(scale, size=10**6)
+        exp_sample = 1.0 - rayleigh[rayleigh <= 1.0 - lower]
+        np.testing.assert_almost_equal(np.mean(sample), np.mean(exp_sample), 2)
+        np.testing.assert_almost_equal(np.std(sample), np.std(exp_sample), 2)
+
+    def test_sampling_with_generator(self):
+        """Test that all samplers are reproducible given a Generator and return floats when no size is given
+
+        """
+        kwargs_list = {
+                       'uniform': dict(lower=-1.0, upper=2.0),
+                       'normal': dict(mu=0.0, sigma=1.0, lower=-1.0),
+                       'lognormal': dict(mu=-2.73, sigma=1.05),
+                       'beta': dict(a=4.0, b=4.0, lower=-0.9, upper=0.9),
+                       'generalized_normal': dict(mu=0.0, alpha=0.5*np.pi, p=10.0, lower=-0.5*np.pi, upper=0.5*np.pi),
+                       'one_minus_rayleigh': dict(scale=0.3, lower=0.2),
+                       }
+        for dist_name, kwargs in kwargs_list.items():
+            sampling_f = getattr(bb_dist, 'sample_{:s}'.format(dist_name))
+            sample = sampling_f(size=1000, rng=np.random.default_rng(42), **kwargs)
+            sample_again = sampling_f(size=1000, rng=np.random.default_rng(42), **kwargs)
+            np.testing.assert_array_equal(sample, sample_again, err_msg=dist_name)
+            self.assertEqual(np.ndim(sampling_f(rng=np.random.default_rng(42), **kwargs)), 0, msg=dist_name)
+        sample = bb_dist.sample_multivar_normal([0.0, 1.0], [[1.0, 0.5], [0.5, 1.0]], [False, True], [-1.0, -1.0], [1.0, 1.0], size=1000, rng=np.random.default_rng(42))
+        self.assertEqual(sample.shape, (1000, 2))
+        self.assertTrue(np.all(np.abs(sample[:, 0]) < 1.0))
+        self.assertTrue(np.all(np.log(sample[:, 1]) < 1.0))
+
 if __name__ == '__main__':
     unittest.main()
 
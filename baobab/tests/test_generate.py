@@ -1,29 +1,70 @@
 import os
+import sys
 import shutil
 import subprocess
+import tempfile
 import unittest
+import numpy as np
+import pandas as pd
+import h5py
 import baobab.configs as configs
 
-def generate_config(cfg_filepath):
-    """Run `generate.py` for the config file of the specified BNNPrior class
+def run_generate(cfg_filepath, work_dir, options=''):
+    """Run `generate.py` for a config file from a working folder, in which the default destination folder of the config is created
 
     Parameters
     ----------
-    bnn_prior_name : str
-        prefix to the config file (the BNNPrior class)
+    cfg_filepath : str
+        path of the config file
+    work_dir : str
+        the working folder
+    options : str
+        additional command-line options. Default: ''
+
+    Returns
+    -------
+    subprocess.CompletedProcess
+        the completed run, with its captured output
 
     """
-    success = True
-    cfg = configs.BaobabConfig.from_file(cfg_filepath)
-    save_dir = cfg.out_dir
+    return subprocess.run('generate {:s} {:s}'.format(cfg_filepath, options), shell=True, cwd=work_dir,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+def generate_config(cfg_filepath, n_workers=1, output_format='npy'):
+    """Run `generate.py` for the config file of the specified BNNPrior class in a temporary folder
+
+    Parameters
+    ----------
+    cfg_filepath : str
+        path of the config file
+    n_workers : int
+        number of worker processes. Default: 1
+    output_format : str
+        format of the output, one of 'npy' and 'hdf5'. Default: 'npy'
+
+    Returns
+    -------
+    bool
+        whether the run succeeded
+
+    """
+    work_dir = tempfile.mkdtemp()
     try:
-        subprocess.check_output('generate {:s} --n_data 2'.format(cfg_filepath), shell=True)
-    except:
-        success = True
-    # Delete resulting data
-    if os.path.exists(save_dir):
-        shutil.rmtree(save_dir)
-    return success
+        result = run_generate(cfg_filepath, work_dir, '--n_data 2 --n_workers {:d} --output_format {:s}'.format(n_workers, output_format))
+    finally:
+        # Delete resulting data
+        shutil.rmtree(work_dir)
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr.decode())
+    return result.returncode == 0
+
+def get_save_dir(work_dir):
+    """Get the destination folder created by `generate.py` in a working folder
+
+    """
+    save_dirs = [os.path.join(work_dir, d) for d in os.listdir(work_dir) if os.path.isdir(os.path.join(work_dir, d))]
+    assert len(save_dirs) == 1
+    return save_dirs[0]
 
 class TestGenerate(unittest.TestCase):
     """Test the `generate.py` script
@@ -76,7 +117,176 @@ class TestGenerate(unittest.TestCase):
         cfg_filepath = os.path.join(self.cfg_root, 'tdlmc_diagonal_cosmo_config.py')
         success = generate_config(cfg_filepath)
         self.assertTrue(success, msg="tdlmc_diagonal_cosmo_config")
-            
+
+    def test_generate_with_multiple_workers(self):
+        """Tests execution of `generate.py` script sharded across worker processes
+
+        """
+        cfg_filepath = os.path.join(self.cfg_root, 'tdlmc_diagonal_config.py')
+        success = generate_config(cfg_filepath, n_workers=2)
+        self.assertTrue(success, msg="tdlmc_diagonal_config, n_workers=2")
+
+    def test_generate_independent_of_n_workers(self):
+        """Tests that the images and metadata do not depend on the number of worker processes
+
+        """
+        cfg_filepath = os.path.join(self.cfg_root, 'tdlmc_diagonal_config.py')
+        work_dirs = [tempfile.mkdtemp() for _ in range(2)]
+        try:
+            save_dirs = []
+            for work_dir, n_workers in zip(work_dirs, [1, 2]):
+                result = run_generate(cfg_filepath, work_dir, '--n_data 5 --n_workers {:d}'.format(n_workers))
+                self.assertEqual(result.returncode, 0, msg=result.stderr.decode())
+                save_dirs.append(get_save_dir(work_dir))
+            filenames = sorted(f for f in os.listdir(save_dirs[0]) if f.startswith('X_'))
+            self.assertEqual(len(filenames), 5)
+            self.assertEqual(filenames, sorted(f for f in os.listdir(save_dirs[1]) if f.startswith('X_')))
+            for filename in ['metadata.csv'] + filenames:
+                with open(os.path.join(save_dirs[0], filename), 'rb') as f_1, open(os.path.join(save_dirs[1], filename), 'rb') as f_2:
+                    self.assertEqual(f_1.read(), f_2.read(), msg=filename)
+        finally:
+            for work_dir in work_dirs:
+                shutil.rmtree(work_dir)
+
+    def test_generate_broken_config_with_multiple_workers(self):
+        """Tests that `generate.py` fails, instead of hanging, when the models of a config cannot be instantiated with several workers
+
+        """
+        tmp_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.cfg_root, 'tdlmc_diagonal_config.py'), 'r') as f:
+            cfg_script = f.read()
+        cfg_script += "\ncfg.out_dir = {:s}\ncfg.bnn_omega.lens_mass.profile = 'NOT_A_PROFILE'\n".format(repr(os.path.join(tmp_dir, 'out')))
+        cfg_filepath = os.path.join(tmp_dir, 'broken_config.py')
+        with open(cfg_filepath, 'w') as f:
+            f.write(cfg_script)
+        try:
+            result = subprocess.run('generate {:s} --n_data 2 --n_workers 2'.format(cfg_filepath), shell=True,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=300)
+            self.assertNotEqual(result.returncode, 0)
+            self.assertIn(b'NOT_A_PROFILE', result.stderr)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_generate_resume(self):
+        """Tests that a run resumed after an interruption yields the same dataset as an uninterrupted run
+
+        """
+        from baobab.io_utils import read_manifest
+        cfg_filepath = os.path.join(self.cfg_root, 'tdlmc_diagonal_config.py')
+        work_dirs = [tempfile.mkdtemp() for _ in range(2)]
+        try:
+            result = run_generate(cfg_filepath, work_dirs[0], '--n_data 4')
+            self.assertEqual(result.returncode, 0, msg=result.stderr.decode())
+            # Interrupted run: the first checkpoint chunk, then partial output of the next chunk
+            result = run_generate(cfg_filepath, work_dirs[1], '--n_data 2')
+            self.assertEqual(result.returncode, 0, msg=result.stderr.decode())
+            save_dirs = [get_save_dir(work_dir) for work_dir in work_dirs]
+            np.save(os.path.join(save_dirs[1], 'X_0000002.npy'), np.zeros(3))
+            with open(os.path.join(save_dirs[1], 'metadata.csv'), 'a') as f:
+                f.write('partial row')
+            result = run_generate(cfg_filepath, work_dirs[1], '--n_data 4 --resume')
+            self.assertEqual(result.returncode, 0, msg=result.stderr.decode())
+            self.assertEqual(read_manifest(os.path.join(save_dirs[1], 'manifest.json'))['n_complete'], 4)
+            filenames = sorted(f for f in os.listdir(save_dirs[0]) if f.startswith('X_'))
+            self.assertEqual(filenames, sorted(f for f in os.listdir(save_dirs[1]) if f.startswith('X_')))
+            for filename in ['metadata.csv'] + filenames:
+                with open(os.path.join(save_dirs[0], filename), 'rb') as f_1, open(os.path.join(save_dirs[1], filename), 'rb') as f_2:
+                    self.assertEqual(f_1.read(), f_2.read(), msg=filename)
+        finally:
+            for work_dir in work_dirs:
+                shutil.rmtree(work_dir)
+
+    def test_generate_with_hdf5_output(self):
+        """Tests execution of `generate.py` script streaming into a single HDF5 file
+
+        """
+        cfg_filepath = os.path.join(self.cfg_root, 'tdlmc_diagonal_config.py')
+        cfg = configs.BaobabConfig.from_file(cfg_filepath)
+        num_pix = cfg.image.num_pix
+        work_dirs = [tempfile.mkdtemp() for _ in range(2)]
+        try:
+            save_dirs = []
+            for work_dir, output_format in zip(work_dirs, ['npy', 'hdf5']):
+                result = run_generate(cfg_filepath, work_dir, '--n_data 3 --output_format {:s}'.format(output_format))
+                self.assertEqual(result.returncode, 0, msg=result.stderr.decode())
+                save_dirs.append(get_save_dir(work_dir))
+            metadata = pd.read_csv(os.path.join(save_dirs[0], 'metadata.csv'))
+            h5_path = os.path.join(save_dirs[1], '{:s}.h5'.format(os.path.basename(save_dirs[1])))
+            with h5py.File(h5_path, 'r') as f:
+                self.assertEqual(f['images'].shape, (3, num_pix, num_pix))
+                self.assertEqual(f.attrs['n_complete'], 3)
+                for i, img_filename in enumerate(metadata['img_filename']):
+                    np.testing.assert_array_equal(f['images'][i], np.load(os.path.join(save_dirs[0], img_filename)))
+                # Same metadata columns as the .npy run, where images are indexed by row instead of by filename
+                self.assertEqual(sorted(f['metadata'].attrs['columns']), sorted(metadata.columns.drop('img_filename')))
+                for col in f['metadata'].attrs['columns']:
+                    np.testing.assert_allclose(f['metadata'][col][:], metadata[col].values, rtol=1.e-12, err_msg=col)
+        finally:
+            for work_dir in work_dirs:
+                shutil.rmtree(work_dir)
+
+    def test_find_image_positions(self):
+        """Test that solving for the images of several candidates at once matches solving for each candidate alone
+
+        """
+        import baobab.bnn_priors as bnn_priors
+        from baobab.sim_utils import BatchImageFinder
+        from baobab.generate import find_image_positions
+        cfg = configs.BaobabConfig.from_file(os.path.join(self.cfg_root, 'tdlmc_diagonal_config.py'))
+        bnn_prior = getattr(bnn_priors, cfg.bnn_prior_class)(cfg.bnn_omega, cfg.components)
+        image_finder = BatchImageFinder([cfg.bnn_omega.lens_mass.profile, cfg.bnn_omega.external_shear.profile], cfg.instrument.pixel_scale, cfg.image.num_pix)
+        rng = np.random.default_rng(5)
+        samples = [bnn_prior.sample(rng=rng) for _ in range(5)]
+        positions = find_image_positions(samples, image_finder)
+        self.assertEqual(len(positions), 5)
+        for sample, (x_image, y_image) in zip(samples, positions):
+            self.assertGreater(len(x_image), 0)
+            x_single, y_single = find_image_positions([sample], image_finder)[0]
+            np.testing.assert_allclose(x_image, x_single, atol=1.e-8)
+            np.testing.assert_allclose(y_image, y_single, atol=1.e-8)
+
+    def test_get_idx_seed(self):
+        """Test that the per-index seeds are reproducible and distinct across indices
+
+        """
+        from baobab.generate import get_idx_seed
+        seeds = [get_idx_seed(1113, idx) for idx in range(100)]
+        self.assertEqual(seeds, [get_idx_seed(1113, idx) for idx in range(100)])
+        self.assertEqual(len(set(seeds)), 100)
+        self.assertNotEqual(get_idx_seed(1113, 0), get_idx_seed(1114, 0))
+
+    def test_get_idx_rng(self):
+        """Test that the per-index generators match the children spawned from the global seed and do not depend on the global random state
+
+        """
+        from baobab.generate import get_idx_rng
+        children = np.random.SeedSequence(1113).spawn(5)
+        for idx in [4, 0, 2]:
+            np.random.seed(idx)
+            expected = np.random.Generator(np.random.Philox(children[idx])).random(3)
+            np.testing.assert_array_equal(get_idx_rng(1113, idx).random(3), expected)
+        self.assertNotEqual(get_idx_rng(1113, 0).random(), get_idx_rng(1113, 1).random())
+
+    def test_check_manifest(self):
+        """Test that resuming is refused for a run generated with a different seed, output format, or precision
+
+        """
+        from types import SimpleNamespace
+        from baobab.generate import get_rng_manifest, check_manifest
+        cfg = configs.BaobabConfig.from_file(os.path.join(self.cfg_root, 'tdlmc_diagonal_config.py'))
+        args = SimpleNamespace(output_format='npy', compression=None, metadata_format='csv')
+        manifest = dict(n_complete=4, num_pix=cfg.image.num_pix, output_format='npy', compression=None, metadata_format='csv',
+                        rng=get_rng_manifest(cfg.seed, 4))
+        check_manifest(manifest, cfg, args)
+        with self.assertRaises(ValueError):
+            check_manifest(dict(manifest, output_format='hdf5'), cfg, args)
+        with self.assertRaises(ValueError):
+            check_manifest(dict(manifest, precision='asinh_uint16'), cfg, args)
+        with self.assertRaises(ValueError):
+            check_manifest(dict(manifest, rng=dict(manifest['rng'], seed=cfg.seed + 1)), cfg, args)
+        with self.assertRaises(ValueError):
+            check_manifest(dict(manifest, rng=dict(manifest['rng'], next_idx_key=[0, 0])), cfg, args)
+
 if __name__ == '__main__':
     unittest.main()
 
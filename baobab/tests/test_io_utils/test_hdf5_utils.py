@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import h5py
+from baobab.io_utils import HDF5Writer
+
+class TestHDF5Utils(unittest.TestCase):
+    """Tests for the HDF5 writer streaming images and metadata into a single file
+
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.out_dir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.out_dir)
+
+    def get_chunk(self, start_idx, n_rows, rng):
+        """Get a chunk of images and metadata with numeric and non-numeric columns
+
+        """
+        imgs = [rng.random((5, 6)) for _ in range(n_rows)]
+        metadata = pd.DataFrame({'lens_mass_theta_E': rng.random(n_rows),
+                                 'n_img': np.arange(start_idx, start_idx + n_rows),
+                                 'true_td': [[float(i), 2.0*i] for i in range(start_idx, start_idx + n_rows)]})
+        return imgs, metadata
+
+    def test_append(self):
+        """Test that the chunks are appended in order with their metadata columns
+
+        """
+        rng = np.random.default_rng(123)
+        path = os.path.join(self.out_dir, 'test_append.h5')
+        writer = HDF5Writer(path, (5, 6), compression='gzip', chunk_size=2)
+        imgs_0, metadata_0 = self.get_chunk(0, 3, rng)
+        imgs_1, metadata_1 = self.get_chunk(3, 4, rng)
+        writer.append(imgs_0, metadata_0)
+        self.assertEqual(writer.n_complete, 3)
+        writer.append(imgs_1, metadata_1[['true_td', 'n_img', 'lens_mass_theta_E']])
+        writer.close()
+        with h5py.File(path, 'r') as f:
+            self.assertEqual(f.attrs['n_complete'], 7)
+            self.assertEqual(f['images'].compression, 'gzip')
+            np.testing.assert_array_equal(f['images'][:], np.stack(imgs_0 + imgs_1))
+            self.assertEqual(list(f['metadata'].attrs['columns']), list(metadata_0.columns))
+            np.testing.assert_array_equal(f['metadata']['n_img'][:], np.arange(7))
+            np.testing.assert_array_equal(f['metadata']['lens_mass_theta_E'][:], np.concatenate([metadata_0['lens_mass_theta_E'].values, metadata_1['lens_mass_theta_E'].values]))
+            self.assertEqual(f['metadata']['true_td'].asstr()[4], str([4.0, 8.0]))
+
+    def test_append_mismatch(self):
+        """Test that chunks inconsistent with the previous ones are rejected
+
+        """
+        rng = np.random.default_rng(123)
+        path = os.path.join(self.out_dir, 'test_append_mismatch.h5')
+        writer = HDF5Writer(path, (5, 6))
+        imgs, metadata = self.get_chunk(0, 3, rng)
+        writer.append(imgs, metadata)
+        with self.assertRaises(ValueError):
+            writer.append(imgs[:2], metadata)
+        with self.assertRaises(ValueError):
+            writer.append(imgs, metadata.drop(columns='n_img'))
+        self.assertEqual(writer.n_complete, 3)
+        writer.close()
+
+    def test_resume(self):
+        """Test that reopening the file discards the rows beyond the checkpoint and appends after it
+
+        """
+        rng = np.random.default_rng(123)
+        path = os.path.join(self.out_dir, 'test_resume.h5')
+        writer = HDF5Writer(path, (5, 6))
+        imgs_0, metadata_0 = self.get_chunk(0, 3, rng)
+        imgs_1, metadata_1 = self.get_chunk(3, 2, rng)
+        writer.append(imgs_0, metadata_0)
+        writer.append(imgs_1, metadata_1)
+        writer.close()
+        with self.assertRaises(ValueError):
+            HDF5Writer(path, (5, 6), n_complete=6)
+        writer = HDF5Writer(path, (5, 6), n_complete=3)
+        self.assertEqual(writer.n_complete, 3)
+        imgs_2, metadata_2 = self.get_chunk(3, 2, rng)
+        writer.append(imgs_2, metadata_2)
+        writer.close()
+        with h5py.File(path, 'r') as f:
+            self.assertEqual(f.attrs['n_complete'], 5)
+            np.testing.assert_array_equal(f['images'][:], np.stack(imgs_0 + imgs_2))
+            np.testing.assert_array_equal(f['metadata']['n_img'][:], np.arange(5))
+            self.assertEqual(f['metadata']['true_td'].shape, (5,))
+
+if __name__ == '__main__':
+    unittest.main()
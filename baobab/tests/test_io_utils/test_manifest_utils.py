@@ -0,0 +1,33 @@
+import os
+import shutil
+import tempfile
+import unittest
+from baobab.io_utils import write_manifest, read_manifest
+
+class TestManifestUtils(unittest.TestCase):
+    """Tests for the checkpoint manifest
+
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.out_dir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.out_dir)
+
+    def test_round_trip(self):
+        """Test that the latest manifest is read back and that no temporary file is left behind
+
+        """
+        path = os.path.join(self.out_dir, 'manifest.json')
+        write_manifest(path, dict(n_complete=2, rng=dict(seed=1113, next_idx=2), selection_counts={'n_evaluated': 8}))
+        write_manifest(path, dict(n_complete=4, rng=dict(seed=1113, next_idx=4), selection_counts={'n_evaluated': 16}))
+        manifest = read_manifest(path)
+        self.assertEqual(manifest['n_complete'], 4)
+        self.assertEqual(manifest['rng'], dict(seed=1113, next_idx=4))
+        self.assertEqual(manifest['selection_counts'], {'n_evaluated': 16})
+        self.assertEqual(os.listdir(self.out_dir), ['manifest.json'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import h5py
+from baobab.io_utils import MemmapReader, write_npy_store
+
+class TestMemmapReader(unittest.TestCase):
+    """Tests for the memory-mapped reader of the images and their columnar labels
+
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.out_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(7)
+        cls.n_data = 11
+        cls.images = rng.random((cls.n_data, 5, 6, 1)).astype(np.float32)
+        cls.images[:, 0, 0, 0] = 1.0 # a constant pixel
+        cls.metadata = pd.DataFrame({'img_filename': ['X_{0:07d}.npy'.format(i) for i in range(cls.n_data)],
+                                     'lens_mass_theta_E': rng.random(cls.n_data),
+                                     'n_img': rng.integers(2, 5, cls.n_data)})
+        cls.pixels_mean = cls.images.mean(axis=0)
+        cls.pixels_std = cls.images.std(axis=0)
+        # Store of .npy files
+        cls.npy_path = os.path.join(cls.out_dir, 'store')
+        write_npy_store(cls.npy_path, cls.images, cls.metadata)
+        # HDF5 file in the unchunked layout of `to_hdf5`
+        cls.h5_path = os.path.join(cls.out_dir, 'data.h5')
+        with h5py.File(cls.h5_path, 'w') as f:
+            f.create_dataset('images', data=cls.images)
+            f.create_dataset('pixels_mean', data=cls.pixels_mean)
+            f.create_dataset('pixels_std', data=cls.pixels_std)
+            labels = f.create_group('labels')
+            for col in ['lens_mass_theta_E', 'n_img']:
+                labels.create_dataset(col, data=cls.metadata[col].values)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.out_dir)
+
+    def get_expected_images(self, idx):
+        std = np.where(self.pixels_std > 0.0, self.pixels_std, 1.0)
+        return (self.images[idx] - self.pixels_mean)/std
+
+    def test_get_batch(self):
+        """Test that the batches of both stores are the standardized images and the labels in the requested order
+
+        """
+        idx = np.array([7, 2, 2, 10])
+        expected_labels = self.metadata[['n_img', 'lens_mass_theta_E']].values[idx]
+        for path in [self.npy_path, self.h5_path]:
+            reader = MemmapReader(path, label_names=['n_img', 'lens_mass_theta_E'])
+            self.assertEqual(len(reader), self.n_data)
+            self.assertEqual(reader.img_shape, (5, 6, 1))
+            images, labels = reader.get_batch(idx)
+            np.testing.assert_allclose(images, self.get_expected_images(idx), rtol=1.e-5, atol=1.e-5)
+            np.testing.assert_array_equal(labels, expected_labels)
+            # Into a reused buffer
+            out = np.empty((len(idx), 5, 6, 1), dtype=np.float32)
+            self.assertIs(reader.get_images(idx, out=out), out)
+            np.testing.assert_array_equal(out, images)
+            # Default labels are the numeric columns, in lexicographic order
+            self.assertEqual(MemmapReader(path).label_names, ['lens_mass_theta_E', 'n_img'])
+
+    def test_zero_copy(self):
+        """Test that a slice of raw images is a view of the mapped file, and that pickling maps the file anew
+
+        """
+        for path in [self.npy_path, self.h5_path]:
+            reader = MemmapReader(path, standardize=False)
+            images = reader.get_images(slice(3, 8))
+            self.assertTrue(np.shares_memory(images, reader.images))
+            np.testing.assert_array_equal(images, self.images[3:8])
+            unpickled = pickle.loads(pickle.dumps(reader))
+            self.assertLess(len(pickle.dumps(reader)), self.images.nbytes)
+            np.testing.assert_array_equal(unpickled.get_images(slice(3, 8)), self.images[3:8])
+
+    def test_chunked_hdf5(self):
+        """Test that a chunked HDF5 dataset is rejected
+
+        """
+        path = os.path.join(self.out_dir, 'chunked.h5')
+        shutil.copy(self.h5_path, path)
+        with h5py.File(path, 'a') as f:
+            del f['images']
+            f.create_dataset('images', data=self.images, chunks=(2, 5, 6, 1))
+        with self.assertRaises(ValueError):
+            MemmapReader(path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+import pandas as pd
+from baobab.io_utils import MetadataBuffer
+
+class TestMetadataBuffer(unittest.TestCase):
+    """Tests for the columnar metadata buffer
+
+    """
+    def get_row(self, i):
+        """Get a metadata row with float, int, string, and list values
+
+        """
+        return {'lens_mass_theta_E': np.float64(0.1*i), 'n_img': i%4 + 1, 'img_filename': 'X_{0:07d}.npy'.format(i), 'true_td': [1.0*i, 2.0*i]}
+
+    def test_schema(self):
+        """Test that the column types are inferred from the first row
+
+        """
+        buffer = MetadataBuffer(3)
+        buffer.append(self.get_row(0))
+        self.assertEqual(buffer.schema['lens_mass_theta_E'], np.float64)
+        self.assertEqual(buffer.schema['n_img'], np.int64)
+        self.assertEqual(buffer.schema['img_filename'], object)
+        self.assertEqual(buffer.schema['true_td'], object)
+
+    def test_to_dataframe(self):
+        """Test that the buffer gives the same DataFrame as the rows appended one by one, and can be reused after clearing
+
+        """
+        buffer = MetadataBuffer(5)
+        for chunk_start in [0, 5]:
+            buffer.clear()
+            rows = [self.get_row(i) for i in range(chunk_start, chunk_start + 4)]
+            for row in rows:
+                buffer.append(row)
+            metadata = buffer.to_dataframe()
+            expected = pd.DataFrame(rows)
+            expected = expected.reindex(sorted(expected.columns), axis=1)
+            self.assertEqual(list(metadata.columns), list(expected.columns))
+            for col in expected.columns:
+                self.assertEqual(list(metadata[col].values), list(expected[col].values))
+            self.assertEqual(metadata['n_img'].dtype, np.int64)
+        # Columns are copied out of the buffer
+        buffer.clear()
+        buffer.append(self.get_row(10))
+        self.assertEqual(metadata['n_img'].values[0], 2)
+
+    def test_append_errors(self):
+        """Test that rows beyond the capacity or inconsistent with the schema are rejected
+
+        """
+        buffer = MetadataBuffer(1, schema=MetadataBuffer.infer_schema(self.get_row(0)))
+        row = self.get_row(0)
+        del row['n_img']
+        with self.assertRaises(ValueError):
+            buffer.append(row)
+        buffer.append(self.get_row(0))
+        with self.assertRaises(ValueError):
+            buffer.append(self.get_row(1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from baobab.io_utils import ParquetMetadataWriter, read_metadata_parquet
+
+class TestParquetUtils(unittest.TestCase):
+    """Tests for the Parquet metadata writer and reader
+
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.out_dir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.out_dir)
+
+    def get_chunk(self, start_idx, n_rows):
+        """Get the metadata of a chunk, laid out as in `metadata.csv`
+
+        """
+        idx = np.arange(start_idx, start_idx + n_rows)
+        metadata = pd.DataFrame({'img_filename': ['X_{0:07d}.npy'.format(i) for i in idx],
+                                 'lens_mass_theta_E': 0.1*idx,
+                                 'n_img': idx%3 + 2,
+                                 'true_td': [list(np.arange(i%3 + 1, dtype=float)) for i in idx]})
+        for i in range(4):
+            metadata['x_image_{:d}'.format(i)] = idx + 0.1*i
+        return metadata
+
+    def test_round_trip(self):
+        """Test the schema and the values read back, with and without flattening the list columns
+
+        """
+        path = os.path.join(self.out_dir, 'metadata.parquet')
+        writer = ParquetMetadataWriter(path)
+        chunks = [self.get_chunk(0, 3), self.get_chunk(3, 2)]
+        for chunk in chunks:
+            writer.write(chunk)
+        self.assertEqual(sorted(os.listdir(path)), ['part-00000.parquet', 'part-00001.parquet'])
+        schema = writer.schema
+        self.assertEqual(schema.field('lens_mass_theta_E').type, pa.float64())
+        self.assertEqual(schema.field('n_img').type, pa.int64())
+        self.assertEqual(schema.field('img_filename').type, pa.string())
+        self.assertEqual(schema.field('x_image').type, pa.list_(pa.float64(), 4))
+        self.assertEqual(schema.field('true_td').type, pa.list_(pa.float64(), 4))
+        self.assertNotIn('x_image_0', schema.names)
+
+        metadata = read_metadata_parquet(path)
+        self.assertEqual(len(metadata), 5)
+        np.testing.assert_array_equal(metadata['x_image'].iloc[4], [4.0, 4.1, 4.2, 4.3])
+        # Lists shorter than the fixed size are padded with NaN
+        np.testing.assert_array_equal(metadata['true_td'].iloc[1], [0.0, 1.0, np.nan, np.nan])
+
+        flat_metadata = read_metadata_parquet(path, columns=['n_img', 'x_image'], flatten=True)
+        expected = pd.concat(chunks, ignore_index=True)
+        self.assertEqual(list(flat_metadata.columns), ['n_img', 'x_image_0', 'x_image_1', 'x_image_2', 'x_image_3'])
+        for col in flat_metadata.columns:
+            np.testing.assert_array_equal(flat_metadata[col].values, expected[col].values)
+
+    def test_resume(self):
+        """Test that resuming keeps the first parts and their schema and removes the other parts and temporary files
+
+        """
+        path = os.path.join(self.out_dir, 'metadata_resume.parquet')
+        writer = ParquetMetadataWriter(path)
+        for start_idx in [0, 2, 4]:
+            writer.write(self.get_chunk(start_idx, 2))
+        open(os.path.join(path, 'part-00003.parquet.tmp'), 'w').close()
+        with self.assertRaises(ValueError):
+            ParquetMetadataWriter(os.path.join(self.out_dir, 'metadata_empty.parquet'), n_parts=1)
+        writer = ParquetMetadataWriter(path, n_parts=2)
+        self.assertEqual(sorted(os.listdir(path)), ['part-00000.parquet', 'part-00001.parquet'])
+        self.assertEqual(writer.schema.field('x_image').type, pa.list_(pa.float64(), 4))
+        writer.write(self.get_chunk(4, 1))
+        metadata = read_metadata_parquet(path)
+        np.testing.assert_array_equal(metadata['lens_mass_theta_E'].values, 0.1*np.arange(5))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import numpy as np
+import pandas as pd
+from baobab.io_utils import ImageEncoder, PRECISIONS, SCALE_COLUMNS, get_roundtrip_errors
+
+class TestPrecisionUtils(unittest.TestCase):
+    """Tests for the encoding of the images into a reduced storage precision
+
+    """
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(123)
+        # Noiseless lensed arcs: a smooth profile over many decades of flux, on a zero background
+        x, y = np.meshgrid(np.linspace(-2.0, 2.0, 33), np.linspace(-2.0, 2.0, 33))
+        r = np.sqrt(x**2.0 + y**2.0)
+        peaks = 10.0**rng.uniform(0.0, 3.0, size=(6, 1, 1))
+        cls.imgs = peaks*np.exp(-(r/rng.uniform(0.2, 0.5, size=(6, 1, 1)))**0.5)
+        cls.imgs[-1] = 0.0 # an empty image
+        cls.noise_floor = 0.01
+
+    def test_float_precisions(self):
+        """Test that the float precisions are plain casts and that overflowing images are refused
+
+        """
+        for precision in ['float64', 'float32', 'float16']:
+            encoder = ImageEncoder(precision)
+            encoded, scale = encoder.encode(self.imgs)
+            self.assertEqual(encoded.dtype, np.dtype(precision))
+            self.assertEqual(scale, {})
+            np.testing.assert_array_equal(encoder.decode(encoded), self.imgs.astype(precision))
+        with self.assertRaises(ValueError):
+            ImageEncoder('float16').encode(self.imgs*1.e3)
+        with self.assertRaises(ValueError):
+            ImageEncoder('bfloat16')
+
+    def test_scaled_precisions(self):
+        """Test that the uint16 precisions round-trip the images below the noise floor, with the scale passed as metadata columns
+
+        """
+        for precision in ['asinh_uint16', 'log_uint16']:
+            for noise_floor in [None, self.noise_floor]:
+                encoder = ImageEncoder(precision, noise_floor=noise_floor)
+                encoded, scale = encoder.encode(self.imgs)
+                self.assertEqual(encoded.dtype, np.uint16)
+                self.assertEqual(sorted(scale.keys()), sorted(SCALE_COLUMNS))
+                # Each image spans the full range of levels
+                self.assertEqual(encoded[0].min(), 0)
+                self.assertEqual(encoded[0].max(), 2**16 - 1)
+                decoded = encoder.decode(encoded, pd.DataFrame(scale))
+                np.testing.assert_array_equal(decoded[-1], 0.0)
+                errors = get_roundtrip_errors(self.imgs, decoded, self.noise_floor)
+                self.assertTrue(np.all(errors['img_roundtrip_max_err'] >= errors['img_roundtrip_rms_err']))
+                # The error of the faint pixels is a fraction of the softening
+                faint = self.imgs < self.noise_floor
+                np.testing.assert_array_less(np.abs(decoded - self.imgs)[faint], 1.e-3*self.noise_floor)
+                if noise_floor is not None:
+                    np.testing.assert_array_less(errors['img_roundtrip_max_err_over_noise'], 1.0)
+                # The relative error of the bright pixels is set by the number of levels
+                bright = self.imgs > 1.0
+                np.testing.assert_array_less(np.abs(decoded[bright]/self.imgs[bright] - 1.0), 1.e-3)
+
+    def test_roundtrip_errors(self):
+        """Test the round-trip errors on a known error
+
+        """
+        imgs = np.zeros((2, 3, 3))
+        decoded = imgs.copy()
+        decoded[0, 1, 1] = 0.3
+        errors = get_roundtrip_errors(imgs, decoded)
+        np.testing.assert_allclose(errors['img_roundtrip_max_err'], [0.3, 0.0])
+        np.testing.assert_allclose(errors['img_roundtrip_rms_err'], [0.1, 0.0])
+        self.assertNotIn('img_roundtrip_max_err_over_noise', errors)
+        self.assertEqual(PRECISIONS[0], 'float64')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import numpy as np
+from lenstronomy.LensModel.lens_model import LensModel
+from lenstronomy.LensModel.Solver.lens_equation_solver import LensEquationSolver
+from lenstronomy.LightModel.light_model import LightModel
+from lenstronomy.PointSource.point_source import PointSource
+from lenstronomy.ImSim.image_model import ImageModel
+from lenstronomy.SimulationAPI.data_api import DataAPI
+from lenstronomy.Data.psf import PSF
+from baobab.sim_utils import RenderContext, render_components, generate_image
+
+class TestImageUtils(unittest.TestCase):
+    """Tests for the image rendering utility functions
+
+    """
+    def test_render_components(self):
+        """Test that the component images add up to the image rendered by lenstronomy in a single call
+
+        """
+        pixel_scale = 0.08
+        num_pix = 64
+        lens_mass_model = LensModel(['SIE', 'SHEAR_GAMMA_PSI'])
+        src_light_model = LightModel(['SERSIC_ELLIPSE'])
+        lens_light_model = LightModel(['SERSIC_ELLIPSE'])
+        ps_model = PointSource(point_source_type_list=['LENSED_POSITION'], fixed_magnification_list=[False])
+        psf_model = PSF(psf_type='GAUSSIAN', fwhm=0.1, pixel_size=pixel_scale)
+        data_api = DataAPI(num_pix, pixel_scale=pixel_scale, exposure_time=100.0, magnitude_zero_point=25.9463,
+                           psf_type='GAUSSIAN', seeing=0.1, background_noise=0.0)
+        image_model = ImageModel(data_api.data_class, psf_model, lens_mass_model, src_light_model, lens_light_model, ps_model, kwargs_numerics={'supersampling_factor': 1})
+        kwargs_lens_mass = [{'theta_E': 1.0, 'e1': 0.05, 'e2': -0.02, 'center_x': 0.0, 'center_y': 0.0}, {'gamma_ext': 0.02, 'psi_ext': 0.3, 'ra_0': 0.0, 'dec_0': 0.0}]
+        kwargs_src_light = [{'amp': 20.0, 'n_sersic': 1.5, 'R_sersic': 0.2, 'e1': 0.0, 'e2': 0.0, 'center_x': 0.1, 'center_y': 0.05}]
+        kwargs_lens_light = [{'amp': 50.0, 'n_sersic': 4.0, 'R_sersic': 0.5, 'e1': 0.05, 'e2': -0.02, 'center_x': 0.0, 'center_y': 0.0}]
+        kwargs_ps = [{'ra_image': np.array([1.0, -0.9]), 'dec_image': np.array([0.2, -0.1]), 'point_amp': np.array([30.0, 20.0])}]
+        component_imgs = render_components(image_model, kwargs_lens_mass, kwargs_src_light, kwargs_lens_light, kwargs_ps)
+        self.assertEqual(sorted(component_imgs.keys()), ['agn_light', 'lens_light', 'src_light'])
+        img = component_imgs['src_light'] + component_imgs['lens_light'] + component_imgs['agn_light']
+        expected_img = image_model.image(kwargs_lens_mass, kwargs_src_light, kwargs_lens_light, kwargs_ps)
+        np.testing.assert_array_equal(img, expected_img)
+        expected_lensed_img = image_model.image(kwargs_lens_mass, kwargs_src_light, kwargs_lens_light, kwargs_ps, lens_light_add=False)
+        np.testing.assert_array_equal(component_imgs['src_light'] + component_imgs['agn_light'], expected_lensed_img)
+        # Components that are not rendered are left out
+        component_imgs = render_components(image_model, kwargs_lens_mass, kwargs_src_light)
+        self.assertEqual(list(component_imgs.keys()), ['src_light'])
+
+    def test_render_context(self):
+        """Test that images rendered with a cached render context match those rendered with models built on the fly
+
+        """
+        pixel_scale = 0.08
+        num_pix = 64
+        components = ['lens_mass', 'external_shear', 'src_light']
+        lens_mass_model = LensModel(['SIE', 'SHEAR_GAMMA_PSI'])
+        src_light_model = LightModel(['SERSIC_ELLIPSE'])
+        lens_eq_solver = LensEquationSolver(lens_mass_model)
+        psf_model = PSF(psf_type='GAUSSIAN', fwhm=0.1, pixel_size=pixel_scale)
+        kwargs_detector = dict(pixel_scale=pixel_scale, exposure_time=100.0, magnitude_zero_point=25.9463, psf_type='GAUSSIAN', seeing=0.1, background_noise=0.0)
+        kwargs_numerics = {'supersampling_factor': 1}
+        render_context = RenderContext(psf_model, kwargs_detector, num_pix, lens_mass_model, src_light_model, kwargs_numerics)
+        for theta_E in [0.8, 1.2]:
+            sample = {'lens_mass': {'theta_E': theta_E, 'e1': 0.05, 'e2': -0.02, 'center_x': 0.0, 'center_y': 0.0},
+                      'external_shear': {'gamma_ext': 0.02, 'psi_ext': 0.3, 'ra_0': 0.0, 'dec_0': 0.0},
+                      'src_light': {'magnitude': 23.0, 'n_sersic': 1.5, 'R_sersic': 0.2, 'e1': 0.0, 'e2': 0.0, 'center_x': 0.1, 'center_y': 0.05}}
+            img, img_features = generate_image(sample, render_context.psf_model, render_context.data_api, lens_mass_model, src_light_model, lens_eq_solver, pixel_scale, num_pix, components, kwargs_numerics, image_model=render_context.image_model)
+            data_api = DataAPI(num_pix, **kwargs_detector)
+            expected_img, expected_img_features = generate_image(sample, psf_model, data_api, lens_mass_model, src_light_model, lens_eq_solver, pixel_scale, num_pix, components, kwargs_numerics)
+            np.testing.assert_array_equal(img, expected_img)
+            self.assertEqual(img_features['total_magnification'], expected_img_features['total_magnification'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import numpy as np
+from astropy.cosmology import FlatLambdaCDM
+from baobab.sim_utils import VelocityDispersionTable, validate_velocity_dispersion_table
+
+class TestKinematicsUtils(unittest.TestCase):
+    """Tests for the lookup table of the analytic velocity dispersion
+
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.kwargs_aperture = dict(aperture_type='slit', center_ra=0.0, center_dec=0.0, width=1.0, length=1.0, angle=0.0)
+        cls.kwargs_psf = dict(psf_type='GAUSSIAN', fwhm=0.6)
+        cls.table = VelocityDispersionTable(cls.kwargs_aperture, cls.kwargs_psf, aniso_param=1.0)
+
+    def test_interpolation_error(self):
+        """Test that the interpolation error measured at construction is within the stated bound
+
+        """
+        self.assertLess(self.table.max_rel_error, 1.e-5)
+
+    def test_vectorized(self):
+        """Test that the dispersion of arrays matches that of scalars, inside and outside the grid
+
+        """
+        gamma = np.array([1.9, 2.1, 2.7])
+        r_eff = np.array([0.5, 8.0, 1.0])
+        vd = self.table.velocity_dispersion(1.2, gamma, r_eff, 2.0, 0.01)
+        for i in range(3):
+            np.testing.assert_allclose(vd[i], self.table.velocity_dispersion(1.2, gamma[i], r_eff[i], 2.0, 0.01), rtol=1.e-12)
+        # Outside the grid, the dispersion is computed exactly
+        F_exact = self.table.compute_dimensionless_dispersion(gamma[1:], r_eff[1:]).diagonal()
+        np.testing.assert_allclose(self.table.get_dimensionless_dispersion(gamma[1:], r_eff[1:]), F_exact, rtol=1.e-12)
+
+    def test_scaling(self):
+        """Test the analytic dependence on the Einstein radius and the external convergence
+
+        """
+        vd = self.table.velocity_dispersion(1.0, 2.0, 1.0, 2.0)
+        np.testing.assert_allclose(self.table.velocity_dispersion(1.44, 2.0, 1.0, 2.0), 1.2*vd, rtol=1.e-12)
+        np.testing.assert_allclose(self.table.velocity_dispersion(1.0, 2.0, 1.0, 2.0, kappa_ext=0.19), 0.9*vd, rtol=1.e-12)
+
+    def test_validate(self):
+        """Test that the table agrees with the Monte Carlo of lenstronomy within its sampling noise
+
+        """
+        np.random.seed(123)
+        validation = validate_velocity_dispersion_table(self.table, FlatLambdaCDM(H0=70.0, Om0=0.3), n_samples=3, sampling_number=5000, rng=np.random.default_rng(4))
+        self.assertLess(validation['max_abs_rel_error'], 0.02)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+from lenstronomy.LensModel.lens_model import LensModel
+from lenstronomy.LensModel.Solver.lens_equation_solver import LensEquationSolver
+from baobab.sim_utils import BatchImageFinder
+
+class TestLensEquationUtils(unittest.TestCase):
+    """Tests for the batched solver of the lens equation
+
+    """
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(3)
+        cls.n = 40
+        cls.kwargs_lens = [dict(theta_E=rng.uniform(0.8, 1.4, cls.n), gamma=rng.uniform(1.95, 2.1, cls.n),
+                                e1=rng.normal(0.0, 0.1, cls.n), e2=rng.normal(0.0, 0.1, cls.n),
+                                center_x=rng.normal(0.0, 0.02, cls.n), center_y=rng.normal(0.0, 0.02, cls.n)),
+                           dict(gamma_ext=rng.uniform(0.0, 0.08, cls.n), psi_ext=rng.uniform(0.0, np.pi, cls.n),
+                                ra_0=np.zeros(cls.n), dec_0=np.zeros(cls.n))]
+        cls.x_src = rng.normal(0.0, 0.1, cls.n)
+        cls.y_src = rng.normal(0.0, 0.1, cls.n)
+        cls.pixel_scale = 0.08
+        cls.num_pix = 64
+        cls.lens_model = LensModel(['EPL', 'SHEAR_GAMMA_PSI'])
+        cls.image_finder = BatchImageFinder(['SPEMD', 'SHEAR_GAMMA_PSI'], cls.pixel_scale, cls.num_pix)
+        cls.x_image, cls.y_image, cls.n_img = cls.image_finder.find_images(cls.x_src, cls.y_src, cls.kwargs_lens)
+
+    def get_kwargs_lens_i(self, i):
+        return [{k: v[i] for k, v in kw.items()} for kw in self.kwargs_lens]
+
+    def test_solutions(self):
+        """Test that the images are solutions of the lens equation, padded with NaN beyond the number of images
+
+        """
+        self.assertEqual(self.x_image.shape, (self.n, 4))
+        np.testing.assert_array_equal(np.sum(~np.isnan(self.x_image), axis=1), self.n_img)
+        for i in range(self.n):
+            x_i = self.x_image[i, :self.n_img[i]]
+            y_i = self.y_image[i, :self.n_img[i]]
+            beta_x, beta_y = self.lens_model.ray_shooting(x_i, y_i, self.get_kwargs_lens_i(i))
+            np.testing.assert_allclose(beta_x, self.x_src[i], atol=1.e-8)
+            np.testing.assert_allclose(beta_y, self.y_src[i], atol=1.e-8)
+            # Sorted by arrival time
+            fermat_pot = self.lens_model.fermat_potential(x_i, y_i, self.get_kwargs_lens_i(i), self.x_src[i], self.y_src[i])
+            self.assertTrue(np.all(np.diff(fermat_pot) >= 0.0))
+
+    def test_matches_find_bright_image(self):
+        """Test that the images match those found by lenstronomy one lens at a time, with the settings of `generate_image`
+
+        """
+        solver = LensEquationSolver(self.lens_model)
+        solve = getattr(solver, 'findBrightImage', None) or solver.find_bright_image
+        for i in range(self.n):
+            x_i, y_i = solve(self.x_src[i], self.y_src[i], self.get_kwargs_lens_i(i), numImages=4, min_distance=self.pixel_scale, search_window=self.num_pix*self.pixel_scale)
+            self.assertEqual(len(x_i), self.n_img[i])
+            np.testing.assert_allclose(self.x_image[i, :self.n_img[i]], x_i, atol=1.e-6)
+            np.testing.assert_allclose(self.y_image[i, :self.n_img[i]], y_i, atol=1.e-6)
+
+    def test_quads_and_doubles(self):
+        """Test that the batch contains both quads and doubles, and that a lens without lensing returns a single image
+
+        """
+        self.assertTrue(np.any(self.n_img == 4))
+        self.assertTrue(np.any(self.n_img == 2))
+        kwargs_lens = [dict(theta_E=[0.5], gamma=[2.0], e1=[0.0], e2=[0.0], center_x=[0.0], center_y=[0.0]),
+                       dict(gamma_ext=[0.0], psi_ext=[0.0], ra_0=[0.0], dec_0=[0.0])]
+        x_image, y_image, n_img = self.image_finder.find_images([1.0], [0.0], kwargs_lens)
+        self.assertEqual(n_img[0], 1)
+        np.testing.assert_allclose(x_image[0, 0], 1.5, atol=1.e-8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import numpy as np
+from lenstronomy.LensModel.lens_model import LensModel
+from lenstronomy.LensModel.Solver.lens_equation_solver import LensEquationSolver
+from lenstronomy.LightModel.light_model import LightModel
+from lenstronomy.PointSource.point_source import PointSource
+from lenstronomy.Data.psf import PSF
+from baobab.sim_utils import MagnificationScreen, RenderContext, generate_image, find_bright_images
+
+class TestMagnificationUtils(unittest.TestCase):
+    """Tests for the pre-render magnification screen
+
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.pixel_scale = 0.08
+        cls.num_pix = 64
+        cls.components = ['lens_mass', 'external_shear', 'src_light', 'agn_light']
+        cls.lens_mass_model = LensModel(['SIE', 'SHEAR_GAMMA_PSI'])
+        cls.src_light_model = LightModel(['SERSIC_ELLIPSE'])
+        cls.lens_eq_solver = LensEquationSolver(cls.lens_mass_model)
+        cls.ps_model = PointSource(point_source_type_list=['LENSED_POSITION'], fixed_magnification_list=[False])
+        cls.psf_model = PSF(psf_type='GAUSSIAN', fwhm=0.1, pixel_size=cls.pixel_scale)
+        cls.kwargs_detector = dict(pixel_scale=cls.pixel_scale, exposure_time=100.0, magnitude_zero_point=25.9463,
+                                   psf_type='GAUSSIAN', seeing=0.1, background_noise=0.0)
+        cls.render_context = cls.get_render_context({'supersampling_factor': 1})
+
+    @classmethod
+    def get_render_context(cls, kwargs_numerics):
+        """Get the render context of the images with the given numerics
+
+        """
+        return RenderContext(cls.psf_model, cls.kwargs_detector, cls.num_pix, cls.lens_mass_model, cls.src_light_model, kwargs_numerics, ps_model=cls.ps_model)
+
+    def get_samples(self, n_samples, seed=123, n_sersic=(1.5, 1.5), R_sersic=(0.2, 0.2)):
+        """Get samples spanning a wide range of source offsets, with Sersic indices and radii drawn uniformly in the given ranges
+
+        """
+        rng = np.random.default_rng(seed)
+        samples = []
+        for i in range(n_samples):
+            sample = {'lens_mass': {'theta_E': rng.uniform(0.7, 1.2), 'e1': rng.uniform(-0.1, 0.1), 'e2': rng.uniform(-0.1, 0.1), 'center_x': 0.0, 'center_y': 0.0},
+                      'external_shear': {'gamma_ext': rng.uniform(0.0, 0.05), 'psi_ext': rng.uniform(-np.pi, np.pi), 'ra_0': 0.0, 'dec_0': 0.0},
+                      'src_light': {'magnitude': 23.0, 'n_sersic': rng.uniform(*n_sersic), 'R_sersic': rng.uniform(*R_sersic), 'e1': rng.uniform(-0.2, 0.2), 'e2': rng.uniform(-0.2, 0.2),
+                                    'center_x': rng.uniform(-1.5, 1.5), 'center_y': rng.uniform(-1.5, 1.5)},
+                      'agn_light': {'magnitude': 22.0},
+                     }
+            samples.append(sample)
+        return samples
+
+    def get_image_positions(self, sample):
+        """Get the point-source image positions solved for by `generate_image`
+
+        """
+        return find_bright_images(sample, self.lens_eq_solver, self.pixel_scale, self.num_pix)
+
+    def get_exact_magnification(self, sample, render_context, image_positions):
+        """Get the total magnification computed by `generate_image`
+
+        """
+        # The numerics are those of the image model of the render context
+        _, img_features = generate_image(sample, render_context.psf_model, render_context.data_api, self.lens_mass_model, self.src_light_model, self.lens_eq_solver, self.pixel_scale, self.num_pix, self.components, None, ps_model=self.ps_model, image_model=render_context.image_model, image_positions=image_positions)
+        return img_features['total_magnification']
+
+    def check_bound(self, samples, render_context):
+        """Check that the bound is above the exact magnification of each sample, and return both
+
+        """
+        screen = MagnificationScreen(self.lens_mass_model, self.src_light_model, self.components, 0.0)
+        bounds = []
+        exact = []
+        for sample in samples:
+            image_positions = self.get_image_positions(sample)
+            bounds.append(screen.get_magnification_bound(sample, render_context, image_positions))
+            exact.append(self.get_exact_magnification(sample, render_context, image_positions))
+        bounds = np.array(bounds)
+        exact = np.array(exact)
+        self.assertTrue(np.all(bounds >= exact*(1.0 - 1.e-12)), msg="exact {:s} above the bound {:s}".format(str(exact[bounds < exact]), str(bounds[bounds < exact])))
+        return bounds, exact
+
+    def test_bound(self):
+        """Test that the bound is above the exact magnification, and close to it for sources far from the edges of the image
+
+        """
+        bounds, exact = self.check_bound(self.get_samples(30), self.render_context)
+        np.testing.assert_allclose(np.median(bounds/exact), 1.0, atol=0.05)
+
+    def test_bound_compact_sources(self):
+        """Test that the bound is above the exact magnification for compact sources with a high Sersic index, whose flux is concentrated within a pixel, with and without supersampling
+
+        """
+        samples = self.get_samples(30, seed=7, n_sersic=(4.0, 8.0), R_sersic=(0.01, 0.08))
+        for kwargs_numerics in [{'supersampling_factor': 1}, {'supersampling_factor': 3}]:
+            self.check_bound(samples, self.get_render_context(kwargs_numerics))
+
+    def test_kernel_factor(self):
+        """Test that the bound is scaled by the positive pixels of a kernel with negative pixels
+
+        """
+        self.assertEqual(MagnificationScreen.get_kernel_factor(self.psf_model), 1.0)
+        kernel = np.ones((5, 5))
+        kernel[0, 0] = -1.0
+        psf_model = PSF(psf_type='PIXEL', kernel_point_source=kernel)
+        np.testing.assert_allclose(MagnificationScreen.get_kernel_factor(psf_model), 24.0/23.0)
+
+    def test_screen_is_conservative(self):
+        """Test that the screen never rejects a sample the exact magnification cut would keep, while screening out some samples
+
+        """
+        samples = self.get_samples(40) + self.get_samples(20, seed=7, n_sersic=(4.0, 8.0), R_sersic=(0.01, 0.08))
+        positions = [self.get_image_positions(s) for s in samples]
+        exact = np.array([self.get_exact_magnification(s, self.render_context, p) for s, p in zip(samples, positions)])
+        min_magnification = np.percentile(exact, 75)
+        screen = MagnificationScreen(self.lens_mass_model, self.src_light_model, self.components, min_magnification)
+        rejected = np.array([screen.reject(s, self.render_context, p) for s, p in zip(samples, positions)])
+        self.assertFalse(np.any(exact[rejected] >= min_magnification))
+        self.assertGreater(screen.n_screened, 0)
+        self.assertEqual(screen.n_evaluated, len(samples))
+        np.testing.assert_almost_equal(screen.screened_fraction, np.mean(rejected))
+        screen.reset_counts()
+        self.assertEqual(screen.screened_fraction, 0.0)
+
+    def test_enabled_by_default(self):
+        """Test that the screen is enabled unless the config disables it
+
+        """
+        import baobab.configs as configs
+        cfg = configs.BaobabConfig.from_file(configs.tdlmc_diagonal_config.__file__)
+        self.assertTrue(cfg.selection.magnification.screen)
+
+if __name__ == '__main__':
+    unittest.main()
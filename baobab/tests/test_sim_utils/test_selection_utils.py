@@ -1,5 +1,9 @@
+import os
+import glob
 import unittest
 import numpy as np
+import baobab.configs as configs
+import baobab.bnn_priors as bnn_priors
 from baobab.sim_utils import Selection
 
 class TestSelectionUtils(unittest.TestCase):
@@ -26,5 +30,47 @@ class TestSelectionUtils(unittest.TestCase):
         'src_light': {'e1': 0.01, 'e2': 0.01}}
         np.testing.assert_equal(selection.reject_initial(sample), True)
 
+    def test_batch_mask_and_counts(self):
+        """Test the selection mask on a batch of samples and the per-selection rejection counts
+
+        """
+        selection_cfg = {'initial': ["lambda x: x['lens_mass']['theta_E'] > 0.5",
+                                     "lambda x: 0.0 < x['src_light']['magnitude'] - x['lens_mass']['theta_E'] <= 24.0 and not x['src_light']['n_sersic'] > 4",]}
+        selection = Selection(selection_cfg, ['lens_mass', 'external_shear', 'src_light'])
+        batch = {'lens_mass': {'e1': np.array([0.01, 0.9, 0.01, 0.01]), 'e2': np.array([0.01, 0.9, 0.01, 0.01]), 'theta_E': np.array([1.0, 1.0, 0.1, 1.0])},
+                 'src_light': {'e1': np.zeros(4), 'e2': np.zeros(4), 'magnitude': np.array([20.0, 20.0, 20.0, 30.0]), 'n_sersic': np.array([1.0, 1.0, 1.0, 1.0])}}
+        mask = selection.get_initial_mask(batch)
+        np.testing.assert_array_equal(mask, [True, False, False, False])
+        self.assertEqual(selection.n_evaluated, 4)
+        self.assertEqual(list(selection.rejection_counts.values()), [1, 1, 1, 0])
+        selection.reset_counts()
+        self.assertEqual(selection.n_evaluated, 0)
+        self.assertEqual(sum(selection.rejection_counts.values()), 0)
+
+    def test_unsafe_selection(self):
+        """Test that selection strings are not evaluated as arbitrary code
+
+        """
+        for s in ["lambda x: __import__('os').system('ls')",
+                  "lambda x: x.__class__",
+                  "lambda x, y: x['lens_mass']['theta_E'] > y",
+                  "x['lens_mass']['theta_E'] > 0.5"]:
+            with self.assertRaises(ValueError, msg=s):
+                Selection({'initial': [s]}, ['lens_mass', 'external_shear', 'src_light'])
+
+    def test_config_selections(self):
+        """Test that the selections of the shipped configs compile and evaluate on a batch sampled from their BNN prior
+
+        """
+        cfg_paths = sorted(glob.glob(os.path.join(os.path.dirname(configs.__file__), '*_config.py')))
+        self.assertGreater(len(cfg_paths), 0)
+        for cfg_path in cfg_paths:
+            cfg = configs.BaobabConfig.from_file(cfg_path)
+            selection = Selection(cfg.selection, cfg.components)
+            bnn_prior = getattr(bnn_priors, cfg.bnn_prior_class)(cfg.bnn_omega, cfg.components)
+            batch = bnn_prior.sample_batch(4, rng=np.random.default_rng(123))
+            mask = selection.get_initial_mask(batch)
+            self.assertEqual(mask.shape, (4,), msg=cfg_path)
+
 if __name__ == '__main__':
     unittest.main()
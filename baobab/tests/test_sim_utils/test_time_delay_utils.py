@@ -0,0 +1,68 @@
+import unittest
+import numpy as np
+from lenstronomy.LensModel.lens_model import LensModel
+from lenstronomy.LensModel.Solver.lens_equation_solver import LensEquationSolver
+from baobab.sim_utils import BatchTimeDelays
+
+class TestTimeDelayUtils(unittest.TestCase):
+    """Tests for the batched Fermat potential and time delays
+
+    """
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(11)
+        cls.n = 5
+        cls.kwargs_lens = [dict(theta_E=rng.uniform(0.8, 1.4, cls.n), gamma=rng.uniform(1.9, 2.1, cls.n),
+                                e1=rng.normal(0.0, 0.05, cls.n), e2=rng.normal(0.0, 0.05, cls.n),
+                                center_x=rng.normal(0.0, 0.01, cls.n), center_y=rng.normal(0.0, 0.01, cls.n)),
+                           dict(gamma_ext=rng.uniform(0.0, 0.05, cls.n), psi_ext=rng.uniform(-np.pi, np.pi, cls.n),
+                                ra_0=np.zeros(cls.n), dec_0=np.zeros(cls.n))]
+        lens_model = LensModel(['EPL', 'SHEAR_GAMMA_PSI'])
+        solver = LensEquationSolver(lens_model)
+        cls.x_image = np.full((cls.n, 4), np.nan)
+        cls.y_image = np.full((cls.n, 4), np.nan)
+        for i in range(cls.n):
+            x_i, y_i = solver.findBrightImage(rng.normal(0.0, 0.05), rng.normal(0.0, 0.05), cls.get_kwargs_lens_i(i), numImages=4)
+            cls.x_image[i, :len(x_i)] = x_i
+            cls.y_image[i, :len(y_i)] = y_i
+        cls.lens_model = lens_model
+
+    @classmethod
+    def get_kwargs_lens_i(cls, i):
+        return [{k: v[i] for k, v in kw.items()} for kw in cls.kwargs_lens]
+
+    def test_fermat_potential(self):
+        """Test that the batched Fermat potential matches lenstronomy lens by lens, for both the broadcast and the looped evaluation
+
+        """
+        broadcast = BatchTimeDelays(['SPEMD', 'SHEAR_GAMMA_PSI'])
+        self.assertTrue(broadcast.broadcast)
+        fermat_pot = broadcast.get_fermat_potential(self.x_image, self.y_image, self.kwargs_lens)
+        np.testing.assert_array_equal(np.isnan(fermat_pot), np.isnan(self.x_image))
+        for i in range(self.n):
+            is_image = ~np.isnan(self.x_image[i])
+            x_i = self.x_image[i, is_image]
+            y_i = self.y_image[i, is_image]
+            x_src, y_src = self.lens_model.ray_shooting(x_i, y_i, self.get_kwargs_lens_i(i))
+            expected = self.lens_model.fermat_potential(x_i, y_i, self.get_kwargs_lens_i(i), np.mean(x_src), np.mean(y_src))
+            np.testing.assert_allclose(fermat_pot[i, is_image], expected, rtol=1.e-10)
+        # Looped evaluation, for profiles that do not broadcast
+        looped = BatchTimeDelays(['EPL', 'SHEAR_GAMMA_PSI'])
+        looped.broadcast = False
+        np.testing.assert_allclose(looped.get_fermat_potential(self.x_image, self.y_image, self.kwargs_lens), fermat_pot, rtol=1.e-10)
+
+    def test_time_delays(self):
+        """Test the conversion of the Fermat potential into time delays
+
+        """
+        batch_time_delays = BatchTimeDelays(['EPL', 'SHEAR_GAMMA_PSI'])
+        D_dt = np.linspace(2000.0, 4000.0, self.n)
+        true_td = batch_time_delays.get_time_delays(self.x_image, self.y_image, self.kwargs_lens, D_dt)
+        fermat_pot = batch_time_delays.get_fermat_potential(self.x_image, self.y_image, self.kwargs_lens)
+        # Conversion factor in days/(Mpc arcsec^2)
+        is_image = ~np.isnan(self.x_image)
+        np.testing.assert_array_equal(np.isnan(true_td), ~is_image)
+        np.testing.assert_allclose((true_td/(D_dt[:, np.newaxis]*fermat_pot))[is_image], 0.0280007, rtol=1.e-5)
+
+if __name__ == '__main__':
+    unittest.main()
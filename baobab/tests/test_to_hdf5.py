@@ -2,6 +2,10 @@ import os
 import shutil
 import subprocess
 import unittest
+import tempfile
+import numpy as np
+import pandas as pd
+import h5py
 
 def test_to_hdf5():
     """Tests execution of `to_hdf5.py` script for all template config files
@@ -10,18 +14,124 @@ def test_to_hdf5():
     import baobab.configs as configs
     cfg_filepath = configs.tdlmc_diagonal_config.__file__
     cfg = configs.BaobabConfig.from_file(cfg_filepath)
-    subprocess.check_output('generate {:s} --n_data 5'.format(cfg_filepath), shell=True)
-    save_dir = cfg.out_dir
+    # Generate into a temporary working folder, in which the default destination folder of the config is created
+    work_dir = tempfile.mkdtemp()
+    save_dir = os.path.join(work_dir, os.path.basename(cfg.out_dir))
     n_failures = 0
-    for channel_format in ['tf', 'theano']:
-        try:
-            subprocess.check_output('to_hdf5 {:s} --format {:s}'.format(save_dir, channel_format), shell=True)
-        except:
-            n_failures += 1
-    # Delete resulting data
-    if os.path.exists(save_dir):
-        shutil.rmtree(save_dir)
+    try:
+        subprocess.check_output('generate {:s} --n_data 5'.format(cfg_filepath), shell=True, cwd=work_dir)
+        for channel_format in ['tf', 'theano']:
+            try:
+                subprocess.check_output('to_hdf5 {:s} --format {:s}'.format(save_dir, channel_format), shell=True)
+            except:
+                n_failures += 1
+    finally:
+        # Delete resulting data
+        shutil.rmtree(work_dir)
     assert n_failures == 0 # FIXME: clumsy
-            
+
+def test_to_hdf5_contiguous_layout():
+    """Tests the contiguous layout of `to_hdf5.py` against the images and their pixel-wise statistics
+
+    """
+    npy_dir = os.path.join(tempfile.mkdtemp(), 'test_contiguous')
+    os.makedirs(npy_dir)
+    n_data = 7
+    rng = np.random.default_rng(123)
+    imgs = rng.random((n_data, 4, 5)).astype(np.float32)
+    img_filenames = ['X_{0:07d}.npy'.format(i) for i in range(n_data)]
+    for img_filename, img in zip(img_filenames, imgs):
+        np.save(os.path.join(npy_dir, img_filename), img)
+    pd.DataFrame({'img_filename': img_filenames, 'lens_mass_theta_E': rng.random(n_data)}).to_csv(os.path.join(npy_dir, 'metadata.csv'), index=None)
+    save_path = os.path.join(npy_dir, 'test_contiguous.h5')
+    for channel_format, expected_shape in [('tf', (n_data, 4, 5, 1)), ('theano', (n_data, 1, 4, 5))]:
+        for compression in ['', '--compression lzf']:
+            subprocess.check_output('to_hdf5 {:s} --format {:s} --layout contiguous --chunk_size 3 {:s}'.format(npy_dir, channel_format, compression), shell=True)
+            with h5py.File(save_path, 'r') as f:
+                assert f['images'].shape == expected_shape
+                assert f['images'].chunks == (3,) + expected_shape[1:]
+                np.testing.assert_array_equal(f['images'][:], imgs.reshape(expected_shape))
+                np.testing.assert_allclose(f['pixels_mean'][:], imgs.mean(axis=0).reshape(expected_shape[1:]), rtol=1.e-5)
+                np.testing.assert_allclose(f['pixels_std'][:], imgs.std(axis=0).reshape(expected_shape[1:]), rtol=1.e-4)
+    shutil.rmtree(os.path.dirname(npy_dir))
+
+def test_to_hdf5_unchunked_layout():
+    """Tests that the unchunked layout of `to_hdf5.py` and its label columns can be memory-mapped
+
+    """
+    from baobab.io_utils import MemmapReader
+    npy_dir = os.path.join(tempfile.mkdtemp(), 'test_unchunked')
+    os.makedirs(npy_dir)
+    n_data = 7
+    rng = np.random.default_rng(123)
+    imgs = rng.random((n_data, 4, 5)).astype(np.float32)
+    img_filenames = ['X_{0:07d}.npy'.format(i) for i in range(n_data)]
+    for img_filename, img in zip(img_filenames, imgs):
+        np.save(os.path.join(npy_dir, img_filename), img)
+    theta_E = rng.random(n_data)
+    pd.DataFrame({'img_filename': img_filenames, 'lens_mass_theta_E': theta_E}).to_csv(os.path.join(npy_dir, 'metadata.csv'), index=None)
+    save_path = os.path.join(npy_dir, 'test_unchunked.h5')
+    subprocess.check_output('to_hdf5 {:s} --format theano --layout unchunked --chunk_size 3'.format(npy_dir), shell=True)
+    with h5py.File(save_path, 'r') as f:
+        assert f['images'].chunks is None
+        assert list(f['labels'].keys()) == ['lens_mass_theta_E']
+    reader = MemmapReader(save_path, standardize=False)
+    np.testing.assert_array_equal(reader.get_images(np.arange(n_data)), imgs.reshape(n_data, 1, 4, 5))
+    np.testing.assert_allclose(reader.get_labels(np.arange(n_data))[:, 0], theta_E)
+    # The metadata table is still written
+    np.testing.assert_allclose(pd.read_hdf(save_path, key='metadata')['lens_mass_theta_E'].values, theta_E)
+    shutil.rmtree(os.path.dirname(npy_dir))
+
+def test_to_hdf5_scaled_precision():
+    """Tests that `to_hdf5.py` decodes the images stored in a uint16 precision with the precision of the manifest and the scale of the metadata
+
+    """
+    from baobab.io_utils import ImageEncoder, write_manifest
+    npy_dir = os.path.join(tempfile.mkdtemp(), 'test_scaled')
+    os.makedirs(npy_dir)
+    n_data = 5
+    rng = np.random.default_rng(123)
+    imgs = rng.lognormal(0.0, 2.0, size=(n_data, 4, 5))
+    encoder = ImageEncoder('log_uint16')
+    encoded, scale = encoder.encode(imgs)
+    img_filenames = ['X_{0:07d}.npy'.format(i) for i in range(n_data)]
+    for img_filename, img in zip(img_filenames, encoded):
+        np.save(os.path.join(npy_dir, img_filename), img)
+    pd.DataFrame(dict(scale, img_filename=img_filenames)).to_csv(os.path.join(npy_dir, 'metadata.csv'), index=None)
+    write_manifest(os.path.join(npy_dir, 'manifest.json'), dict(n_complete=n_data, precision='log_uint16'))
+    save_path = os.path.join(npy_dir, 'test_scaled.h5')
+    subprocess.check_output('to_hdf5 {:s} --format tf --layout contiguous'.format(npy_dir), shell=True)
+    with h5py.File(save_path, 'r') as f:
+        np.testing.assert_allclose(f['images'][:, :, :, 0], imgs, rtol=1.e-3)
+    shutil.rmtree(os.path.dirname(npy_dir))
+
+def test_merge_stats():
+    """Tests that merging the statistics of blocks of images matches the statistics of all images
+
+    """
+    from baobab.to_hdf5 import merge_stats, get_block_stats
+    rng = np.random.default_rng(123)
+    imgs = 1.e3 + rng.random((23, 4, 5))
+    stats = (0, np.zeros((4, 5)), np.zeros((4, 5)))
+    for block_start in range(0, 23, 5):
+        stats = merge_stats(stats, get_block_stats(imgs[block_start:block_start + 5]))
+    n, mean, sum_sq = stats
+    assert n == 23
+    np.testing.assert_allclose(mean, imgs.mean(axis=0), rtol=1.e-12)
+    np.testing.assert_allclose(np.sqrt(sum_sq/n), imgs.std(axis=0), rtol=1.e-8)
+
+def test_unknown_compression():
+    """Tests that an unknown compression filter raises a ValueError naming it
+
+    """
+    from baobab.to_hdf5 import get_compression_kwargs
+    assert get_compression_kwargs(None) == {}
+    try:
+        get_compression_kwargs('zstd')
+    except ValueError as e:
+        assert "'zstd'" in str(e)
+    else:
+        raise AssertionError("An unknown compression did not raise a ValueError.")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -11,17 +11,33 @@ To run this script, pass in the baobab out_dir path as the first argument and th
 
 The output file will be named `tdlmc_train_EmpiricalBNNPrior_seed1113.h5` and can be found inside the directory provided as the first argument.
 
+By default, each image is stored in its own dataset `image_{i}`. To store all the images in a single chunked dataset `images` of shape `[n_data, n_x, n_y, 1]` ('tf') or `[n_data, 1, n_x, n_y]` ('theano'), pass in `--layout contiguous`, e.g.::
+
+    $ to_hdf5 out_data/tdlmc_train_EmpiricalBNNPrior_seed1113 --format 'tf' --layout contiguous --chunk_size 256 --compression lzf
+
+A minibatch of `chunk_size` images aligned with the chunks is then read in a single contiguous read.
+
+To store all the images in a single unchunked and uncompressed dataset `images` instead, which can be memory-mapped by `baobab.io_utils.MemmapReader`, pass in `--layout unchunked`.
+
+In every layout, the numeric metadata columns are also stored one dataset per column in the group `labels`, so that a column can be read without loading the whole metadata table.
+
+Images generated in a reduced precision, e.g. with `generate --precision asinh_uint16`, are decoded back into float32 with the precision recorded in `manifest.json` and the scale stored in the metadata.
+
+The `.npy` files are read in blocks of `chunk_size` images by a pool of `--n_workers` threads, ahead of the writes.
+
 See the demo notebook `demo/Read_hdf5_file.ipynb` for instructions on how to access the datasets in this file.
 
 """
 
 import os, sys
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 import argparse
 import h5py
 from addict import Dict
 from tqdm import tqdm
+from baobab.io_utils import read_metadata_parquet, read_manifest, ImageEncoder
 
 def parse_args():
     """Parses command-line arguments
@@ -37,18 +53,135 @@ def parse_args():
                         type=str,
                         choices=['tf', 'theano'],
                         help='format of image. Default: tf.')
+    parser.add_argument('--layout',
+                        default='per_image',
+                        dest='layout',
+                        type=str,
+                        choices=['per_image', 'contiguous', 'unchunked'],
+                        help='layout of the images: one dataset per image, a single chunked dataset of all images, or a single unchunked dataset that can be memory-mapped. Default: per_image.')
+    parser.add_argument('--chunk_size',
+                        default=256,
+                        dest='chunk_size',
+                        type=int,
+                        help='number of images per HDF5 chunk in the contiguous layout, e.g. the training batch size, and per block of images read at once. Default: 256.')
+    parser.add_argument('--compression',
+                        default=None,
+                        dest='compression',
+                        type=str,
+                        choices=['gzip', 'lzf', 'blosc'],
+                        help='compression filter of the images in the contiguous layout. blosc requires the hdf5plugin package. Default: None.')
+    parser.add_argument('--n_workers',
+                        default=4,
+                        dest='n_workers',
+                        type=int,
+                        help='number of threads reading the .npy files ahead of the writes. Default: 4.')
     args = parser.parse_args()
     # sys.argv rerouting for setuptools entry point
     if args is None:
         args = Dict()
         args.npy_dir = sys.argv[0]
         args.format = sys.argv[1]
+        args.layout = 'per_image'
+        args.chunk_size = 256
+        args.compression = None
+        args.n_workers = 4
 
     #base, ext = os.path.splitext(save_path)
     #if ext.lower() not in ['.h5', '.hdf5']:
     #    raise argparse.ArgumentTypeError('out_filepath must have a valid HDF5 extension.')
     return args
 
+def get_compression_kwargs(compression):
+    """Get the h5py dataset keyword arguments of the compression filter
+
+    Parameters
+    ----------
+    compression : str or None
+        one of 'gzip', 'lzf', 'blosc', or None for no compression
+
+    Returns
+    -------
+    dict
+        keyword arguments to `h5py.Group.create_dataset`
+
+    """
+    if compression is None:
+        return {}
+    elif compression in ['gzip', 'lzf']:
+        return dict(compression=compression, shuffle=True)
+    elif compression == 'blosc':
+        try:
+            import hdf5plugin
+        except ImportError:
+            raise ImportError("The blosc filter requires the hdf5plugin package.")
+        return dict(hdf5plugin.Blosc(cname='lz4', clevel=5, shuffle=hdf5plugin.Blosc.SHUFFLE))
+    else:
+        raise ValueError("Unknown compression {!r}".format(compression))
+
+def load_block(img_paths, img_shape, encoder=None, scale=None):
+    """Load a block of images
+
+    Parameters
+    ----------
+    img_paths : list
+        paths of the .npy image files
+    img_shape : tuple
+        shape of a single image, including the channel axis
+    encoder : ImageEncoder or None
+        the encoder of the stored images, used to decode them. If None, the images are cast. Default: None
+    scale : pd.DataFrame or None
+        the metadata rows of the images, with the scale columns of the uint16 precisions. Default: None
+
+    Returns
+    -------
+    np.array
+        the images, of shape `[len(img_paths)] + img_shape`
+
+    """
+    block = np.empty((len(img_paths),) + img_shape, np.float32)
+    for i, img_path in enumerate(img_paths):
+        # With a single channel, the reshape places the channel axis for both formats
+        block[i] = np.load(img_path).reshape(img_shape)
+    if encoder is not None and encoder.is_scaled:
+        # The levels are exactly representable in float32
+        block[...] = encoder.decode(block, scale)
+    return block
+
+def merge_stats(stats_a, stats_b):
+    """Merge the pixel-wise count, mean, and sum of squared deviations from the mean of two sets of images
+
+    Uses the parallel variant of Welford's algorithm (Chan et al. 1979).
+
+    Parameters
+    ----------
+    stats_a : tuple
+        count, mean, and sum of squared deviations of the first set
+    stats_b : tuple
+        count, mean, and sum of squared deviations of the second set
+
+    Returns
+    -------
+    tuple
+        count, mean, and sum of squared deviations of the union of the sets
+
+    """
+    n_a, mean_a, sum_sq_a = stats_a
+    n_b, mean_b, sum_sq_b = stats_b
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    mean = mean_a + delta*(n_b/n)
+    sum_sq = sum_sq_a + sum_sq_b + delta**2.0*(n_a*n_b/n)
+    return n, mean, sum_sq
+
+def get_block_stats(block):
+    """Compute the pixel-wise count, mean, and sum of squared deviations from the mean of a block of images
+
+    """
+    block = block.astype(np.float64)
+    mean = block.mean(axis=0)
+    sum_sq = ((block - mean)**2.0).sum(axis=0)
+    return block.shape[0], mean, sum_sq
+
 def main():
     args = parse_args()
     baobab_out_dir = os.path.basename(os.path.normpath(args.npy_dir))
@@ -56,12 +189,20 @@ def main():
     print("Destination path: {:s}".format(save_path))
 
     metadata_path = os.path.join(args.npy_dir, 'metadata.csv')
-    metadata_df = pd.read_csv(metadata_path, index_col=None)
+    parquet_path = os.path.join(args.npy_dir, 'metadata.parquet')
+    if os.path.exists(metadata_path):
+        metadata_df = pd.read_csv(metadata_path, index_col=None)
+    else:
+        # Metadata written by `generate --metadata_format parquet`, with the list columns split as in metadata.csv
+        metadata_df = read_metadata_parquet(parquet_path, flatten=True)
 
-    img_path_list = metadata_df['img_filename'].values
-    first_img_filepath = os.path.join(args.npy_dir, img_path_list[0])
-    n_x, n_y = np.load(first_img_filepath).shape # image dimensions
+    img_path_list = [os.path.join(args.npy_dir, img_filename) for img_filename in metadata_df['img_filename'].values]
+    n_x, n_y = np.load(img_path_list[0]).shape # image dimensions
     n_data, n_cols = metadata_df.shape
+    # Storage precision of the images, recorded by `generate`
+    manifest_path = os.path.join(args.npy_dir, 'manifest.json')
+    precision = read_manifest(manifest_path).get('precision', 'float64') if os.path.exists(manifest_path) else 'float64'
+    encoder = ImageEncoder(precision)
 
     # Initialize hdf5 file
     hdf_file = h5py.File(save_path, mode='w', driver=None)
@@ -73,50 +214,71 @@ def main():
         img_shape = (1, n_x, n_y) # theano data shape
     else:
         raise NotImplementedError
-    
-    # Initialize mean and std of images, and quantities required to compute them online
+
+    # Images are read and written in blocks of chunk_size
+    block_size = min(args.chunk_size, n_data)
+    if args.layout == 'contiguous':
+        # Single dataset of all images, chunked along the image axis so that a minibatch is a single chunk
+        hdf_file.create_dataset('images', (n_data,) + img_shape, np.float32,
+                                chunks=(block_size,) + img_shape,
+                                **get_compression_kwargs(args.compression))
+    elif args.layout == 'unchunked':
+        if args.compression is not None:
+            raise ValueError("The unchunked layout cannot be compressed.")
+        # Single dataset of all images, stored contiguously in the file so that it can be memory-mapped
+        hdf_file.create_dataset('images', (n_data,) + img_shape, np.float32)
+
+    # Initialize mean and std of images
     hdf_file.create_dataset('pixels_mean', img_shape, np.float32)
     hdf_file.create_dataset('pixels_std', img_shape, np.float32)
-    mean = np.zeros(img_shape, np.float32)
-    std = np.zeros(img_shape, np.float32)
-    sum_sq = np.zeros(img_shape, np.float32) 
+    stats = (0, np.zeros(img_shape), np.zeros(img_shape)) # count, mean, sum of squared deviations
     ddof = 0 # degree of freedom
 
     print("Saving images...")
-    current_idx = 0 # running idx of dataset
+    block_starts = list(range(0, n_data, block_size))
     pbar = tqdm(total=n_data)
-    while current_idx < n_data:
-
-        # Read in image
-        img_path = os.path.join(args.npy_dir, img_path_list[current_idx])
-        img = np.load(img_path).reshape(img_shape)
-        # Change axis order for theano
-        if format=='theano':
-            img = np.rollaxis(img, 2)
-
-        # Populate images dataset
-        dataset_name = 'image_{:d}'.format(current_idx)
-        hdf_file.create_dataset(dataset_name, img_shape, np.float32)
-        hdf_file[dataset_name][...] = img[None]
-
-        # Update running mean and std (Welford's algorithm)
-        current_idx += 1        
-        delta = img - mean
-        mean += delta / current_idx
-        sum_sq += delta * (img - mean)
-
-        # Update progress
-        pbar.update(1)
+    with ThreadPoolExecutor(max_workers=args.n_workers) as executor:
+        # Read ahead of the writes, keeping a bounded number of blocks in memory
+        n_ahead = args.n_workers + 1
+        futures = {}
+        for block_i, block_start in enumerate(block_starts):
+            for ahead_i in range(block_i, min(block_i + n_ahead, len(block_starts))):
+                if ahead_i not in futures:
+                    ahead_start = block_starts[ahead_i]
+                    futures[ahead_i] = executor.submit(load_block, img_path_list[ahead_start:ahead_start + block_size], img_shape, encoder, metadata_df.iloc[ahead_start:ahead_start + block_size])
+            block = futures.pop(block_i).result()
+            block_stop = block_start + block.shape[0]
+
+            # Populate images dataset
+            if args.layout in ['contiguous', 'unchunked']:
+                hdf_file['images'][block_start:block_stop] = block
+            else:
+                for current_idx, img in zip(range(block_start, block_stop), block):
+                    dataset_name = 'image_{:d}'.format(current_idx)
+                    hdf_file.create_dataset(dataset_name, img_shape, np.float32)
+                    hdf_file[dataset_name][...] = img
+
+            # Update running mean and std
+            stats = merge_stats(stats, get_block_stats(block))
+
+            # Update progress
+            pbar.update(block.shape[0])
     pbar.close()
     # Populate mean, std datasets
-    std = np.sqrt(sum_sq / (n_data - ddof))
+    n, mean, sum_sq = stats
+    std = np.sqrt(sum_sq / (n - ddof))
     hdf_file['pixels_mean'][...] = mean
     hdf_file['pixels_std'][...] = std
+    # Store the numeric metadata column by column, so that a column can be read or memory-mapped on its own
+    labels = hdf_file.create_group('labels')
+    for col in metadata_df.columns:
+        values = metadata_df[col].values
+        if values.dtype.kind in 'biuf':
+            labels.create_dataset(col, data=values)
     hdf_file.close()
 
     # Create dataset for metadata df
     metadata_df.to_hdf(save_path, key='metadata', mode='a', format='table')
-    # TODO: serialize or subgroup each row so the whole dataframe isn't read into memory
 
 if __name__ == '__main__':
     main()
\ No newline at end of file